@@ -48,6 +48,12 @@ class ApprBase(ABC, torch.nn.Module):
                     **scheduler_args[key]["params"],
                 )
 
+_OPTIMIZER_TYPES = (
+    torch.optim.Optimizer,
+    getattr(torch.optim.lr_scheduler, "LRScheduler", torch.optim.lr_scheduler._LRScheduler),
+)
+
+
 class AlgorithmBase(metaclass=ABCMeta):
     """Base Class of Algorithm
 
@@ -91,6 +97,47 @@ class AlgorithmBase(metaclass=ABCMeta):
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
+    # attributes of the algorithm which change during training, beyond networks and optimizers
+    checkpoint_attributes: tuple = ()
+
+    def checkpoint_state(self) -> dict:
+        """Training state of the algorithm: networks including targets, optimizers, lr schedulers
+        and `checkpoint_attributes`, see `load_checkpoint_state`"""
+        return {
+            "networks": self.networks.state_dict(),
+            "optimizers": {name: optimizer.state_dict() for name, optimizer in self._optimizers().items()},
+            "attributes": {key: getattr(self, key) for key in self.checkpoint_attributes},
+        }
+
+    def load_checkpoint_state(self, state: dict):
+        """Restore the training state saved by `checkpoint_state`"""
+        self.networks.load_state_dict(state["networks"])
+        optimizers = self._optimizers()
+        for name, optimizer_state in state["optimizers"].items():
+            if name not in optimizers:
+                raise RuntimeError("optimizer '" + name + "' of checkpoint is not in algorithm!")
+            optimizers[name].load_state_dict(optimizer_state)
+        for key, value in state["attributes"].items():
+            current = getattr(self, key, None)
+            if isinstance(current, torch.Tensor) and isinstance(value, torch.Tensor):
+                # parameters are updated in place, so that optimizers keep updating them
+                with torch.no_grad():
+                    current.copy_(value)
+            else:
+                setattr(self, key, value)
+
+    def _optimizers(self) -> dict:
+        """Optimizers and lr schedulers of the algorithm and its networks, keyed by attribute name"""
+        optimizers, found = {}, set()
+        for prefix, owner in (("", self), ("networks.", self.networks)):
+            for name, value in vars(owner).items():
+                items = value.items() if isinstance(value, dict) else [(None, value)]
+                for key, item in items:
+                    if isinstance(item, _OPTIMIZER_TYPES) and id(item) not in found:
+                        found.add(id(item))
+                        optimizers[prefix + name + ("" if key is None else "." + str(key))] = item
+        return optimizers
+
     def local_update(self, data: dict, iteration: int) -> dict:
         tb_info = self._local_update(data, iteration)
         for key, scheduler in self.networks.scheduler_dict.items():
@@ -82,7 +82,7 @@ class DDPG(AlgorithmBase):
         self.gamma = 0.99
         self.tau = 0.005
         self.delay_update = 1
-        self.per_flag = buffer_name == "prioritized_replay_buffer"
+        self.per_flag = buffer_name.endswith("prioritized_replay_buffer")
 
     @property
     def adjustable_parameters(self):
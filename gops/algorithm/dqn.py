@@ -77,7 +77,7 @@ class DQN(AlgorithmBase):
         self.tau = 0.005
         self.reward_scale = 1
         self.networks = ApproxContainer(**kwargs)
-        self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.per_flag = kwargs["buffer_name"].endswith("prioritized_replay_buffer")
 
     @property
     def adjustable_parameters(self):
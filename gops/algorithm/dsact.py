@@ -101,6 +101,8 @@ class DSACT(AlgorithmBase):
         self.mean_std2= None
         self.tau_b = kwargs.get("tau_b", self.tau)
 
+    checkpoint_attributes = ("mean_std1", "mean_std2")
+
     @property
     def adjustable_parameters(self):
         return (
@@ -43,6 +43,8 @@ class FHADPInterior(FHADP):
         self.max_penalty = max_penalty
         self.update_step = 0
 
+    checkpoint_attributes = ("penalty", "update_step")
+
     @property
     def adjustable_parameters(self) -> Tuple[str]:
         return (
@@ -44,6 +44,8 @@ class FHADPLagrangian(FHADP):
         self.multiplier_delay = multiplier_delay
         self.update_step = 0
 
+    checkpoint_attributes = ("multiplier_param", "update_step")
+
     @property
     def adjustable_parameters(self) -> Tuple[str]:
         return (
@@ -74,6 +74,8 @@ class FHADPLagrangiannet(FHADP):
         self.multiplier_delay = multiplier_delay
         self.update_step = 0
 
+    checkpoint_attributes = ("update_step",)
+
     @property
     def adjustable_parameters(self) -> Tuple[str]:
         return (
@@ -111,6 +111,8 @@ class MAC(AlgorithmBase):
         self.tb_info = dict()
         self.delta = None
 
+    checkpoint_attributes = ("delta",)
+
     @property
     def adjustable_parameters(self):
         para_tuple = (
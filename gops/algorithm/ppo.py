@@ -82,7 +82,7 @@ class PPO(AlgorithmBase):
         self.clip = 0.2
         self.clip_now = self.clip
         self.EPS = 1e-8
-        self.gamma = 0.99
+        self.gamma = kwargs.get("gamma", 0.99)
         self.reward_scale = 0.1
         self.loss_coefficient_kl = 0.2
         self.loss_coefficient_value = 1.0
@@ -101,6 +101,8 @@ class PPO(AlgorithmBase):
             self.networks.parameters(), lr=self.learning_rate
         )
 
+    checkpoint_attributes = ("clip_now", "indices")
+
     @property
     def adjustable_parameters(self):
         return (
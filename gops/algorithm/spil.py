@@ -111,6 +111,8 @@ class SPIL(AlgorithmBase):
         self.safe_prob_pre = np.array([0.0] * kwargs["constraint_dim"])
         self.chance_thre = np.array([0.97] * kwargs["constraint_dim"])
 
+    checkpoint_attributes = ("delta_i", "safe_prob_pre")
+
     @property
     def adjustable_parameters(self):
         para_tuple = (
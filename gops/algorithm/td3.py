@@ -96,7 +96,7 @@ class TD3(AlgorithmBase):
         self.tau = 0.005
         self.delay_update = 2
         self.reward_scale = 1
-        self.per_flag = buffer_name == "prioritized_replay_buffer"
+        self.per_flag = buffer_name.endswith("prioritized_replay_buffer")
 
     @property
     def adjustable_parameters(self):
@@ -0,0 +1,94 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Entry point of the benchmark suite
+#
+#  Usage: python -m gops.benchmark run --output results.json
+#         python -m gops.benchmark run --suites env buffer --duration 5 --output micro.json
+#         python -m gops.benchmark run --suites learner --algorithms SAC PPO --batch_sizes 64 256 1024
+#         python -m gops.benchmark run --suites trainer --trainers off_serial_trainer on_sync_trainer
+#         python -m gops.benchmark compare baseline.json results.json --threshold 0.1
+
+
+import argparse
+import sys
+
+import torch
+
+from gops.benchmark.compare import compare, load_results, print_comparison, save_results
+from gops.benchmark.suite import (
+    ALGORITHM_CONFIGS,
+    DEFAULT_ENV_IDS,
+    DEFAULT_TRAINERS,
+    SAMPLER_CONFIGS,
+    TRAINER_CONFIGS,
+    run_suite,
+)
+
+SUITES = ["env", "sampler", "buffer", "learner", "trainer"]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m gops.benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks and save their results to JSON")
+    run_parser.add_argument("--suites", type=str, nargs="+", default=SUITES, choices=SUITES)
+    run_parser.add_argument("--duration", type=float, default=2.0, help="Seconds each benchmark is timed")
+    run_parser.add_argument("--warmup", type=float, default=0.5, help="Seconds each benchmark runs untimed")
+    run_parser.add_argument("--env_ids", type=str, nargs="+", default=DEFAULT_ENV_IDS)
+    run_parser.add_argument("--samplers", type=str, nargs="+", default=list(SAMPLER_CONFIGS),
+                            choices=list(SAMPLER_CONFIGS))
+    run_parser.add_argument("--buffers", type=str, nargs="+", default=["replay_buffer", "prioritized_replay_buffer"])
+    run_parser.add_argument("--algorithms", type=str, nargs="+", default=list(ALGORITHM_CONFIGS),
+                            choices=list(ALGORITHM_CONFIGS))
+    run_parser.add_argument("--batch_sizes", type=int, nargs="+", default=[256])
+    run_parser.add_argument("--trainers", type=str, nargs="+", default=DEFAULT_TRAINERS,
+                            choices=list(TRAINER_CONFIGS))
+    run_parser.add_argument("--benchmark_env_id", type=str, default="pyth_veh3dofconti",
+                            help="Environment of the sampler, learner and trainer benchmarks")
+    run_parser.add_argument("--num_threads", type=int, default=None, help="Torch intra-op threads")
+    run_parser.add_argument("--output", type=str, default="benchmark_results.json")
+
+    compare_parser = subparsers.add_parser("compare", help="Flag regressions between two result files")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("candidate", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative slowdown beyond which a benchmark is a regression")
+    compare_parser.add_argument("--output", type=str, default=None, help="Save the comparison to JSON")
+    args = vars(parser.parse_args(argv))
+
+    if args["command"] == "run":
+        if args["num_threads"] is not None:
+            torch.set_num_threads(args["num_threads"])
+        results = run_suite(
+            suites=args["suites"],
+            duration=args["duration"],
+            warmup=args["warmup"],
+            env_ids=args["env_ids"],
+            samplers=args["samplers"],
+            buffers=args["buffers"],
+            algorithms=args["algorithms"],
+            batch_sizes=args["batch_sizes"],
+            trainers=args["trainers"],
+            benchmark_env_id=args["benchmark_env_id"],
+        )
+        save_results(results, args["output"])
+        print("Results saved to {}".format(args["output"]))
+        return 0
+
+    comparison = compare(load_results(args["baseline"]), load_results(args["candidate"]), args["threshold"])
+    print_comparison(comparison)
+    if args["output"] is not None:
+        save_results(comparison, args["output"])
+    # a non-zero exit status lets CI fail on regressions
+    return 1 if comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
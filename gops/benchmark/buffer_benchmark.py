@@ -0,0 +1,260 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Micro-benchmark of replay buffer insertion and prioritized sampling
+#
+#  Usage: python -m gops.benchmark.buffer_benchmark --batch_size 4096
+#         python -m gops.benchmark.buffer_benchmark --buffer_name prioritized_replay_buffer --per_latency
+#         python -m gops.benchmark.buffer_benchmark --num_samplers 8 16 32
+#         python -m gops.benchmark.buffer_benchmark --report_env_id pyth_veh3dofconti \
+#             --buffer_storage_dtype '{"obs": "float16", "done": "bool"}'
+
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from gops.create_pkg.create_buffer import create_buffer
+from gops.trainer.sampler.base import Experience
+
+
+def make_buffer_kwargs(buffer_name: str, obsv_dim: int, action_dim: int, buffer_max_size: int, **kwargs) -> dict:
+    buffer_kwargs = {
+        "buffer_name": buffer_name,
+        "trainer": "off_serial_trainer",
+        "seed": 0,
+        "obsv_dim": obsv_dim,
+        "action_dim": action_dim,
+        "buffer_max_size": buffer_max_size,
+        "additional_info": {},
+    }
+    buffer_kwargs.update(kwargs)
+    return buffer_kwargs
+
+
+def make_experiences(batch_size: int, obsv_dim: int, action_dim: int) -> list:
+    obs = np.random.randn(batch_size, obsv_dim).astype(np.float32)
+    obs2 = np.random.randn(batch_size, obsv_dim).astype(np.float32)
+    act = np.random.randn(batch_size, action_dim).astype(np.float32)
+    rew = np.random.randn(batch_size).astype(np.float32)
+    logp = np.random.randn(batch_size).astype(np.float32)
+    return [
+        Experience(obs[i], act[i], float(rew[i]), False, {}, obs2[i], {}, logp[i])
+        for i in range(batch_size)
+    ]
+
+
+def transitions_per_second(insert, batch, repeat: int) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        insert(batch)
+    return len(batch["rew"] if isinstance(batch, dict) else batch) * repeat / (time.perf_counter() - start_time)
+
+
+def run(buffer_name: str, batch_size: int, obsv_dim: int, action_dim: int, buffer_max_size: int, repeat: int) -> dict:
+    buffer = create_buffer(**make_buffer_kwargs(buffer_name, obsv_dim, action_dim, buffer_max_size))
+    experiences = make_experiences(batch_size, obsv_dim, action_dim)
+    columnar = buffer.experiences_to_batch(experiences)
+
+    def per_transition(samples):
+        for sample in samples:
+            buffer.store(*sample)
+
+    return {
+        "per_transition": transitions_per_second(per_transition, experiences, repeat),
+        "experience_list": transitions_per_second(buffer.add_batch, experiences, repeat),
+        "columnar": transitions_per_second(buffer.add_batch, columnar, repeat),
+    }
+
+
+def prioritized_latency(buffer_max_size: int, replay_batch_size: int, obsv_dim: int, action_dim: int, repeat: int) -> dict:
+    """Average latency [ms] of sample_batch and update_batch on a full prioritized buffer."""
+    buffer = create_buffer(**make_buffer_kwargs("prioritized_replay_buffer", obsv_dim, action_dim, buffer_max_size))
+    experiences = make_experiences(min(buffer_max_size, 65536), obsv_dim, action_dim)
+    columnar = buffer.experiences_to_batch(experiences)
+    while buffer.size < buffer_max_size:
+        buffer.add_batch(columnar)
+
+    sample_time, update_time = 0.0, 0.0
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        batch = buffer.sample_batch(replay_batch_size)
+        sample_time += time.perf_counter() - start_time
+        priorities = np.random.uniform(0.0, 2.0, size=replay_batch_size)
+        start_time = time.perf_counter()
+        buffer.update_batch(batch["idx"], priorities)
+        update_time += time.perf_counter() - start_time
+    return {
+        "sample_ms": sample_time * 1000 / repeat,
+        "update_ms": update_time * 1000 / repeat,
+    }
+
+
+def _forwarding_sampler(ready, go, queue, batch_size: int, obsv_dim: int, action_dim: int, num_batches: int) -> None:
+    experiences = make_experiences(batch_size, obsv_dim, action_dim)
+    ready.put(True)
+    go.wait()
+    for _ in range(num_batches):
+        queue.put(experiences)
+
+
+def _forwarding_buffer(ready, go, queue, buffer_kwargs: dict, num_batches: int) -> None:
+    buffer = create_buffer(**buffer_kwargs)
+    ready.put(True)
+    go.wait()
+    for _ in range(num_batches):
+        buffer.add_batch(queue.get())
+    ready.put(True)
+
+
+def _shared_memory_sampler(ready, go, buffer, batch_size: int, obsv_dim: int, action_dim: int,
+                           num_batches: int) -> None:
+    experiences = make_experiences(batch_size, obsv_dim, action_dim)
+    ready.put(True)
+    go.wait()
+    for _ in range(num_batches):
+        buffer.add_batch(experiences)
+    buffer.close()
+
+
+def _timed_run(context, ready, go, processes: list, driver=None) -> float:
+    for p in processes:
+        p.start()
+    for _ in processes:
+        ready.get()
+    start_time = time.perf_counter()
+    go.set()
+    if driver is not None:
+        driver()
+    for p in processes:
+        p.join()
+    return time.perf_counter() - start_time
+
+
+def sampler_throughput(num_samplers: int, batch_size: int, obsv_dim: int, action_dim: int, buffer_max_size: int,
+                       num_batches: int) -> dict:
+    """
+    End-to-end transitions/s from `num_samplers` sampler processes into a buffer.
+    `forwarding` mimics the Ray path of the parallel trainers, where samples are pickled to
+    the driver and again to a buffer process, `shared_memory` appends to a shared buffer.
+    """
+    context = multiprocessing.get_context("spawn")
+    buffer_kwargs = make_buffer_kwargs("replay_buffer", obsv_dim, action_dim, buffer_max_size)
+    total = batch_size * num_batches * num_samplers
+
+    ready, go = context.Queue(), context.Event()
+    sampler_queue, buffer_queue = context.Queue(maxsize=2 * num_samplers), context.Queue(maxsize=2)
+    processes = [
+        context.Process(
+            target=_forwarding_sampler,
+            args=(ready, go, sampler_queue, batch_size, obsv_dim, action_dim, num_batches),
+        )
+        for _ in range(num_samplers)
+    ]
+    processes.append(context.Process(
+        target=_forwarding_buffer, args=(ready, go, buffer_queue, buffer_kwargs, num_batches * num_samplers)
+    ))
+
+    def forward():
+        for _ in range(num_batches * num_samplers):
+            buffer_queue.put(sampler_queue.get())
+        ready.get()
+
+    forwarding = total / _timed_run(context, ready, go, processes, forward)
+
+    buffer_kwargs["buffer_name"] = "shared_memory_replay_buffer"
+    buffer = create_buffer(**buffer_kwargs)
+    ready, go = context.Queue(), context.Event()
+    processes = [
+        context.Process(
+            target=_shared_memory_sampler,
+            args=(ready, go, buffer, batch_size, obsv_dim, action_dim, num_batches),
+        )
+        for _ in range(num_samplers)
+    ]
+    shared_memory = total / _timed_run(context, ready, go, processes)
+    assert buffer.size == min(total, buffer_max_size)
+    buffer.close()
+    return {"forwarding": forwarding, "shared_memory": shared_memory}
+
+
+def storage_report(env_id: str, buffer_max_size: int, **kwargs) -> dict:
+    """Bytes per transition of each column of a buffer sized for `env_id`."""
+    from gops.create_pkg.create_env import create_env
+
+    env = create_env(env_id=env_id)
+    space = env.observation_space
+    buffer_kwargs = make_buffer_kwargs(
+        "replay_buffer",
+        space.shape[0] if len(space.shape) == 1 else space.shape,
+        env.action_space.shape[0] if env.action_space.shape else 1,
+        buffer_max_size,
+        obsv_low_limit=space.low.astype(np.float32),
+        obsv_high_limit=space.high.astype(np.float32),
+        additional_info=getattr(env, "additional_info", {}),
+        **kwargs,
+    )
+    if env.action_space.shape:
+        buffer_kwargs["action_low_limit"] = env.action_space.low.astype(np.float32)
+        buffer_kwargs["action_high_limit"] = env.action_space.high.astype(np.float32)
+    return create_buffer(**buffer_kwargs).bytes_per_transition()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer_name", type=str, default="replay_buffer")
+    parser.add_argument("--batch_size", type=int, default=4096)
+    parser.add_argument("--obsv_dim", type=int, default=32)
+    parser.add_argument("--action_dim", type=int, default=4)
+    parser.add_argument("--buffer_max_size", type=int, default=int(1e6))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--per_latency", action="store_true", help="Benchmark prioritized sample/update latency")
+    parser.add_argument("--replay_batch_size", type=int, default=256)
+    parser.add_argument("--report_env_id", type=str, default=None, help="Report bytes/transition for an env")
+    parser.add_argument("--buffer_storage_dtype", type=json.loads, default=None)
+    parser.add_argument("--buffer_compact_obs", action="store_true")
+    parser.add_argument("--num_samplers", type=int, nargs="*", default=None,
+                        help="Benchmark sampler-to-buffer throughput with these numbers of sampler processes")
+    parser.add_argument("--num_batches", type=int, default=50)
+    args = vars(parser.parse_args())
+
+    if args["report_env_id"] is not None:
+        report = storage_report(
+            args["report_env_id"], args["buffer_max_size"],
+            buffer_storage_dtype=args["buffer_storage_dtype"], buffer_compact_obs=args["buffer_compact_obs"],
+        )
+        for k, v in report.items():
+            print("{:>16s}: {:10.2f} bytes/transition".format(k, v))
+        print("{:>16s}: {:10.2f} bytes/transition".format("total", sum(report.values())))
+    elif args["num_samplers"]:
+        for num_samplers in args["num_samplers"]:
+            result = sampler_throughput(
+                num_samplers, args["batch_size"], args["obsv_dim"], args["action_dim"],
+                args["buffer_max_size"], args["num_batches"],
+            )
+            print("num_samplers = {:>3d}: forwarding {:10.0f}, shared memory {:10.0f} transitions/s".format(
+                num_samplers, result["forwarding"], result["shared_memory"]
+            ))
+    elif args["per_latency"]:
+        for buffer_max_size in [int(1e4), int(1e5), int(1e6)]:
+            result = prioritized_latency(
+                buffer_max_size, args["replay_batch_size"], args["obsv_dim"], args["action_dim"], args["repeat"]
+            )
+            print("buffer_max_size = {:>8d}: sample {:8.3f} ms, update {:8.3f} ms".format(
+                buffer_max_size, result["sample_ms"], result["update_ms"]
+            ))
+    else:
+        result = run(
+            args["buffer_name"], args["batch_size"], args["obsv_dim"], args["action_dim"],
+            args["buffer_max_size"], args["repeat"],
+        )
+        for k, v in result.items():
+            print("{:>16s}: {:12.0f} transitions/s".format(k, v))
@@ -0,0 +1,89 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Comparison of two benchmark result files, flagging regressions
+
+
+import json
+
+# metadata which makes rates of two runs not comparable when it differs
+_MACHINE_KEYS = ("hostname", "processor", "cpu_count", "torch_num_threads", "cuda")
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.1) -> dict:
+    """
+    Compare the rates of the benchmarks of two runs of `run_suite`. All rates are higher
+    is better, and a benchmark whose candidate rate is below (1 - `threshold`) times its
+    baseline rate is a regression, or above (1 + `threshold`) times an improvement.
+
+    Returns:
+        dict: "benchmarks" with the baseline and candidate rates, ratio and status of each
+            benchmark in both runs, "regressions" and "improvements" listing their names,
+            "missing" the benchmarks which ran in only one run, or failed in either, and
+            "machine_mismatch" the machine metadata which differs between the runs.
+    """
+    base_results, new_results = baseline["results"], candidate["results"]
+    benchmarks, regressions, improvements, missing = {}, [], [], []
+    for name in sorted(set(base_results) | set(new_results)):
+        base, new = base_results.get(name, {}), new_results.get(name, {})
+        if "value" not in base or "value" not in new:
+            missing.append(name)
+            continue
+        ratio = new["value"] / base["value"] if base["value"] > 0 else float("inf")
+        if ratio < 1 - threshold:
+            status = "regression"
+            regressions.append(name)
+        elif ratio > 1 + threshold:
+            status = "improvement"
+            improvements.append(name)
+        else:
+            status = "unchanged"
+        benchmarks[name] = {
+            "baseline": base["value"],
+            "candidate": new["value"],
+            "unit": new.get("unit", base.get("unit")),
+            "ratio": ratio,
+            "status": status,
+        }
+
+    base_meta, new_meta = baseline.get("metadata", {}), candidate.get("metadata", {})
+    machine_mismatch = {
+        k: (base_meta.get(k), new_meta.get(k)) for k in _MACHINE_KEYS if base_meta.get(k) != new_meta.get(k)
+    }
+    return {
+        "threshold": threshold,
+        "benchmarks": benchmarks,
+        "regressions": regressions,
+        "improvements": improvements,
+        "missing": missing,
+        "machine_mismatch": machine_mismatch,
+    }
+
+
+def print_comparison(comparison: dict) -> None:
+    for k, (base, new) in comparison["machine_mismatch"].items():
+        print("WARNING: {} differs between runs: {} vs {}".format(k, base, new))
+    print("{:<56s} {:>14s} {:>14s} {:>8s}".format("benchmark", "baseline", "candidate", "ratio"))
+    for name, b in comparison["benchmarks"].items():
+        flag = {"regression": "  REGRESSION", "improvement": "  improvement"}.get(b["status"], "")
+        print("{:<56s} {:14.1f} {:14.1f} {:8.3f}{}".format(name, b["baseline"], b["candidate"], b["ratio"], flag))
+    for name in comparison["missing"]:
+        print("{:<56s} {:>14s}".format(name, "missing"))
+    print("{} regressions, {} improvements beyond {:.0%}".format(
+        len(comparison["regressions"]), len(comparison["improvements"]), comparison["threshold"]
+    ))
@@ -0,0 +1,512 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Fixed-duration micro and macro benchmarks of environments, samplers, buffers,
+#               learners and trainers, with results saved to JSON alongside machine metadata
+
+
+import datetime
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+import torch
+
+import gops
+from gops.benchmark.buffer_benchmark import make_buffer_kwargs, make_experiences
+
+DEFAULT_ENV_IDS = ["pyth_veh3dofconti", "pyth_veh2dofconti", "pyth_idpendulum", "pyth_lq"]
+
+# algorithm arguments of the learner, sampler and trainer benchmarks
+ALGORITHM_CONFIGS = {
+    "DDPG": {
+        "policy_func_name": "DetermPolicy",
+        "policy_output_activation": "tanh",
+        "policy_act_distribution": "default",
+        "value_func_name": "ActionValue",
+        "value_learning_rate": 1e-3,
+        "policy_learning_rate": 1e-3,
+    },
+    "TD3": {
+        "policy_func_name": "DetermPolicy",
+        "policy_output_activation": "tanh",
+        "policy_act_distribution": "default",
+        "value_func_name": "ActionValue",
+        "value_learning_rate": 1e-3,
+        "policy_learning_rate": 1e-3,
+    },
+    "SAC": {
+        "policy_func_name": "StochaPolicy",
+        "policy_act_distribution": "TanhGaussDistribution",
+        "policy_min_log_std": -20,
+        "policy_max_log_std": 0.5,
+        "value_func_name": "ActionValue",
+        "q_learning_rate": 1e-3,
+        "policy_learning_rate": 1e-3,
+        "alpha_learning_rate": 1e-3,
+    },
+    "DSAC": {
+        "policy_func_name": "StochaPolicy",
+        "policy_act_distribution": "TanhGaussDistribution",
+        "policy_min_log_std": -20,
+        "policy_max_log_std": 0.5,
+        "value_func_name": "ActionValueDistri",
+        "value_min_log_std": -0.1,
+        "value_max_log_std": 4,
+        "value_learning_rate": 1e-3,
+        "policy_learning_rate": 1e-3,
+        "alpha_learning_rate": 1e-3,
+        "gamma": 0.99,
+        "tau": 0.005,
+        "auto_alpha": True,
+        "alpha": 0.2,
+        "delay_update": 2,
+        "TD_bound": 10,
+        "bound": True,
+    },
+    "PPO": {
+        "policy_func_name": "StochaPolicy",
+        "policy_act_distribution": "GaussDistribution",
+        "policy_min_log_std": -20,
+        "policy_max_log_std": 0.5,
+        "value_func_name": "StateValue",
+        "learning_rate": 3e-4,
+        "num_repeat": 1,
+        "num_mini_batch": 4,
+        "sampler_name": "on_sampler",
+    },
+}
+
+# sampler arguments of the sampler benchmark, applied over those of DDPG
+SAMPLER_CONFIGS = {
+    "off_sampler": {"sample_batch_size": 256},
+    "off_sampler_sync": {
+        "sample_batch_size": 256,
+        "vector_env_num": 8,
+        "vector_env_type": "sync",
+        "gym2gymnasium": True,
+    },
+    "off_sampler_batch": {
+        "sample_batch_size": 4096,
+        "vector_env_num": 1024,
+        "vector_env_type": "batch",
+        "gym2gymnasium": True,
+    },
+    "model_sampler": {"sampler_name": "model_sampler", "sample_batch_size": 4096, "model_env_num": 1024},
+    "on_sampler": {"sampler_name": "on_sampler", "sample_batch_size": 256},
+}
+
+# trainer arguments of the trainer benchmark, applied over those of the algorithm
+TRAINER_CONFIGS = {
+    "off_serial_trainer": {"algorithm": "SAC", "sample_batch_size": 8},
+    "on_serial_trainer": {"algorithm": "PPO", "sample_batch_size": 512},
+    "off_sync_trainer": {
+        "algorithm": "SAC",
+        "sample_batch_size": 8,
+        "num_algs": 1,
+        "num_samplers": 2,
+        "num_buffers": 1,
+    },
+    "off_async_trainer": {
+        "algorithm": "SAC",
+        "sample_batch_size": 8,
+        "num_algs": 2,
+        "num_samplers": 2,
+        "num_buffers": 1,
+    },
+    "on_sync_trainer": {"algorithm": "PPO", "sample_batch_size": 512, "num_samplers": 2},
+}
+DEFAULT_TRAINERS = ["off_serial_trainer", "off_sync_trainer", "off_async_trainer", "on_sync_trainer"]
+
+# trainers whose step counts its own iterations, the others count them in train
+_ITERATION_IN_STEP = ("off_sync_trainer", "off_async_trainer")
+
+
+def measure(fn: Callable[[], Optional[int]], duration: float, warmup: float = 0.0) -> dict:
+    """
+    Call `fn` repeatedly for `warmup` seconds, then for `duration` seconds, at least once,
+    returning the rate of units processed per second, where each call processes the number
+    of units it returns, or one if it returns None.
+    """
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < warmup:
+        fn()
+
+    units, calls = 0, 0
+    start_time = time.perf_counter()
+    while True:
+        processed = fn()
+        units += 1 if processed is None else processed
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= duration:
+            break
+    return {"value": units / elapsed, "calls": calls, "seconds": elapsed}
+
+
+def machine_metadata() -> dict:
+    """Description of the machine, software versions and source revision of a benchmark run."""
+    metadata = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_num_threads": torch.get_num_threads(),
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+        "gops": gops.__version__,
+        "git_commit": None,
+        "git_dirty": None,
+    }
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(gops.__file__)))
+    try:
+        metadata["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        metadata["git_dirty"] = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=repo, capture_output=True, text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return metadata
+
+
+def base_kwargs(env, env_id: str, algorithm: str, **kwargs) -> dict:
+    """Arguments of `algorithm` on the data environment `env`, as filled in by the training scripts."""
+    obs_space, act_space = env.observation_space, env.action_space
+    base = {
+        "env_id": env_id,
+        "algorithm": algorithm,
+        "trainer": "on_serial_trainer" if algorithm == "PPO" else "off_serial_trainer",
+        "seed": 0,
+        "enable_cuda": False,
+        "use_gpu": False,
+        "is_adversary": False,
+        "cnn_shared": False,
+        "action_type": "continu",
+        "obsv_dim": obs_space.shape[0],
+        "action_dim": act_space.shape[0],
+        "obsv_high_limit": obs_space.high.astype("float32"),
+        "obsv_low_limit": obs_space.low.astype("float32"),
+        "action_high_limit": act_space.high.astype("float32"),
+        "action_low_limit": act_space.low.astype("float32"),
+        "additional_info": getattr(env, "additional_info", {}),
+        "policy_func_type": "MLP",
+        "policy_hidden_sizes": [64, 64],
+        "policy_hidden_activation": "gelu",
+        "policy_output_activation": "linear",
+        "value_func_type": "MLP",
+        "value_hidden_sizes": [64, 64],
+        "value_hidden_activation": "gelu",
+        "value_output_activation": "linear",
+        "sampler_name": "off_sampler",
+        "sample_batch_size": 256,
+        "noise_params": None,
+        "buffer_name": "replay_buffer",
+        "buffer_max_size": int(1e5),
+        "replay_batch_size": 256,
+        "max_iteration": int(1e6),
+    }
+    base.update(ALGORITHM_CONFIGS[algorithm])
+    base.update(kwargs)
+    if algorithm == "PPO":
+        base.setdefault("mini_batch_size", base["sample_batch_size"] // base["num_mini_batch"])
+    return base
+
+
+def env_benchmark(env_id: str, env_type: str, duration: float, warmup: float, num_envs: int = 256,
+                  **kwargs) -> dict:
+    """
+    Environment steps/s of `env_id`. Data environments are stepped one step per call, or one
+    step of each sub-environment if `vector_env_num` is given, and model environments are
+    stepped for a batch of `num_envs` states per call.
+    """
+    from gops.create_pkg.create_env import create_env
+
+    env = create_env(env_id=env_id, **kwargs)
+    env.action_space.seed(0)
+    actions = [env.action_space.sample() for _ in range(64)]
+    step_count = [0]
+
+    if env_type == "data":
+        env.reset()
+        num = kwargs.get("vector_env_num", None) or 1
+
+        def step():
+            result = env.step(actions[step_count[0] % len(actions)])
+            step_count[0] += 1
+            # vector environments reset finished sub-environments themselves
+            if num == 1 and (result[2] or (len(result) == 5 and result[3])):
+                env.reset()
+            return num
+
+    elif env_type == "model":
+        from gops.create_pkg.create_env_model import create_env_model
+        from gops.trainer.buffer.replay_buffer import column_to_tensor, stack_column
+
+        model = create_env_model(env_id=env_id)
+        info_keys = list(getattr(env, "additional_info", {}).keys())
+        obs, infos = [], []
+        for _ in range(num_envs):
+            o, info = env.reset()
+            obs.append(o)
+            infos.append(info)
+        obs = torch.as_tensor(np.stack(obs), dtype=torch.float32)
+        info = {k: column_to_tensor(stack_column([i[k] for i in infos])) for k in info_keys}
+        actions = [
+            torch.as_tensor(np.stack([env.action_space.sample() for _ in range(num_envs)]), dtype=torch.float32)
+            for _ in range(4)
+        ]
+        done = torch.zeros(num_envs, dtype=torch.bool)
+
+        def step():
+            with torch.no_grad():
+                model.forward(obs, actions[step_count[0] % len(actions)], done, info)
+            step_count[0] += 1
+            return num_envs
+
+    else:
+        raise ValueError(f"Invalid environment type: {env_type}!")
+
+    result = measure(step, duration, warmup)
+    env.close()
+    return {**result, "unit": "steps/s"}
+
+
+def sampler_benchmark(sampler: str, env_id: str, duration: float, warmup: float, **kwargs) -> dict:
+    """Samples/s of the sampler configuration `sampler` of SAMPLER_CONFIGS with a DDPG policy."""
+    from gops.create_pkg.create_env import create_env
+    from gops.create_pkg.create_sampler import create_sampler
+
+    env = create_env(env_id=env_id)
+    algorithm = "PPO" if SAMPLER_CONFIGS[sampler].get("sampler_name") == "on_sampler" else "DDPG"
+    sampler_kwargs = base_kwargs(env, env_id, algorithm, **{**SAMPLER_CONFIGS[sampler], **kwargs})
+    env.close()
+    s = create_sampler(**sampler_kwargs)
+    sample_batch_size = sampler_kwargs["sample_batch_size"]
+
+    def sample():
+        s.sample()
+        return sample_batch_size
+
+    return {**measure(sample, duration, warmup), "unit": "samples/s"}
+
+
+def buffer_benchmark(buffer_name: str, duration: float, warmup: float, batch_size: int = 4096,
+                     replay_batch_size: int = 256, obsv_dim: int = 32, action_dim: int = 4,
+                     buffer_max_size: int = int(1e6)) -> Dict[str, dict]:
+    """Columnar insertion and sampling transitions/s, and prioritized update transitions/s, of a buffer."""
+    from gops.create_pkg.create_buffer import create_buffer
+
+    buffer = create_buffer(**make_buffer_kwargs(buffer_name, obsv_dim, action_dim, buffer_max_size))
+    batch = buffer.experiences_to_batch(make_experiences(batch_size, obsv_dim, action_dim))
+
+    def insert():
+        buffer.add_batch(batch)
+        return batch_size
+
+    results = {"insert": {**measure(insert, duration, warmup), "unit": "transitions/s"}}
+    while buffer.size < buffer_max_size:
+        buffer.add_batch(batch)
+
+    def sample():
+        buffer.sample_batch(replay_batch_size)
+        return replay_batch_size
+
+    results["sample"] = {**measure(sample, duration, warmup), "unit": "transitions/s"}
+
+    if hasattr(buffer, "update_batch"):
+        idx = buffer.sample_batch(replay_batch_size)["idx"]
+        priorities = np.random.uniform(0.0, 2.0, size=replay_batch_size)
+
+        def update():
+            buffer.update_batch(idx, priorities)
+            return replay_batch_size
+
+        results["update"] = {**measure(update, duration, warmup), "unit": "transitions/s"}
+    return results
+
+
+def learner_benchmark(algorithm: str, env_id: str, batch_size: int, duration: float, warmup: float,
+                      **kwargs) -> dict:
+    """
+    Updates/s of `algorithm` at `batch_size`, which is the replay batch size of off-policy
+    algorithms sampled from a buffer, and the sample batch size of on-policy algorithms.
+    """
+    from gops.create_pkg.create_alg import create_alg
+    from gops.create_pkg.create_buffer import create_buffer
+    from gops.create_pkg.create_env import create_env
+    from gops.create_pkg.create_sampler import create_sampler
+
+    env = create_env(env_id=env_id)
+    on_policy = ALGORITHM_CONFIGS[algorithm].get("sampler_name") == "on_sampler"
+    batch_kwargs = {"sample_batch_size": batch_size} if on_policy else {"replay_batch_size": batch_size}
+    alg_kwargs = base_kwargs(env, env_id, algorithm, **{**batch_kwargs, **kwargs})
+    env.close()
+    alg = create_alg(**alg_kwargs)
+    sampler = create_sampler(**alg_kwargs)
+
+    if on_policy:
+        data, _ = sampler.sample()
+
+        def get_batch():
+            return {k: v.clone() for k, v in data.items()}
+
+    else:
+        buffer = create_buffer(**alg_kwargs)
+        while buffer.size < max(batch_size, 2048):
+            buffer.add_batch(sampler.sample()[0])
+
+        def get_batch():
+            return buffer.sample_batch(batch_size)
+
+    iteration = [0]
+
+    def update():
+        alg.local_update(get_batch(), iteration[0])
+        iteration[0] += 1
+
+    return {**measure(update, duration, warmup), "unit": "updates/s"}
+
+
+def trainer_benchmark(trainer: str, env_id: str, duration: float, warmup: float, **kwargs) -> dict:
+    """
+    Iterations/s of the full trainer configuration `trainer` of TRAINER_CONFIGS, with
+    evaluation, logging and saving of networks pushed beyond the benchmark. Trainers are
+    created like in the training scripts, which start a local Ray instance.
+    """
+    import ray
+
+    from gops.create_pkg.create_alg import create_alg
+    from gops.create_pkg.create_buffer import create_buffer
+    from gops.create_pkg.create_env import create_env
+    from gops.create_pkg.create_evaluator import create_evaluator
+    from gops.create_pkg.create_sampler import create_sampler
+    from gops.create_pkg.create_trainer import create_trainer
+    from gops.utils.init_args import init_args
+
+    config = {**TRAINER_CONFIGS[trainer], **kwargs}
+    env = create_env(env_id=env_id)
+    save_folder = tempfile.mkdtemp(prefix="gops_benchmark_")
+    trainer_kwargs = base_kwargs(
+        env,
+        env_id,
+        config.pop("algorithm"),
+        trainer=trainer,
+        save_folder=save_folder,
+        buffer_warm_size=1000,
+        ini_network_dir=None,
+        evaluator_name="evaluator",
+        num_eval_episode=1,
+        eval_interval=int(1e9),
+        eval_save=False,
+        is_render=False,
+        log_save_interval=int(1e9),
+        apprfunc_save_interval=int(1e9),
+        **config,
+    )
+    try:
+        trainer_kwargs = init_args(env, **trainer_kwargs)
+        alg = create_alg(**trainer_kwargs)
+        sampler = create_sampler(**trainer_kwargs)
+        buffer = create_buffer(**trainer_kwargs)
+        evaluator = create_evaluator(**trainer_kwargs)
+        t = create_trainer(alg, sampler, buffer, evaluator, **trainer_kwargs)
+
+        def step():
+            start = t.iteration
+            with t.profiler.iteration():
+                t.step()
+            if trainer not in _ITERATION_IN_STEP:
+                t.iteration += 1
+            return t.iteration - start
+
+        result = measure(step, duration, warmup)
+    finally:
+        env.close()
+        if ray.is_initialized():
+            ray.shutdown()
+        shutil.rmtree(save_folder, ignore_errors=True)
+    return {**result, "unit": "iterations/s"}
+
+
+def _record(results: dict, name: str, fn: Callable, *args, verbose: bool = True, **kwargs) -> None:
+    """Run one benchmark into `results`, recording its error instead if it fails."""
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        results[name] = {"error": f"{type(e).__name__}: {e}"}
+        if verbose:
+            print("{:<56s} failed: {}".format(name, results[name]["error"]))
+        return
+    # benchmarks of several metrics return them keyed by metric
+    metrics = {name: result} if "value" in result else {f"{name}/{k}": v for k, v in result.items()}
+    results.update(metrics)
+    if verbose:
+        for k, v in metrics.items():
+            print("{:<56s} {:14.1f} {}".format(k, v["value"], v["unit"]))
+
+
+def run_suite(
+    suites: Iterable[str] = ("env", "sampler", "buffer", "learner", "trainer"),
+    duration: float = 2.0,
+    warmup: float = 0.5,
+    env_ids: Iterable[str] = DEFAULT_ENV_IDS,
+    samplers: Iterable[str] = tuple(SAMPLER_CONFIGS),
+    buffers: Iterable[str] = ("replay_buffer", "prioritized_replay_buffer"),
+    algorithms: Iterable[str] = tuple(ALGORITHM_CONFIGS),
+    batch_sizes: Iterable[int] = (256,),
+    trainers: Iterable[str] = DEFAULT_TRAINERS,
+    benchmark_env_id: str = "pyth_veh3dofconti",
+    verbose: bool = True,
+) -> dict:
+    """
+    Run the benchmarks of `suites`: the micro benchmarks `env`, `sampler`, `buffer` and `learner`,
+    and the macro benchmark `trainer`. Each benchmark runs for `duration` seconds after `warmup`
+    seconds, and results are keyed by "<suite>/<configuration>", with rates in "value", or the
+    error of failed benchmarks in "error". Samplers, learners and trainers use the data and
+    model environments of `benchmark_env_id`.
+    """
+    suites = list(suites)
+    results = {}
+    timing = {"duration": duration, "warmup": warmup, "verbose": verbose}
+    if "env" in suites:
+        for env_id in env_ids:
+            for env_type in ("data", "model"):
+                _record(results, f"env/{env_id}/{env_type}", env_benchmark, env_id, env_type, **timing)
+    if "sampler" in suites:
+        for sampler in samplers:
+            _record(results, f"sampler/{sampler}/{benchmark_env_id}", sampler_benchmark, sampler,
+                    benchmark_env_id, **timing)
+    if "buffer" in suites:
+        for buffer_name in buffers:
+            _record(results, f"buffer/{buffer_name}", buffer_benchmark, buffer_name, **timing)
+    if "learner" in suites:
+        for algorithm in algorithms:
+            for batch_size in batch_sizes:
+                _record(results, f"learner/{algorithm}/batch_{batch_size}", learner_benchmark, algorithm,
+                        benchmark_env_id, batch_size, **timing)
+    if "trainer" in suites:
+        for trainer in trainers:
+            _record(results, f"trainer/{trainer}/{benchmark_env_id}", trainer_benchmark, trainer,
+                    benchmark_env_id, **timing)
+
+    return {
+        "metadata": machine_metadata(),
+        "config": {"suites": suites, "duration": duration, "warmup": warmup, "benchmark_env_id": benchmark_env_id},
+        "results": results,
+    }
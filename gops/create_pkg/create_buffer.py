@@ -74,6 +74,11 @@ def create_buffer(**kwargs) -> object:
         buf = None
     elif trainer_name.startswith("off_serial"):
         buf = buffer_creator(**_kwargs)
+    elif (trainer_name.startswith("off_async") or trainer_name.startswith("off_sync")) and getattr(
+        buffer_creator, "process_shared", False
+    ):
+        # shared by samplers and learners through memory, no buffer actor needed
+        buf = [buffer_creator(index=idx, **_kwargs) for idx in range(_kwargs["num_buffers"])]
     elif trainer_name.startswith("off_async") or trainer_name.startswith("off_sync"):
         import ray
 
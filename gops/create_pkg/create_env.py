@@ -20,6 +20,9 @@ import numpy as np
 from gym.wrappers.time_limit import TimeLimit
 from gops.env.vector.sync_vector_env import SyncVectorEnv
 from gops.env.vector.async_vector_env import AsyncVectorEnv
+from gops.env.vector.tensor_vector_env import TensorVectorEnv
+from gops.env.vector.batch_vector_env import BatchVectorEnv
+from gops.create_pkg.create_env_model import create_env_model
 from gops.env.wrapper.action_repeat import ActionRepeatData
 from gops.env.wrapper.convert_type import ConvertType
 from gops.env.wrapper.gym2gymnasium import Gym2Gymnasium
@@ -37,6 +40,9 @@ class Spec:
     env_id: str
     entry_point: Callable
 
+    # Creator of a batch of environments stepped at once, if the environment has one
+    batch_entry_point: Optional[Callable] = None
+
     # Environment arguments
     kwargs: dict = field(default_factory=dict)
 
@@ -45,11 +51,19 @@ registry: Dict[str, Spec] = {}
 
 
 def register(
-    env_id: str, entry_point: Union[Callable, str], **kwargs,
+    env_id: str,
+    entry_point: Union[Callable, str],
+    batch_entry_point: Optional[Callable] = None,
+    **kwargs,
 ):
     global registry
 
-    new_spec = Spec(env_id=env_id, entry_point=entry_point, kwargs=kwargs)
+    new_spec = Spec(
+        env_id=env_id,
+        entry_point=entry_point,
+        batch_entry_point=batch_entry_point,
+        kwargs=kwargs,
+    )
 
     # print(registry.keys())
     # if new_spec.env_id in registry:
@@ -72,7 +86,11 @@ for env_dir_name in env_dir_list:
                 env_id_camel = underline2camel(env_id)
             
                 if hasattr(mdl, "env_creator"):
-                    register(env_id=env_id, entry_point=getattr(mdl, "env_creator"))
+                    register(
+                        env_id=env_id,
+                        entry_point=getattr(mdl, "env_creator"),
+                        batch_entry_point=getattr(mdl, "batch_env_creator", None),
+                    )
                 elif hasattr(mdl, env_id_camel):
                     register(env_id=env_id, entry_point=getattr(mdl, env_id_camel))
                 else:
@@ -85,6 +103,7 @@ def create_env(
     *,
     vector_env_num: Optional[int] = None,
     vector_env_type: Optional[str] = None,
+    vector_envs_per_worker: int = 1,
     max_episode_steps: Optional[int] = None,
     reward_shift: Optional[float] = None,
     reward_scale: Optional[float] = None,
@@ -104,6 +123,12 @@ def create_env(
         if all corresponding parameters are set to None.
 
     :param env: original data type environment.
+    :param Optional[str] vector_env_type: type of vector environment, "sync", "async", "tensor",
+        which steps the states of all environments at once with the environment model of env_gen_ocp
+        environments, or "batch", which steps all environments at once with the batched data
+        environment of the module's `batch_env_creator`.
+    :param int vector_envs_per_worker: number of environments hosted by each subprocess of async
+        vector environments, default to 1.
     :param Optional[int] max_episode_steps: parameter for gym.wrappers.time_limit.TimeLimit wrapper.
         if it is set to None but environment has 'max_episode_steps' attribute, it will be filled in
         TimeLimit wrapper alternatively.
@@ -134,8 +159,11 @@ def create_env(
     else:
         raise RuntimeError(f"{spec_.env_id} registered but entry_point is not specified")
 
-    def env_fn():
-        env = env_creator(**_kwargs)
+    def env_fn(batch_env_num: Optional[int] = None):
+        if batch_env_num is None:
+            env = env_creator(**_kwargs)
+        else:
+            env = spec_.batch_entry_point(env_num=batch_env_num, **_kwargs)
 
         env = ResetInfoData(env)
 
@@ -144,7 +172,8 @@ def create_env(
             _max_episode_steps = max_episode_steps
         elif hasattr(env, "max_episode_steps"):
             _max_episode_steps = getattr(env, "max_episode_steps")
-        if _max_episode_steps is not None:
+        # batched environments are truncated by BatchVectorEnv
+        if _max_episode_steps is not None and batch_env_num is None:
             env = TimeLimit(env, _max_episode_steps)
 
         if repeat_num is not None:
@@ -183,7 +212,38 @@ def create_env(
         if vector_env_type == "sync":
             env = SyncVectorEnv(env_fns)
         elif vector_env_type == "async":
-            env = AsyncVectorEnv(env_fns)
+            env = AsyncVectorEnv(env_fns, envs_per_worker=vector_envs_per_worker)
+        elif vector_env_type == "tensor":
+            env_model = create_env_model(
+                env_id,
+                reward_shift=reward_shift,
+                reward_scale=reward_scale,
+                obs_shift=obs_shift,
+                obs_scale=obs_scale,
+                clip_obs=False,
+                mask_at_done=False,
+                repeat_num=repeat_num,
+                sum_reward=sum_reward,
+                action_scale=action_scale,
+                min_action=min_action,
+                max_action=max_action,
+                **kwargs,
+            )
+            env = TensorVectorEnv(
+                env_fn,
+                env_model,
+                vector_env_num,
+                reward_scale=1.0 if reward_scale is None else reward_scale,
+                max_episode_steps=max_episode_steps,
+            )
+        elif vector_env_type == "batch":
+            if spec_.batch_entry_point is None:
+                raise ValueError(f"Env {env_id} has no batch_env_creator for vector_env_type batch!")
+            if repeat_num is not None:
+                raise ValueError("Action repeat is not supported by vector_env_type batch!")
+            env = BatchVectorEnv(
+                lambda: env_fn(vector_env_num), max_episode_steps=max_episode_steps
+            )
         else:
             raise ValueError(f"Invalid vector_env_type {vector_env_type}!")
 
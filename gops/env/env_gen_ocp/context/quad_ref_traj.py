@@ -76,6 +76,16 @@ class QuadContext(Context):
         self.state.reference = ref_points
         return self.state
     
+    def rollout_reference(self, steps: int) -> np.ndarray:
+        wp_idx = np.minimum(
+            self.ctrl_step_counter + np.arange(1, steps + 1), self.X_GOAL.shape[0] - 1
+        )
+        self.ctrl_step_counter += steps
+        new_ref_points = self.X_GOAL[wp_idx].astype(self.state.reference.dtype)
+        ref_points = np.concatenate((self.state.reference, new_ref_points))
+        self.state.reference = ref_points[-len(self.state.reference):].copy()
+        return new_ref_points
+
     def get_zero_state(self) -> ContextState[np.ndarray]:
         return ContextState(
             reference=np.zeros((self.pre_horizon + 1, len(self.X_GOAL[0])), dtype=np.float32))
@@ -29,22 +29,13 @@ class RefTrajContext(Context):
         path_num: int,
         speed_num: int,
     ) -> ContextState[np.ndarray]:
-        ref_points = []
-        for i in range(2 * self.pre_horizon + 1):
-            ref_x = self.ref_traj.compute_x(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_y = self.ref_traj.compute_y(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_phi = self.ref_traj.compute_phi(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_u = self.ref_traj.compute_u(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_points.append([ref_x, ref_y, ref_phi, ref_u])
-        ref_points = np.array(ref_points, dtype=np.float32)
+        t = ref_time + np.arange(2 * self.pre_horizon + 1) * self.dt
+        ref_points = np.stack([
+            self.ref_traj.compute_x(t, path_num, speed_num),
+            self.ref_traj.compute_y(t, path_num, speed_num),
+            self.ref_traj.compute_phi(t, path_num, speed_num),
+            self.ref_traj.compute_u(t, path_num, speed_num),
+        ], axis=1).astype(np.float32)
 
         self.state = ContextState(reference=ref_points)
         self.ref_time = ref_time
@@ -80,6 +71,19 @@ class RefTrajContext(Context):
 
         return self.state
 
+    def rollout_reference(self, steps: int) -> np.ndarray:
+        t = self.ref_time + (2 * self.pre_horizon + np.arange(1, steps + 1)) * self.dt
+        new_ref_points = np.stack([
+            self.ref_traj.compute_x(t, self.path_num, self.speed_num),
+            self.ref_traj.compute_y(t, self.path_num, self.speed_num),
+            self.ref_traj.compute_phi(t, self.path_num, self.speed_num),
+            self.ref_traj.compute_u(t, self.path_num, self.speed_num),
+        ], axis=1).astype(np.float32)
+        self.ref_time = self.ref_time + steps * self.dt
+        ref_points = np.concatenate((self.state.reference, new_ref_points))
+        self.state.reference = ref_points[-len(self.state.reference):].copy()
+        return new_ref_points
+
     def get_zero_state(self) -> ContextState[np.ndarray]:
         return ContextState(
             reference=np.zeros((2 * self.pre_horizon + 1, 4), dtype=np.float32),
@@ -85,7 +85,7 @@ class LqControlModel(EnvModel):
         obs = state.robot_state
         high = self.state_high.to(self.device)
         low = self.state_low.to(self.device)
-        return torch.any(obs > high) or torch.any(obs < low)
+        return torch.any((obs > high) | (obs < low), dim=-1)
 
 
 def env_creator(**kwargs):
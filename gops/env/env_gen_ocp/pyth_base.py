@@ -175,6 +175,13 @@ class Context(metaclass=ABCMeta):
     def get_zero_state(self) -> ContextState[np.ndarray]:
         ...
 
+    def rollout_reference(self, steps: int) -> np.ndarray:
+        """
+        Advance a time-indexed context by `steps` steps, returning the reference points
+        appended to the end of its reference window, stacked along the first axis.
+        """
+        return np.stack([self.step().reference[-1].copy() for _ in range(steps)])
+
 
 class Env(gym.Env, metaclass=ABCMeta):
     robot: Robot
@@ -58,15 +58,16 @@ class PythBaseEnv(gym.Env):
         else:
             raise ValueError(f"Invalid mode: {self.mode}!")
 
-    def sample_initial_state(self):
+    def sample_initial_state(self, batch_size: Optional[int] = None):
+        size = None if batch_size is None else (batch_size,) + self.init_space[0].shape
         if self.initial_distribution == "uniform":
             state = self.np_random.uniform(
-                low=self.init_space[0], high=self.init_space[1]
+                low=self.init_space[0], high=self.init_space[1], size=size
             )
         elif self.initial_distribution == "normal":
             mean = (self.init_space[0] + self.init_space[1]) / 2
             std = (self.init_space[1] - self.init_space[0]) / 6
-            state = self.np_random.normal(loc=mean, scale=std)
+            state = self.np_random.normal(loc=mean, scale=std, size=size)
         else:
             raise ValueError(
                 f"Invalid initial distribution: {self.initial_distribution}!"
@@ -42,8 +42,9 @@ class VehicleDynamicsData:
         self.vehicle_params.update(dict(F_zf=F_zf, F_zr=F_zr))
 
     def f_xu(self, states, actions, delta_t):
-        y, phi, v, w = states
-        steer = actions[0]
+        # states and actions may carry leading batch dimensions
+        y, phi, v, w = np.moveaxis(states, -1, 0)
+        steer = actions[..., 0]
         u = self.vehicle_params["u"]
         k_f = self.vehicle_params["k_f"]
         k_r = self.vehicle_params["k_r"]
@@ -68,7 +69,7 @@ class VehicleDynamicsData:
             )
             / (I_z * u - delta_t * (l_f ** 2 * k_f + l_r ** 2 * k_r)),
         ]
-        return np.array(next_state, dtype=np.float32)
+        return np.stack(next_state, axis=-1).astype(np.float32)
 
 
 class SimuVeh2dofconti(PythBaseEnv):
@@ -155,16 +156,10 @@ class SimuVeh2dofconti(PythBaseEnv):
         else:
             self.u_num = self.np_random.choice([1])
 
-        ref_points = []
-        for i in range(self.pre_horizon + 1):
-            ref_y = self.ref_traj.compute_y(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_phi = self.ref_traj.compute_phi(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_points.append([ref_y, ref_phi])
-        self.ref_points = np.array(ref_points, dtype=np.float32)
+        self.ref_points = self.ref_traj.compute_ref_points(
+            self.t + np.arange(self.pre_horizon + 1) * self.dt,
+            self.path_num, self.u_num, keys=("y", "phi"),
+        ).astype(np.float32)
 
         if init_state is not None:
             delta_state = np.array(init_state, dtype=np.float32)
@@ -183,50 +178,47 @@ class SimuVeh2dofconti(PythBaseEnv):
 
         # ground and ego vehicle coordinates change
         relative_state = self.state.copy()
-        relative_state[:2] = 0
+        relative_state[..., :2] = 0
         next_relative_state = self.vehicle_dynamics.f_xu(
             relative_state, action, self.dt
         )
-        y, phi = self.state[:2]
+        y, phi = self.state[..., 0], self.state[..., 1]
         u = self.vehicle_dynamics.vehicle_params["u"]
-        next_y = y + u * np.sin(phi) * self.dt + next_relative_state[0] * np.cos(phi)
-        next_phi = phi + next_relative_state[1]
+        next_y = y + u * np.sin(phi) * self.dt + next_relative_state[..., 0] * np.cos(phi)
+        next_phi = phi + next_relative_state[..., 1]
         next_phi = angle_normalize(next_phi)
         self.state = np.concatenate(
-            (np.array([next_y, next_phi], dtype=np.float32), next_relative_state[2:])
+            (
+                np.stack((next_y, next_phi), axis=-1).astype(np.float32),
+                next_relative_state[..., 2:],
+            ),
+            axis=-1,
         )
 
         self.t = self.t + self.dt
 
-        self.ref_points[:-1] = self.ref_points[1:]
-        new_ref_point = np.array(
-            [
-                self.ref_traj.compute_y(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_phi(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-            ],
-            dtype=np.float32,
+        self.ref_points[..., :-1, :] = self.ref_points[..., 1:, :]
+        self.ref_points[..., -1, :] = self.ref_traj.compute_ref_points(
+            self.t + self.pre_horizon * self.dt, self.path_num, self.u_num,
+            keys=("y", "phi"),
         )
-        self.ref_points[-1] = new_ref_point
 
         self.done = self.judge_done()
-        if self.done:
-            reward = reward - 100
+        reward = reward - 100 * self.done
 
         return self.get_obs(), reward, self.done, self.info
 
     def get_obs(self) -> np.ndarray:
-        ego_obs = np.concatenate((self.state[:2] - self.ref_points[0], self.state[2:]))
-        ref_obs = (self.state[np.newaxis, :1] - self.ref_points[1:, :1]).flatten()
-        return np.concatenate((ego_obs, ref_obs))
+        ego_obs = np.concatenate(
+            (self.state[..., :2] - self.ref_points[..., 0, :], self.state[..., 2:]), -1
+        )
+        ref_obs = self.state[..., :1] - self.ref_points[..., 1:, 0]
+        return np.concatenate((ego_obs, ref_obs), -1)
 
     def compute_reward(self, action: np.ndarray) -> float:
-        y, phi, v, w = self.state
-        ref_y, ref_phi = self.ref_points[0]
-        steer = action[0]
+        y, phi, v, w = np.moveaxis(self.state, -1, 0)
+        ref_y, ref_phi = np.moveaxis(self.ref_points[..., 0, :], -1, 0)
+        steer = action[..., 0]
         return -(
             0.04 * (y - ref_y) ** 2
             + 0.02 * (phi - ref_phi) ** 2
@@ -236,8 +228,8 @@ class SimuVeh2dofconti(PythBaseEnv):
         )
 
     def judge_done(self) -> bool:
-        y, phi = self.state[:2]
-        ref_y, ref_phi = self.ref_points[0]
+        y, phi = self.state[..., 0], self.state[..., 1]
+        ref_y, ref_phi = np.moveaxis(self.ref_points[..., 0, :], -1, 0)
         done = (np.abs(y - ref_y) > 2) | (np.abs(phi - ref_phi) > np.pi)
         return done
 
@@ -249,7 +241,7 @@ class SimuVeh2dofconti(PythBaseEnv):
             "path_num": self.path_num,
             "u_num": self.u_num,
             "ref_time": self.t,
-            "ref": self.ref_points[0].copy(),
+            "ref": self.ref_points[..., 0, :].copy(),
         }
     
     def render(self, mode="human"):
@@ -314,8 +306,84 @@ class SimuVeh2dofconti(PythBaseEnv):
         ax.text(left_x, top_y, f'time: {self.t:.1f}s')
 
 
+class SimuVeh2dofcontiBatch(SimuVeh2dofconti):
+    """
+    Batch of `env_num` vehicle 2DOF environments stepped by single NumPy expressions,
+    see `SimuVeh3dofcontiBatch`.
+    """
+
+    def __init__(
+        self,
+        pre_horizon: int = 10,
+        path_para: Optional[Dict[str, Dict]] = None,
+        u_para: Optional[Dict[str, Dict]] = None,
+        max_steer: float = np.pi / 6,
+        env_num: int = 1,
+        **kwargs,
+    ):
+        super().__init__(pre_horizon, path_para, u_para, max_steer, **kwargs)
+        self.env_num = env_num
+        self.state = np.zeros((env_num, self.state_dim), dtype=np.float32)
+        self.path_num = np.zeros(env_num, dtype=np.int64)
+        self.u_num = np.zeros(env_num, dtype=np.int64)
+        self.t = np.zeros(env_num)
+        self.ref_points = np.zeros((env_num, pre_horizon + 1, 2), dtype=np.float32)
+
+    def reset(
+        self,
+        init_state: Optional[Sequence] = None,
+        ref_time: Optional[float] = None,
+        ref_num: Optional[int] = None,
+        reset_mask: Optional[np.ndarray] = None,
+        **kwargs,
+    ) -> Tuple[np.ndarray, dict]:
+        rows = np.arange(self.env_num) if reset_mask is None else np.flatnonzero(reset_mask)
+        n = len(rows)
+        if ref_time is not None:
+            self.t[rows] = ref_time
+        else:
+            self.t[rows] = 20.0 * self.np_random.uniform(0.0, 1.0, n)
+
+        # Calculate path num and speed num: ref_num = [0, 1, 2,..., 7]
+        if ref_num is not None:
+            self.path_num[rows] = np.asarray(ref_num) // 2
+            self.u_num[rows] = np.asarray(ref_num) % 2
+        else:
+            self.path_num[rows] = self.np_random.choice([0, 1, 2, 3], n)
+            self.u_num[rows] = self.np_random.choice([1], n)
+
+        self.ref_points[rows] = self.ref_traj.compute_ref_points(
+            self.t[rows, np.newaxis] + np.arange(self.pre_horizon + 1) * self.dt,
+            self.path_num[rows], self.u_num[rows],
+            keys=("y", "phi"),
+        )
+
+        if init_state is not None:
+            delta_state = np.broadcast_to(
+                np.asarray(init_state, dtype=np.float32), (n, self.state_dim)
+            )
+        else:
+            delta_state = self.sample_initial_state(n)
+        self.state[rows] = np.concatenate(
+            (self.ref_points[rows, 0] + delta_state[:, :2], delta_state[:, 2:]), 1
+        )
+
+        return self.get_obs(), self.info
+
+    @property
+    def info(self) -> dict:
+        return {k: np.array(v) for k, v in super().info.items()}
+
+
 def env_creator(**kwargs):
     """
     make env `pyth_veh2dofconti`
     """
     return SimuVeh2dofconti(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    """
+    make batch of env `pyth_veh2dofconti`
+    """
+    return SimuVeh2dofcontiBatch(**kwargs)
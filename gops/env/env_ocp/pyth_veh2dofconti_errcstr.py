@@ -13,7 +13,7 @@ from typing import Any, Dict, Optional
 
 import numpy as np
 
-from gops.env.env_ocp.pyth_veh2dofconti import SimuVeh2dofconti
+from gops.env.env_ocp.pyth_veh2dofconti import SimuVeh2dofconti, SimuVeh2dofcontiBatch
 
 
 class SimuVeh2dofcontiErrCstr(SimuVeh2dofconti):
@@ -32,9 +32,9 @@ class SimuVeh2dofcontiErrCstr(SimuVeh2dofconti):
         )
 
     def get_constraint(self) -> np.ndarray:
-        y = self.state[0]
-        y_ref = self.ref_points[0, 0]
-        constraint = np.array([abs(y - y_ref) - self.y_error_tol], dtype=np.float32)
+        y = self.state[..., :1]
+        y_ref = self.ref_points[..., 0, :1]
+        constraint = (abs(y - y_ref) - self.y_error_tol).astype(np.float32)
         return constraint
 
     @property
@@ -46,5 +46,15 @@ class SimuVeh2dofcontiErrCstr(SimuVeh2dofconti):
         return info
 
 
+class SimuVeh2dofcontiErrCstrBatch(SimuVeh2dofcontiErrCstr, SimuVeh2dofcontiBatch):
+    """
+    Batch of `env_num` environments `SimuVeh2dofcontiErrCstr`, see `SimuVeh2dofcontiBatch`.
+    """
+
+
 def env_creator(**kwargs):
     return SimuVeh2dofcontiErrCstr(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    return SimuVeh2dofcontiErrCstrBatch(**kwargs)
@@ -41,8 +41,9 @@ class VehicleDynamicsData:
         self.vehicle_params.update(dict(F_zf=F_zf, F_zr=F_zr))
 
     def f_xu(self, states, actions, delta_t):
-        x, y, phi, u, v, w = states
-        steer, a_x = actions
+        # states and actions may carry leading batch dimensions
+        x, y, phi, u, v, w = np.moveaxis(states, -1, 0)
+        steer, a_x = np.moveaxis(actions, -1, 0)
         k_f = self.vehicle_params["k_f"]
         k_r = self.vehicle_params["k_r"]
         l_f = self.vehicle_params["l_f"]
@@ -69,7 +70,7 @@ class VehicleDynamicsData:
             / (I_z * u - delta_t * (np.square(l_f) * k_f + np.square(l_r) * k_r)),
         ]
         next_state[2] = angle_normalize(next_state[2])
-        return np.array(next_state, dtype=np.float32)
+        return np.stack(next_state, axis=-1).astype(np.float32)
 
 
 class SimuVeh3dofconti(PythBaseEnv):
@@ -165,22 +166,9 @@ class SimuVeh3dofconti(PythBaseEnv):
         else:
             self.u_num = self.np_random.choice([0, 1])
 
-        ref_points = []
-        for i in range(self.pre_horizon + 1):
-            ref_x = self.ref_traj.compute_x(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_y = self.ref_traj.compute_y(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_phi = self.ref_traj.compute_phi(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_u = self.ref_traj.compute_u(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_points.append([ref_x, ref_y, ref_phi, ref_u])
-        self.ref_points = np.array(ref_points, dtype=np.float32)
+        self.ref_points = self.ref_traj.compute_ref_points(
+            self.t + np.arange(self.pre_horizon + 1) * self.dt, self.path_num, self.u_num
+        ).astype(np.float32)
 
         if init_state is not None:
             delta_state = np.array(init_state, dtype=np.float32)
@@ -201,55 +189,39 @@ class SimuVeh3dofconti(PythBaseEnv):
 
         self.t = self.t + self.dt
 
-        self.ref_points[:-1] = self.ref_points[1:]
-        new_ref_point = np.array(
-            [
-                self.ref_traj.compute_x(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_y(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_phi(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_u(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-            ],
-            dtype=np.float32,
+        self.ref_points[..., :-1, :] = self.ref_points[..., 1:, :]
+        self.ref_points[..., -1, :] = self.ref_traj.compute_ref_points(
+            self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
         )
-        self.ref_points[-1] = new_ref_point
 
         self.done = self.judge_done()
-        if self.done:
-            reward = reward - 100
+        reward = reward - 100 * self.done
 
         return self.get_obs(), reward, self.done, self.info
 
     def get_obs(self) -> np.ndarray:
         ref_x_tf, ref_y_tf, ref_phi_tf = \
             ego_vehicle_coordinate_transform(
-                self.state[0], self.state[1], self.state[2],
-                self.ref_points[:, 0], self.ref_points[:, 1], self.ref_points[:, 2],
+                self.state[..., 0:1], self.state[..., 1:2], self.state[..., 2:3],
+                self.ref_points[..., 0], self.ref_points[..., 1], self.ref_points[..., 2],
             )
-        ref_u_tf = self.ref_points[:, 3] - self.state[3]
+        ref_u_tf = self.ref_points[..., 3] - self.state[..., 3:4]
         # ego_obs: [
         # delta_x, delta_y, delta_phi, delta_u, (of the first reference point)
         # v, w (of ego vehicle)
         # ]
-        ego_obs = np.concatenate(
-            ([ref_x_tf[0], ref_y_tf[0], ref_phi_tf[0], ref_u_tf[0]], self.state[4:]))
+        ref_obs_tf = np.stack((ref_x_tf, ref_y_tf, ref_phi_tf, ref_u_tf), -1)
+        ego_obs = np.concatenate((ref_obs_tf[..., 0, :], self.state[..., 4:]), -1)
         # ref_obs: [
         # delta_x, delta_y, delta_phi, delta_u (of the second to last reference point)
         # ]
-        ref_obs = np.stack((ref_x_tf, ref_y_tf, ref_phi_tf, ref_u_tf), 1)[1:].flatten()
-        return np.concatenate((ego_obs, ref_obs))
+        ref_obs = ref_obs_tf[..., 1:, :].reshape(ref_obs_tf.shape[:-2] + (-1,))
+        return np.concatenate((ego_obs, ref_obs), -1)
 
     def compute_reward(self, action: np.ndarray) -> float:
-        x, y, phi, u, _, w = self.state
-        ref_x, ref_y, ref_phi, ref_u = self.ref_points[0]
-        steer, a_x = action
+        x, y, phi, u, _, w = np.moveaxis(self.state, -1, 0)
+        ref_x, ref_y, ref_phi, ref_u = np.moveaxis(self.ref_points[..., 0, :], -1, 0)
+        steer, a_x = np.moveaxis(action, -1, 0)
         return -(
             0.04 * (x - ref_x) ** 2
             + 0.04 * (y - ref_y) ** 2
@@ -261,8 +233,8 @@ class SimuVeh3dofconti(PythBaseEnv):
         )
 
     def judge_done(self) -> bool:
-        x, y, phi = self.state[:3]
-        ref_x, ref_y, ref_phi = self.ref_points[0, :3]
+        x, y, phi = np.moveaxis(self.state[..., :3], -1, 0)
+        ref_x, ref_y, ref_phi = np.moveaxis(self.ref_points[..., 0, :3], -1, 0)
         done = (
             (np.abs(x - ref_x) > 5)
             | (np.abs(y - ref_y) > 2)
@@ -278,7 +250,7 @@ class SimuVeh3dofconti(PythBaseEnv):
             "path_num": self.path_num,
             "u_num": self.u_num,
             "ref_time": self.t,
-            "ref": self.ref_points[0].copy(),
+            "ref": self.ref_points[..., 0, :].copy(),
         }
 
     def render(self, mode="human"):
@@ -346,6 +318,78 @@ class SimuVeh3dofconti(PythBaseEnv):
         ax.text(left_x, top_y - 2 * delta_y, f'ref speed: {ref_speed:.1f}km/h')
 
 
+class SimuVeh3dofcontiBatch(SimuVeh3dofconti):
+    """
+    Batch of `env_num` vehicle 3DOF environments stepped by single NumPy expressions.
+    States, reference points, reference times, path and speed numbers are arrays whose
+    first dimension indexes the environments, and `step` takes and returns the batched
+    actions, observations, rewards, dones and info. `reset` resets the environments of
+    `reset_mask`, or all of them, and returns the observations and info of the whole batch.
+    Episodes are not truncated, which is left to the vector environment.
+    """
+
+    def __init__(
+        self,
+        pre_horizon: int = 10,
+        path_para: Optional[Dict[str, Dict]] = None,
+        u_para: Optional[Dict[str, Dict]] = None,
+        max_steer: float = np.pi / 6,
+        env_num: int = 1,
+        **kwargs,
+    ):
+        super().__init__(pre_horizon, path_para, u_para, max_steer, **kwargs)
+        self.env_num = env_num
+        self.state = np.zeros((env_num, self.state_dim), dtype=np.float32)
+        self.path_num = np.zeros(env_num, dtype=np.int64)
+        self.u_num = np.zeros(env_num, dtype=np.int64)
+        self.t = np.zeros(env_num)
+        self.ref_points = np.zeros((env_num, pre_horizon + 1, 4), dtype=np.float32)
+
+    def reset(
+        self,
+        init_state: Optional[Sequence] = None,
+        ref_time: Optional[float] = None,
+        ref_num: Optional[int] = None,
+        reset_mask: Optional[np.ndarray] = None,
+        **kwargs,
+    ) -> Tuple[np.ndarray, dict]:
+        rows = np.arange(self.env_num) if reset_mask is None else np.flatnonzero(reset_mask)
+        n = len(rows)
+        if ref_time is not None:
+            self.t[rows] = ref_time
+        else:
+            self.t[rows] = 20.0 * self.np_random.uniform(0.0, 1.0, n)
+
+        # Calculate path num and speed num: ref_num = [0, 1, 2,..., 7]
+        if ref_num is not None:
+            self.path_num[rows] = np.asarray(ref_num) // 2
+            self.u_num[rows] = np.asarray(ref_num) % 2
+        else:
+            self.path_num[rows] = self.np_random.choice([0, 1, 2, 3], n)
+            self.u_num[rows] = self.np_random.choice([0, 1], n)
+
+        self.ref_points[rows] = self.ref_traj.compute_ref_points(
+            self.t[rows, np.newaxis] + np.arange(self.pre_horizon + 1) * self.dt,
+            self.path_num[rows], self.u_num[rows],
+        )
+
+        if init_state is not None:
+            delta_state = np.broadcast_to(
+                np.asarray(init_state, dtype=np.float32), (n, self.state_dim)
+            )
+        else:
+            delta_state = self.sample_initial_state(n)
+        self.state[rows] = np.concatenate(
+            (self.ref_points[rows, 0] + delta_state[:, :4], delta_state[:, 4:]), 1
+        )
+
+        return self.get_obs(), self.info
+
+    @property
+    def info(self) -> dict:
+        return {k: np.array(v) for k, v in super().info.items()}
+
+
 def ego_vehicle_coordinate_transform(
     ego_x: np.ndarray,
     ego_y: np.ndarray,
@@ -383,3 +427,10 @@ def env_creator(**kwargs):
     make env `pyth_veh3dofconti`
     """
     return SimuVeh3dofconti(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    """
+    make batch of env `pyth_veh3dofconti`
+    """
+    return SimuVeh3dofcontiBatch(**kwargs)
@@ -15,7 +15,7 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple
 import gym
 import numpy as np
 
-from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti, angle_normalize, ego_vehicle_coordinate_transform
+from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti, SimuVeh3dofcontiBatch, angle_normalize, ego_vehicle_coordinate_transform
 
 
 @dataclass
@@ -36,6 +36,22 @@ class SurrVehicleData:
         self.phi = self.phi + self.u * np.tan(self.delta) / self.l * self.dt
         self.phi = angle_normalize(self.phi)
 
+    @staticmethod
+    def step_batch(surr_state: np.ndarray, l: float = 3.0, dt: float = 0.1) -> np.ndarray:
+        """
+        Step surrounding vehicles given as rows [x, y, phi, u, delta] of `surr_state`,
+        like `step`, and return their next states.
+        """
+        x, y, phi, u, delta = np.moveaxis(surr_state, -1, 0)
+        next_state = [
+            x + u * np.cos(phi) * dt,
+            y + u * np.sin(phi) * dt,
+            angle_normalize(phi + u * np.tan(delta) / l * dt),
+            u,
+            delta,
+        ]
+        return np.stack(next_state, axis=-1).astype(surr_state.dtype)
+
 
 class SimuVeh3dofcontiDetour(SimuVeh3dofconti):
     def __init__(
@@ -153,11 +169,11 @@ class SimuVeh3dofcontiDetour(SimuVeh3dofconti):
     def get_obs(self) -> np.ndarray:
         obs = super().get_obs()
         surr_x_tf, surr_y_tf, surr_phi_tf = ego_vehicle_coordinate_transform(
-            self.state[0], self.state[1], self.state[2], 
-            self.surr_state[:, 0], self.surr_state[:, 1], self.surr_state[:, 2])
+            self.state[..., 0:1], self.state[..., 1:2], self.state[..., 2:3],
+            self.surr_state[..., 0], self.surr_state[..., 1], self.surr_state[..., 2])
         surr_obs_rel = np.concatenate(
-            ([surr_x_tf[0], surr_y_tf[0], surr_phi_tf[0],], self.surr_state[:, 3]))  # TODO: 多辆车 , [np.sign(surr_y_tf[0])]
-        return np.concatenate((obs, surr_obs_rel))
+            (surr_x_tf[..., :1], surr_y_tf[..., :1], surr_phi_tf[..., :1], self.surr_state[..., 3]), -1)  # TODO: 多辆车 , [np.sign(surr_y_tf[0])]
+        return np.concatenate((obs, surr_obs_rel), -1)
 
     def get_constraint(self) -> np.ndarray:
         # collision detection using bicircle model
@@ -166,59 +182,57 @@ class SimuVeh3dofcontiDetour(SimuVeh3dofconti):
         # circle radius
         r = 0.5 * self.veh_width
 
-        x, y, phi = self.state[:3]
-        ego_center = np.array(
-            [
-                [x + d * np.cos(phi), y + d * np.sin(phi)],
-                [x - d * np.cos(phi), y - d * np.sin(phi)],
-            ],
-            dtype=np.float32,
-        )
+        x, y, phi = self.state[..., 0], self.state[..., 1], self.state[..., 2]
+        ego_center = np.stack(
+            (
+                np.stack((x + d * np.cos(phi), y + d * np.sin(phi)), axis=-1),
+                np.stack((x - d * np.cos(phi), y - d * np.sin(phi)), axis=-1),
+            ),
+            axis=-2,
+        ).astype(np.float32)
 
-        surr_x = self.surr_state[:, 0]
-        surr_y = self.surr_state[:, 1]
-        surr_phi = self.surr_state[:, 2]
+        surr_x = self.surr_state[..., 0]
+        surr_y = self.surr_state[..., 1]
+        surr_phi = self.surr_state[..., 2]
         surr_center = np.stack(
             (
                 np.stack(
                     ((surr_x + d * np.cos(surr_phi)), surr_y + d * np.sin(surr_phi)),
-                    axis=1,
+                    axis=-1,
                 ),
                 np.stack(
                     ((surr_x - d * np.cos(surr_phi)), surr_y - d * np.sin(surr_phi)),
-                    axis=1,
+                    axis=-1,
                 ),
             ),
-            axis=1,
+            axis=-2,
         )
 
-        min_dist = np.inf
-        for i in range(2):
-            # front and rear circle of ego vehicle
-            for j in range(2):
-                # front and rear circle of surrounding vehicles
-                dist = np.linalg.norm(
-                    ego_center[np.newaxis, i] - surr_center[:, j], axis=1
-                )
-                min_dist = min(min_dist, np.min(dist))
+        # distances between front and rear circles of ego vehicle and of surrounding
+        # vehicles, of shape (..., surr_veh_num, 2, 2)
+        dist = np.linalg.norm(
+            ego_center[..., np.newaxis, :, np.newaxis, :]
+            - surr_center[..., np.newaxis, :, :],
+            axis=-1,
+        )
+        min_dist = dist.reshape(dist.shape[:-3] + (-1,)).min(axis=-1)
         ego_to_veh_violation = 2 * r - min_dist
 
         # road boundary violation
-        ego_upper_y = max(ego_center[0, 1], ego_center[1, 1]) + r
-        ego_lower_y = min(ego_center[0, 1], ego_center[1, 1]) - r
+        ego_upper_y = np.maximum(ego_center[..., 0, 1], ego_center[..., 1, 1]) + r
+        ego_lower_y = np.minimum(ego_center[..., 0, 1], ego_center[..., 1, 1]) - r
         upper_bound_violation = ego_upper_y - self.upper_bound
         lower_bound_violation = self.lower_bound - ego_lower_y
-        return np.array([ego_to_veh_violation], dtype=np.float32)
+        return ego_to_veh_violation[..., np.newaxis].astype(np.float32)
 
     def compute_reward(self, action: np.ndarray) -> float:
-        x, y, phi, u, _, w = self.state
-        ref_x, ref_y, ref_phi, ref_u = self.ref_points[0]
-        steer, a_x = action
+        x, y, phi, u, _, w = np.moveaxis(self.state, -1, 0)
+        ref_x, ref_y, ref_phi, ref_u = np.moveaxis(self.ref_points[..., 0, :], -1, 0)
+        steer, a_x = np.moveaxis(action, -1, 0)
         violation = self.get_constraint()
         threshold = -0.1
-        punish = np.maximum(violation - threshold, 0).sum()
-        if (punish > 0) :
-            punish += 1.0
+        punish = np.maximum(violation - threshold, 0).sum(axis=-1)
+        punish = punish + 1.0 * (punish > 0)
         return - 0.01 * (
             10.0 * (x - ref_x) ** 2
             + 10.0 * (y - ref_y) ** 2
@@ -231,8 +245,8 @@ class SimuVeh3dofcontiDetour(SimuVeh3dofconti):
         ) + 2.0
 
     def judge_done(self) -> bool:
-        x, y, phi = self.state[:3]
-        ref_x, ref_y, ref_phi = self.ref_points[0, :3]
+        x, y, phi = np.moveaxis(self.state[..., :3], -1, 0)
+        ref_x, ref_y, ref_phi = np.moveaxis(self.ref_points[..., 0, :3], -1, 0)
         done = (
             (np.abs(x - ref_x) > 10)
             | (np.abs(y - ref_y) > 10)
@@ -304,5 +318,48 @@ class SimuVeh3dofcontiDetour(SimuVeh3dofconti):
                 surr_center[0][1], r,
                 facecolor='w', edgecolor='k', zorder=1))
 
+
+class SimuVeh3dofcontiDetourBatch(SimuVeh3dofcontiDetour, SimuVeh3dofcontiBatch):
+    """
+    Batch of `env_num` environments `SimuVeh3dofcontiDetour`, see `SimuVeh3dofcontiBatch`.
+    Surrounding vehicles are kept as an array `surr_state` of shape (env_num, surr_veh_num, 5).
+    """
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.surr_state = np.zeros((self.env_num, self.surr_veh_num, 5), dtype=np.float32)
+
+    def reset(
+        self,
+        init_state: Optional[Sequence] = None,
+        ref_time: Optional[float] = None,
+        ref_num: Optional[int] = 9,
+        reset_mask: Optional[np.ndarray] = None,
+        **kwargs,
+    ) -> Tuple[np.ndarray, dict]:
+        SimuVeh3dofcontiBatch.reset(self, init_state, ref_time, ref_num, reset_mask, **kwargs)
+        rows = np.arange(self.env_num) if reset_mask is None else np.flatnonzero(reset_mask)
+
+        # static surrounding vehicles ahead of the first reference point
+        surr_x = self.ref_points[rows, 0, 0:1] + 20.0
+        surr_y = self.ref_points[rows, 0, 1:2] + 1.0
+        self.surr_state[rows] = 0.0
+        self.surr_state[rows, :, 0] = surr_x
+        self.surr_state[rows, :, 1] = surr_y
+        return self.get_obs(), self.info
+
+    def step(self, action: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        _, reward, _, _ = SimuVeh3dofcontiBatch.step(self, action)
+        done = self.judge_done()
+
+        self.surr_state = SurrVehicleData.step_batch(self.surr_state, SurrVehicleData.l, self.dt)
+
+        return self.get_obs(), reward, done, self.info
+
+
 def env_creator(**kwargs):
     return SimuVeh3dofcontiDetour(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    return SimuVeh3dofcontiDetourBatch(**kwargs)
@@ -13,7 +13,7 @@ from typing import Any, Dict, Optional
 
 import numpy as np
 
-from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti
+from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti, SimuVeh3dofcontiBatch
 
 
 class SimuVeh3dofcontiErrCstr(SimuVeh3dofconti):
@@ -34,12 +34,11 @@ class SimuVeh3dofcontiErrCstr(SimuVeh3dofconti):
         )
 
     def get_constraint(self) -> np.ndarray:
-        y, u = self.state[1], self.state[3]
-        y_ref, u_ref = self.ref_points[0, 1], self.ref_points[0, 3]
-        constraint = np.array(
-            [abs(y - y_ref) - self.y_error_tol, abs(u - u_ref) - self.u_error_tol,],
-            dtype=np.float32,
-        )
+        y, u = self.state[..., 1], self.state[..., 3]
+        y_ref, u_ref = self.ref_points[..., 0, 1], self.ref_points[..., 0, 3]
+        constraint = np.stack(
+            (abs(y - y_ref) - self.y_error_tol, abs(u - u_ref) - self.u_error_tol), -1
+        ).astype(np.float32)
         return constraint
 
     @property
@@ -51,5 +50,15 @@ class SimuVeh3dofcontiErrCstr(SimuVeh3dofconti):
         return info
 
 
+class SimuVeh3dofcontiErrCstrBatch(SimuVeh3dofcontiErrCstr, SimuVeh3dofcontiBatch):
+    """
+    Batch of `env_num` environments `SimuVeh3dofcontiErrCstr`, see `SimuVeh3dofcontiBatch`.
+    """
+
+
 def env_creator(**kwargs):
     return SimuVeh3dofcontiErrCstr(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    return SimuVeh3dofcontiErrCstrBatch(**kwargs)
@@ -15,7 +15,7 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple
 import gym
 import numpy as np
 
-from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti, angle_normalize, ego_vehicle_coordinate_transform
+from gops.env.env_ocp.pyth_veh3dofconti import SimuVeh3dofconti, SimuVeh3dofcontiBatch, angle_normalize, ego_vehicle_coordinate_transform
 
 
 @dataclass
@@ -36,6 +36,22 @@ class SurrVehicleData:
         self.phi = self.phi + self.u * np.tan(self.delta) / self.l * self.dt
         self.phi = angle_normalize(self.phi)
 
+    @staticmethod
+    def step_batch(surr_state: np.ndarray, l: float = 3.0, dt: float = 0.1) -> np.ndarray:
+        """
+        Step surrounding vehicles given as rows [x, y, phi, u, delta] of `surr_state`,
+        like `step`, and return their next states.
+        """
+        x, y, phi, u, delta = np.moveaxis(surr_state, -1, 0)
+        next_state = [
+            x + u * np.cos(phi) * dt,
+            y + u * np.sin(phi) * dt,
+            angle_normalize(phi + u * np.tan(delta) / l * dt),
+            u,
+            delta,
+        ]
+        return np.stack(next_state, axis=-1).astype(surr_state.dtype)
+
 
 class SimuVeh3dofcontiSurrCstr(SimuVeh3dofconti):
     def __init__(
@@ -134,10 +150,12 @@ class SimuVeh3dofcontiSurrCstr(SimuVeh3dofconti):
     def get_obs(self) -> np.ndarray:
         obs = super().get_obs()
         surr_x_tf, surr_y_tf, surr_phi_tf = ego_vehicle_coordinate_transform(
-            self.state[0], self.state[1], self.state[2], 
-            self.surr_state[:, 0], self.surr_state[:, 1], self.surr_state[:, 2])
-        surr_obs_rel = np.concatenate((surr_x_tf, surr_y_tf, surr_phi_tf, self.surr_state[:, 3]))
-        return np.concatenate((obs, surr_obs_rel.flatten()))
+            self.state[..., 0:1], self.state[..., 1:2], self.state[..., 2:3],
+            self.surr_state[..., 0], self.surr_state[..., 1], self.surr_state[..., 2])
+        surr_obs_rel = np.concatenate(
+            (surr_x_tf, surr_y_tf, surr_phi_tf, self.surr_state[..., 3]), -1
+        )
+        return np.concatenate((obs, surr_obs_rel), -1)
 
     def get_constraint(self) -> np.ndarray:
         # collision detection using bicircle model
@@ -146,42 +164,41 @@ class SimuVeh3dofcontiSurrCstr(SimuVeh3dofconti):
         # circle radius
         r = np.sqrt(2) / 2 * self.veh_width
 
-        x, y, phi = self.state[:3]
-        ego_center = np.array(
-            [
-                [x + d * np.cos(phi), y + d * np.sin(phi)],
-                [x - d * np.cos(phi), y - d * np.sin(phi)],
-            ],
-            dtype=np.float32,
-        )
+        x, y, phi = self.state[..., 0], self.state[..., 1], self.state[..., 2]
+        ego_center = np.stack(
+            (
+                np.stack((x + d * np.cos(phi), y + d * np.sin(phi)), axis=-1),
+                np.stack((x - d * np.cos(phi), y - d * np.sin(phi)), axis=-1),
+            ),
+            axis=-2,
+        ).astype(np.float32)
 
-        surr_x = self.surr_state[:, 0]
-        surr_y = self.surr_state[:, 1]
-        surr_phi = self.surr_state[:, 2]
+        surr_x = self.surr_state[..., 0]
+        surr_y = self.surr_state[..., 1]
+        surr_phi = self.surr_state[..., 2]
         surr_center = np.stack(
             (
                 np.stack(
                     ((surr_x + d * np.cos(surr_phi)), surr_y + d * np.sin(surr_phi)),
-                    axis=1,
+                    axis=-1,
                 ),
                 np.stack(
                     ((surr_x - d * np.cos(surr_phi)), surr_y - d * np.sin(surr_phi)),
-                    axis=1,
+                    axis=-1,
                 ),
             ),
-            axis=1,
+            axis=-2,
         )
-        min_dist = np.inf
-        for i in range(2):
-            # front and rear circle of ego vehicle
-            for j in range(2):
-                # front and rear circle of surrounding vehicles
-                dist = np.linalg.norm(
-                    ego_center[np.newaxis, i] - surr_center[:, j], axis=1
-                )
-                min_dist = min(min_dist, np.min(dist))
+        # distances between front and rear circles of ego vehicle and of surrounding
+        # vehicles, of shape (..., surr_veh_num, 2, 2)
+        dist = np.linalg.norm(
+            ego_center[..., np.newaxis, :, np.newaxis, :]
+            - surr_center[..., np.newaxis, :, :],
+            axis=-1,
+        )
+        min_dist = dist.reshape(dist.shape[:-3] + (-1,)).min(axis=-1)
         ego_to_veh_violation = 2 * r - min_dist
-        return np.array([ego_to_veh_violation], dtype=np.float32)
+        return ego_to_veh_violation[..., np.newaxis].astype(np.float32)
 
     @property
     def info(self):
@@ -210,5 +227,64 @@ class SimuVeh3dofcontiSurrCstr(SimuVeh3dofconti):
                 zorder=1
             ))
 
+
+class SimuVeh3dofcontiSurrCstrBatch(SimuVeh3dofcontiSurrCstr, SimuVeh3dofcontiBatch):
+    """
+    Batch of `env_num` environments `SimuVeh3dofcontiSurrCstr`, see `SimuVeh3dofcontiBatch`.
+    Surrounding vehicles are kept as an array `surr_state` of shape (env_num, surr_veh_num, 5).
+    """
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.surr_state = np.zeros((self.env_num, self.surr_veh_num, 5), dtype=np.float32)
+
+    def reset(
+        self,
+        init_state: Optional[Sequence] = None,
+        ref_time: Optional[float] = None,
+        ref_num: Optional[int] = None,
+        reset_mask: Optional[np.ndarray] = None,
+        **kwargs,
+    ) -> Tuple[np.ndarray, dict]:
+        SimuVeh3dofcontiBatch.reset(self, init_state, ref_time, ref_num, reset_mask, **kwargs)
+        rows = np.arange(self.env_num) if reset_mask is None else np.flatnonzero(reset_mask)
+        shape = (len(rows), self.surr_veh_num)
+
+        surr_x0 = self.ref_points[rows, 0, 0:1]
+        surr_y0 = self.ref_points[rows, 0, 1:2]
+        # circle path
+        circle = self.path_num[rows, np.newaxis] == 3
+        surr_phi = np.where(circle, self.ref_points[rows, 0, 2:3], 0.0)
+        surr_delta = np.where(
+            circle, -np.arctan2(SurrVehicleData.l, self.ref_traj.ref_trajs[3].r), 0.0
+        )
+
+        # avoid ego vehicle
+        delta_lon = np.zeros(shape)
+        delta_lat = np.zeros(shape)
+        resample = np.ones(shape, dtype=bool)
+        while resample.any():
+            delta_lon[resample] = 10 * self.np_random.uniform(-1, 1, resample.sum())
+            delta_lat[resample] = 5 * self.np_random.uniform(-1, 1, resample.sum())
+            resample = (np.abs(delta_lon) <= 7) & (np.abs(delta_lat) <= 3)
+        surr_x = surr_x0 + delta_lon * np.cos(surr_phi) - delta_lat * np.sin(surr_phi)
+        surr_y = surr_y0 + delta_lon * np.sin(surr_phi) + delta_lat * np.cos(surr_phi)
+        surr_u = 5 + self.np_random.uniform(-1, 1, shape)
+        self.surr_state[rows] = np.stack(
+            np.broadcast_arrays(surr_x, surr_y, surr_phi, surr_u, surr_delta), axis=-1
+        )
+        return self.get_obs(), self.info
+
+    def step(self, action: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        self.surr_state = SurrVehicleData.step_batch(self.surr_state, SurrVehicleData.l, self.dt)
+        _, reward, done, info = SimuVeh3dofcontiBatch.step(self, action)
+
+        return self.get_obs(), reward, done, info
+
+
 def env_creator(**kwargs):
     return SimuVeh3dofcontiSurrCstr(**kwargs)
+
+
+def batch_env_creator(**kwargs):
+    return SimuVeh3dofcontiSurrCstrBatch(**kwargs)
@@ -38,6 +38,11 @@ DEFAULT_SPEED_PARAM = {
 
 
 class MultiRefTrajData:
+    """
+    Reference trajectories indexed by path_num and speed_num. Times `t` may be floats or
+    arrays, which compute all their reference points at once.
+    """
+
     def __init__(
         self,
         path_param: Optional[Dict[str, Dict]] = None,
@@ -78,6 +83,31 @@ class MultiRefTrajData:
     def compute_phi(self, t: float, path_num: int, speed_num: int) -> float:
         return self.ref_trajs[path_num].compute_phi(t, speed_num)
 
+    def compute_ref_points(
+        self,
+        t: np.ndarray,
+        path_num: np.ndarray,
+        speed_num: np.ndarray,
+        keys: Sequence[str] = ("x", "y", "phi", "u"),
+    ) -> np.ndarray:
+        """
+        Reference points made of the components in `keys`, stacked along the last axis.
+        `path_num` and `speed_num` may be arrays indexing the first axes of `t`, e.g. one
+        per environment of a batch, in which case the points of each combination of path
+        and speed are computed at once.
+        """
+        if np.ndim(path_num) == 0 and np.ndim(speed_num) == 0:
+            return np.stack(
+                [getattr(self, "compute_" + k)(t, path_num, speed_num) for k in keys], axis=-1
+            )
+        t = np.asarray(t)
+        path_num, speed_num = np.broadcast_arrays(path_num, speed_num)
+        ref_points = np.empty(t.shape + (len(keys),))
+        for p, s in set(zip(path_num.tolist(), speed_num.tolist())):
+            rows = (path_num == p) & (speed_num == s)
+            ref_points[rows] = self.compute_ref_points(t[rows], p, s, keys)
+        return ref_points
+
 
 class RefSpeedData(metaclass=ABCMeta):
     @abstractmethod
@@ -94,7 +124,7 @@ class ConstantRefSpeedData(RefSpeedData):
     u: float
 
     def compute_u(self, t: float) -> float:
-        return self.u
+        return self.u + np.zeros_like(t)
 
     def compute_integrate_u(self, t: float) -> float:
         return self.u * t
@@ -166,19 +196,9 @@ class DoubleLaneRefTrajData(RefTrajData):
         return self.ref_speeds[speed_num].compute_integrate_u(t)
 
     def compute_y(self, t: float, speed_num: int) -> float:
-        if t <= self.t1:
-            y = self.y1
-        elif t <= self.t2:
-            k = (self.y2 - self.y1) / (self.t2 - self.t1)
-            y = k * (t - self.t1) + self.y1
-        elif t <= self.t3:
-            y = self.y2
-        elif t <= self.t4:
-            k = (self.y1 - self.y2) / (self.t4 - self.t3)
-            y = k * (t - self.t3) + self.y2
-        else:
-            y = self.y1
-        return y
+        return np.interp(
+            t, [self.t1, self.t2, self.t3, self.t4], [self.y1, self.y2, self.y2, self.y1]
+        )
 
 
 @dataclass
@@ -191,11 +211,10 @@ class TriangleRefTrajData(RefTrajData):
 
     def compute_y(self, t: float, speed_num: int) -> float:
         s = t % self.T
-        if s <= self.T / 2:
-            y = 2 * self.A / self.T * s
-        else:
-            y = -2 * self.A / self.T * (s - self.T)
-        return y
+        y = np.where(
+            s <= self.T / 2, 2 * self.A / self.T * s, -2 * self.A / self.T * (s - self.T)
+        )
+        return y[()]
 
 
 @dataclass
@@ -15,6 +15,7 @@ import multiprocessing as mp
 import sys
 import time
 from copy import deepcopy
+from dataclasses import fields, is_dataclass
 from enum import Enum
 from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
@@ -24,6 +25,7 @@ from numpy.typing import NDArray
 import gymnasium as gym
 from gymnasium import logger
 from gymnasium.core import Env, ObsType
+from gymnasium.spaces import Box, Discrete
 from gymnasium.error import (
     AlreadyPendingCallError,
     ClosedEnvironmentError,
@@ -80,6 +82,8 @@ class AsyncVectorEnv(VectorEnv):
         context: Optional[str] = None,
         daemon: bool = True,
         worker: Optional[Callable] = None,
+        envs_per_worker: int = 1,
+        shared_info_probe: bool = False,
     ):
         """Vectorized environment that runs multiple environments in parallel.
 
@@ -91,6 +95,9 @@ class AsyncVectorEnv(VectorEnv):
                 then the action space of the first environment is taken.
             shared_memory: If ``True``, then the observations from the worker processes are communicated back through
                 shared variables. This can improve the efficiency if the observations are large (e.g. images).
+                Actions (of ``Box`` and ``Discrete`` spaces), rewards, termination flags and the info fields
+                declared by the ``additional_info`` of the environment are exchanged through shared arrays as well,
+                see ``_SharedChannels``, and pipes only carry wake-up messages and the other info fields.
             copy: If ``True``, then the :meth:`~AsyncVectorEnv.reset` and :meth:`~AsyncVectorEnv.step` methods
                 return a copy of the observations.
             context: Context for `multiprocessing`_. If ``None``, then the default context is used.
@@ -99,6 +106,15 @@ class AsyncVectorEnv(VectorEnv):
                 so for some environments you may want to have it set to ``False``.
             worker: If set, then use that worker in a subprocess instead of a default one.
                 Can be useful to override some inner vector env logic, for instance, how resets on termination or truncation are handled.
+            envs_per_worker: Number of environments hosted by each subprocess. Each subprocess steps a contiguous
+                slice of the environments in a loop and exchanges one pipe message per call for the whole slice,
+                which saves inter-process communication and context switches for cheap environments.
+                Defaults to 1, one subprocess per environment.
+            shared_info_probe: If ``True`` and shared_memory is ``True``, then the float info fields of the first
+                environment are exchanged through shared arrays as well. They are found by one reset and one step
+                with a random action of a throwaway environment in the main process, so only enable it for
+                environments without side effects. Values which do not fit the probed shape or dtype of a
+                field are sent through pipes instead.
 
         Warnings:
             worker is an advanced mode option. It provides a high degree of flexibility and a high chance
@@ -111,8 +127,11 @@ class AsyncVectorEnv(VectorEnv):
             ValueError: If observation_space is a custom space (i.e. not a default space in Gym,
                 such as gymnasium.spaces.Box, gymnasium.spaces.Discrete, or gymnasium.spaces.Dict) and shared_memory is True.
         """
+        if envs_per_worker > 1 and worker is not None:
+            raise ValueError("A custom worker can not be used with envs_per_worker > 1")
         ctx = mp.get_context(context)
         self.env_fns = env_fns
+        self.envs_per_worker = envs_per_worker
         self.shared_memory = shared_memory
         self.copy = copy
         dummy_env = env_fns[0]()
@@ -121,6 +140,8 @@ class AsyncVectorEnv(VectorEnv):
         if (observation_space is None) or (action_space is None):
             observation_space = observation_space or dummy_env.observation_space
             action_space = action_space or dummy_env.action_space
+        if shared_memory and worker is None:
+            info_templates = _info_templates(dummy_env, shared_info_probe)
         dummy_env.close()
         del dummy_env
         super().__init__(
@@ -129,6 +150,8 @@ class AsyncVectorEnv(VectorEnv):
             action_space=action_space,
         )
 
+        # the built-in workers exchange all step results through shared channels
+        self.channels = None
         if self.shared_memory:
             try:
                 _obs_buffer = create_shared_memory(
@@ -137,6 +160,11 @@ class AsyncVectorEnv(VectorEnv):
                 self.observations = read_from_shared_memory(
                     self.single_observation_space, _obs_buffer, n=self.num_envs
                 )
+                if worker is None:
+                    self.channels = _SharedChannels(
+                        ctx, self.num_envs, self.single_observation_space, _obs_buffer,
+                        self.single_action_space, info_templates,
+                    )
             except CustomSpaceError as e:
                 raise ValueError(
                     "Using `shared_memory=True` in `AsyncVectorEnv` "
@@ -154,22 +182,31 @@ class AsyncVectorEnv(VectorEnv):
 
         self.parent_pipes, self.processes = [], []
         self.error_queue = ctx.Queue()
-        target = _worker_shared_memory if self.shared_memory else _worker
-        target = worker or target
+        # contiguous slice of environments hosted by each subprocess
+        self.worker_slices = [
+            (start, min(start + envs_per_worker, self.num_envs))
+            for start in range(0, self.num_envs, envs_per_worker)
+        ]
+        # subprocesses hosting slices of environments exchange one message per call for the slice
+        self._grouped = envs_per_worker > 1 or self.channels is not None
+        if self._grouped:
+            target = _group_worker
+        else:
+            target = _worker_shared_memory if self.shared_memory else _worker
+            target = worker or target
         with clear_mpi_env_vars():
-            for idx, env_fn in enumerate(self.env_fns):
+            for idx, (start, stop) in enumerate(self.worker_slices):
                 parent_pipe, child_pipe = ctx.Pipe()
+                if self._grouped:
+                    env_fn = CloudpickleWrapper(list(self.env_fns[start:stop]))
+                    args = (idx, env_fn, start, child_pipe, parent_pipe, self.channels, self.error_queue)
+                else:
+                    env_fn = CloudpickleWrapper(self.env_fns[start])
+                    args = (idx, env_fn, child_pipe, parent_pipe, _obs_buffer, self.error_queue)
                 process = ctx.Process(
                     target=target,
                     name=f"Worker<{type(self).__name__}>-{idx}",
-                    args=(
-                        idx,
-                        CloudpickleWrapper(env_fn),
-                        child_pipe,
-                        parent_pipe,
-                        _obs_buffer,
-                        self.error_queue,
-                    ),
+                    args=args,
                 )
 
                 self.parent_pipes.append(parent_pipe)
@@ -200,8 +237,7 @@ class AsyncVectorEnv(VectorEnv):
                 self._state.value,
             )
 
-        for pipe, single_seed in zip(self.parent_pipes, seed):
-            pipe.send(("seed", single_seed))
+        self._send("seed", seed)
         self._state = AsyncState.WAITING_SEED
 
     def seed_wait(self, timeout: Optional[float] = None):
@@ -223,12 +259,7 @@ class AsyncVectorEnv(VectorEnv):
                 f"The call to `seed_wait` has timed out after {timeout} second(s)."
             )
 
-        successes = []
-        for pipe in self.parent_pipes:
-            _, success = pipe.recv()
-            successes.append(success)
-
-        self._raise_if_errors(successes)
+        self._recv()
         self._state = AsyncState.DEFAULT
 
     def reset_async(
@@ -264,14 +295,16 @@ class AsyncVectorEnv(VectorEnv):
                 self._state.value,
             )
 
-        for pipe, single_seed in zip(self.parent_pipes, seed):
+        all_kwargs = []
+        for single_seed in seed:
             single_kwargs = {}
             if single_seed is not None:
                 single_kwargs["seed"] = single_seed
             if options is not None:
                 single_kwargs["options"] = options
+            all_kwargs.append(single_kwargs)
 
-            pipe.send(("reset", single_kwargs))
+        self._send("reset", all_kwargs)
         self._state = AsyncState.WAITING_RESET
 
     def reset_wait(
@@ -308,14 +341,14 @@ class AsyncVectorEnv(VectorEnv):
                 f"The call to `reset_wait` has timed out after {timeout} second(s)."
             )
 
-        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
-        self._raise_if_errors(successes)
+        results = self._recv()
         self._state = AsyncState.DEFAULT
 
-        infos = {}
+        infos = {} if self.channels is None else self.channels.read_infos(self.copy)
         results, info_data = zip(*results)
         for i, info in enumerate(info_data):
-            infos = self._add_info(infos, info, i)
+            if info:
+                infos = self._add_residual_info(infos, info, i)
 
         if not self.shared_memory:
             self.observations = concatenate(
@@ -344,9 +377,15 @@ class AsyncVectorEnv(VectorEnv):
                 self._state.value,
             )
 
-        actions = iterate(self.action_space, actions)
-        for pipe, action in zip(self.parent_pipes, actions):
-            pipe.send(("step", action))
+        if self.channels is not None and self.channels.actions is not None:
+            # workers read their actions from the shared channel
+            self.channels.actions[:] = actions
+            self._send("step", [None] * self.num_envs)
+        elif self._grouped and isinstance(actions, np.ndarray):
+            # workers iterate over the rows of their slice of the batch
+            self._send("step", actions)
+        else:
+            self._send("step", list(iterate(self.action_space, actions)))
         self._state = AsyncState.WAITING_STEP
 
     def step_wait(
@@ -378,21 +417,17 @@ class AsyncVectorEnv(VectorEnv):
                 f"The call to `step_wait` has timed out after {timeout} second(s)."
             )
 
-        observations_list, rewards, terminateds, truncateds, infos = [], [], [], [], {}
-        successes = []
-        for i, pipe in enumerate(self.parent_pipes):
-            result, success = pipe.recv()
-            successes.append(success)
-            if success:
-                obs, rew, terminated, truncated, info = result
-
-                observations_list.append(obs)
-                rewards.append(rew)
-                terminateds.append(terminated)
-                truncateds.append(truncated)
-                infos = self._add_info(infos, info, i)
+        if self.channels is not None:
+            return self._step_wait_shared()
 
-        self._raise_if_errors(successes)
+        observations_list, rewards, terminateds, truncateds, infos = [], [], [], [], {}
+        results = self._recv()
+        for i, (obs, rew, terminated, truncated, info) in enumerate(results):
+            observations_list.append(obs)
+            rewards.append(rew)
+            terminateds.append(terminated)
+            truncateds.append(truncated)
+            infos = self._add_info(infos, info, i)
         self._state = AsyncState.DEFAULT
 
         if not self.shared_memory:
@@ -410,6 +445,45 @@ class AsyncVectorEnv(VectorEnv):
             infos,
         )
 
+    def _step_wait_shared(self) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        # workers only send the info fields outside of the shared schema
+        residual_infos = self._recv()
+        self._state = AsyncState.DEFAULT
+        infos = self.channels.read_infos(self.copy)
+        for i, info in enumerate(residual_infos):
+            if info:
+                infos = self._add_residual_info(infos, info, i)
+        return (
+            deepcopy(self.observations) if self.copy else self.observations,
+            self.channels.rewards.copy(),
+            self.channels.terminateds.copy(),
+            self.channels.truncateds.copy(),
+            infos,
+        )
+
+    def _add_residual_info(self, infos: dict, info: dict, env_num: int) -> dict:
+        """
+        Add the info fields sent through pipes, widening the shared arrays of the fields
+        whose values did not fit them, to a dtype holding both or to an object array.
+        """
+        for key, value in info.items():
+            array = infos.get(key)
+            if not isinstance(array, np.ndarray) or array.dtype == object:
+                continue
+            value = np.asarray(value)
+            if value.shape == array.shape[1:] and np.can_cast(value.dtype, array.dtype, "same_kind"):
+                continue
+            if value.shape == array.shape[1:]:
+                try:
+                    infos[key] = array.astype(np.result_type(array.dtype, value.dtype))
+                    continue
+                except TypeError:
+                    pass
+            infos[key] = np.empty(self.num_envs, dtype=object)
+            for i in range(self.num_envs):
+                infos[key][i] = array[i]
+        return self._add_info(infos, info, env_num)
+
     def call_async(self, name: str, *args, **kwargs):
         """Calls the method with name asynchronously and apply args and kwargs to the method.
 
@@ -430,8 +504,7 @@ class AsyncVectorEnv(VectorEnv):
                 self._state.value,
             )
 
-        for pipe in self.parent_pipes:
-            pipe.send(("_call", (name, args, kwargs)))
+        self._send("_call", [(name, args, kwargs)] * self.num_envs)
         self._state = AsyncState.WAITING_CALL
 
     def call_wait(self, timeout: Optional[Union[int, float]] = None) -> list:
@@ -461,8 +534,7 @@ class AsyncVectorEnv(VectorEnv):
                 f"The call to `call_wait` has timed out after {timeout} second(s)."
             )
 
-        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
-        self._raise_if_errors(successes)
+        results = tuple(self._recv())
         self._state = AsyncState.DEFAULT
 
         return results
@@ -497,10 +569,8 @@ class AsyncVectorEnv(VectorEnv):
                 self._state.value,
             )
 
-        for pipe, value in zip(self.parent_pipes, values):
-            pipe.send(("_setattr", (name, value)))
-        _, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
-        self._raise_if_errors(successes)
+        self._send("_setattr", [(name, value) for value in values])
+        self._recv()
 
     def close_extras(
         self, timeout: Optional[Union[int, float]] = None, terminate: bool = False
@@ -562,11 +632,8 @@ class AsyncVectorEnv(VectorEnv):
     def _check_spaces(self):
         self._assert_is_running()
         spaces = (self.single_observation_space, self.single_action_space)
-        for pipe in self.parent_pipes:
-            pipe.send(("_check_spaces", spaces))
-        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
-        self._raise_if_errors(successes)
-        same_observation_spaces, same_action_spaces = zip(*results)
+        self._send("_check_spaces", [spaces] * self.num_envs)
+        same_observation_spaces, same_action_spaces = zip(*self._recv())
         if not all(same_observation_spaces):
             raise RuntimeError(
                 "Some environments have an observation space different from "
@@ -580,6 +647,22 @@ class AsyncVectorEnv(VectorEnv):
                 "action spaces from all environments must be equal."
             )
 
+    def _send(self, command: str, data: Sequence):
+        """Send `command` to each subprocess, with the items of `data`, one per environment, of its slice."""
+        for pipe, (start, stop) in zip(self.parent_pipes, self.worker_slices):
+            if self._grouped:
+                pipe.send((command, data[start:stop]))
+            else:
+                pipe.send((command, data[start]))
+
+    def _recv(self) -> list:
+        """Receive the results of all subprocesses, as a list with one result per environment."""
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._raise_if_errors(successes)
+        if self._grouped:
+            return [result for group in results for result in group]
+        return list(results)
+
     def _assert_is_running(self):
         if self.closed:
             raise ClosedEnvironmentError(
@@ -590,7 +673,7 @@ class AsyncVectorEnv(VectorEnv):
         if all(successes):
             return
 
-        num_errors = self.num_envs - sum(successes)
+        num_errors = len(successes) - sum(successes)
         assert num_errors > 0
         for i in range(num_errors):
             index, exctype, value = self.error_queue.get()
@@ -611,6 +694,171 @@ class AsyncVectorEnv(VectorEnv):
             self.close(terminate=True)
 
 
+def _array_leaves(value) -> list:
+    """Arrays of an info value, which is an array, a scalar or a `State` of arrays, in field order."""
+    if is_dataclass(value):
+        leaves = []
+        for field in fields(value):
+            v = getattr(value, field.name)
+            if is_dataclass(v) or isinstance(v, np.ndarray):
+                leaves.extend(_array_leaves(v))
+        return leaves
+    return [np.asarray(value)]
+
+
+def _from_array_leaves(template, leaves: list):
+    """Rebuild a value shaped like `template` from its arrays, keeping its other fields."""
+    if not is_dataclass(template):
+        return leaves.pop(0)
+    values = []
+    for field in fields(template):
+        v = getattr(template, field.name)
+        if is_dataclass(v) or isinstance(v, np.ndarray):
+            values.append(_from_array_leaves(v, leaves))
+        else:
+            values.append(v)
+    return template.__class__(*values)
+
+
+def _info_templates(env, probe: bool = False) -> dict:
+    """
+    Template values of the info fields of one environment declared by its `additional_info`,
+    and if `probe`, of the float fields of its info after one reset and one step.
+    """
+    templates = {}
+    for key, spec in getattr(env, "additional_info", {}).items():
+        if isinstance(spec, dict):
+            templates[key] = np.zeros(spec["shape"], dtype=spec["dtype"])
+        else:
+            templates[key] = deepcopy(spec)
+    if not probe:
+        return templates
+    _, reset_info = env.reset()
+    step_info = env.step(env.action_space.sample())[-1]
+    for key, value in {**reset_info, **step_info}.items():
+        if key in templates:
+            continue
+        if isinstance(value, (bool, int, float, np.number, np.bool_, np.ndarray)):
+            value = np.asarray(value)
+            # integer and boolean fields are often floats or missing in later infos
+            if value.dtype.kind == "f":
+                templates[key] = np.zeros_like(value)
+    return templates
+
+
+class _SharedChannels:
+    """
+    Shared arrays through which workers return observations, rewards, termination flags
+    and numeric info fields, and read their actions, one row per environment.
+
+    Info fields are described by template values of one environment, arrays or `State`
+    dataclasses of arrays; each array is backed by one shared array and a mask marks the
+    environments whose info contains the field. Fields outside of the templates, and array
+    values whose shape or dtype does not fit the template, are sent through pipes. Values of
+    `State` fields must keep the shape of their template, and fields of
+    `State` which are not arrays, e.g. the time of a `ContextState`, are taken from the
+    template, as `State.stack` takes them from the first environment.
+    """
+
+    def __init__(self, ctx, num_envs, observation_space, observation_buffer, action_space, info_templates):
+        self.num_envs = num_envs
+        self.observation_space = observation_space
+        self.observation_buffer = observation_buffer
+        # other action spaces are sent through pipes
+        self.action_space = action_space if isinstance(action_space, (Box, Discrete)) else None
+        self.action_buffer = None
+        if self.action_space is not None:
+            self.action_buffer = create_shared_memory(action_space, n=num_envs, ctx=ctx)
+        self.reward_buffer = ctx.Array("d", num_envs)
+        # boolean arrays are backed by byte buffers
+        self.terminated_buffer = ctx.Array("b", num_envs)
+        self.truncated_buffer = ctx.Array("b", num_envs)
+        self.info_templates = info_templates
+        self.info_buffers = {
+            key: (
+                [
+                    ctx.Array("b" if leaf.dtype == np.bool_ else leaf.dtype.char, num_envs * leaf.size)
+                    for leaf in _array_leaves(template)
+                ],
+                ctx.Array("b", num_envs),
+            )
+            for key, template in info_templates.items()
+        }
+        self._create_views()
+
+    def __getstate__(self):
+        # numpy views are recreated on the buffers in the worker process
+        return {k: v for k, v in self.__dict__.items() if k not in self._view_names}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+    _view_names = ("actions", "rewards", "terminateds", "truncateds", "info_views")
+
+    def _create_views(self):
+        def view(buffer, dtype, shape=()):
+            return np.frombuffer(buffer.get_obj(), dtype=dtype).reshape((self.num_envs, *shape))
+
+        self.actions = None
+        if self.action_buffer is not None:
+            self.actions = read_from_shared_memory(self.action_space, self.action_buffer, n=self.num_envs)
+        self.rewards = view(self.reward_buffer, np.float64)
+        self.terminateds = view(self.terminated_buffer, np.bool_)
+        self.truncateds = view(self.truncated_buffer, np.bool_)
+        self.info_views = {
+            key: (
+                [view(b, leaf.dtype, leaf.shape) for b, leaf in zip(buffers, _array_leaves(self.info_templates[key]))],
+                view(mask, np.bool_),
+            )
+            for key, (buffers, mask) in self.info_buffers.items()
+        }
+
+    def read_action(self, index: int):
+        return np.array(self.actions[index])
+
+    def write(self, index: int, observation, info: dict, reward=None, terminated=None, truncated=None) -> Optional[dict]:
+        """Write the results of environment `index`, returning its info fields outside of the templates, if any."""
+        write_to_shared_memory(self.observation_space, index, observation, self.observation_buffer)
+        if reward is not None:
+            self.rewards[index] = reward
+            self.terminateds[index] = terminated
+            self.truncateds[index] = truncated
+        residual = {}
+        for key, value in info.items():
+            if key not in self.info_views:
+                residual[key] = value
+                continue
+            views, _ = self.info_views[key]
+            leaves = _array_leaves(value)
+            if len(leaves) != len(views) or any(
+                l.shape != v.shape[1:] or not np.can_cast(l.dtype, v.dtype, "same_kind") for l, v in zip(leaves, views)
+            ):
+                if is_dataclass(self.info_templates[key]):
+                    raise ValueError(
+                        f"Info {key} does not match its `additional_info` declaration, "
+                        "set `shared_memory=False` for infos of varying shape"
+                    )
+                residual[key] = value
+                continue
+            for leaf, v in zip(leaves, views):
+                v[index] = leaf
+        for key, (_, mask) in self.info_views.items():
+            mask[index] = key in info and key not in residual
+        return residual or None
+
+    def read_infos(self, copy: bool) -> dict:
+        """Batched info fields present in the info of any environment, with their masks."""
+        infos = {}
+        for key, (views, mask) in self.info_views.items():
+            if not mask.any():
+                continue
+            leaves = [v.copy() for v in views] if copy else list(views)
+            infos[key] = _from_array_leaves(self.info_templates[key], leaves)
+            infos["_" + key] = mask.copy()
+        return infos
+
+
 def _worker(index, env_fn, pipe, parent_pipe, shared_memory, error_queue):
     assert shared_memory is None
     env = env_fn()
@@ -747,3 +995,95 @@ def _worker_shared_memory(index, env_fn, pipe, parent_pipe, shared_memory, error
         pipe.send((None, False))
     finally:
         env.close()
+
+
+def _group_worker(index, env_fns, start, pipe, parent_pipe, shared_memory, error_queue):
+    """
+    Worker hosting the environments of `env_fns`, whose first one is the `start`-th of the vector.
+    If `shared_memory` is the `_SharedChannels` of the vector, step results are written into it
+    and only info fields outside of its templates are sent, otherwise all results are sent.
+    """
+    envs = [env_fn() for env_fn in env_fns.fn]
+    parent_pipe.close()
+
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                results = []
+                for i, (env, kwargs) in enumerate(zip(envs, data)):
+                    observation, info = env.reset(**kwargs)
+                    if shared_memory is None:
+                        results.append((observation, info))
+                    else:
+                        results.append((None, shared_memory.write(start + i, observation, info)))
+                pipe.send((results, True))
+
+            elif command == "step":
+                results = []
+                for i, (env, action) in enumerate(zip(envs, data)):
+                    if action is None:
+                        action = shared_memory.read_action(start + i)
+                    (
+                        observation,
+                        reward,
+                        terminated,
+                        truncated,
+                        info,
+                    ) = env.step(action)
+                    if terminated or truncated:
+                        old_observation, old_info = observation, info
+                        observation, info = env.reset()
+                        info["final_observation"] = old_observation
+                        info["final_info"] = old_info
+                    if shared_memory is None:
+                        results.append((observation, reward, terminated, truncated, info))
+                    else:
+                        results.append(
+                            shared_memory.write(start + i, observation, info, reward, terminated, truncated)
+                        )
+                pipe.send((results, True))
+            elif command == "seed":
+                for env, seed in zip(envs, data):
+                    env.seed(seed)
+                pipe.send(([None] * len(envs), True))
+            elif command == "close":
+                pipe.send(([None] * len(envs), True))
+                break
+            elif command == "_call":
+                results = []
+                for env, (name, args, kwargs) in zip(envs, data):
+                    if name in ["reset", "step", "seed", "close"]:
+                        raise ValueError(
+                            f"Trying to call function `{name}` with "
+                            f"`_call`. Use `{name}` directly instead."
+                        )
+                    function = getattr(env, name)
+                    results.append(function(*args, **kwargs) if callable(function) else function)
+                pipe.send((results, True))
+            elif command == "_setattr":
+                for env, (name, value) in zip(envs, data):
+                    setattr(env, name, value)
+                pipe.send(([None] * len(envs), True))
+            elif command == "_check_spaces":
+                pipe.send(
+                    (
+                        [
+                            (spaces[0] == env.observation_space, spaces[1] == env.action_space)
+                            for env, spaces in zip(envs, data)
+                        ],
+                        True,
+                    )
+                )
+            else:
+                raise RuntimeError(
+                    f"Received unknown command `{command}`. Must "
+                    "be one of {`reset`, `step`, `seed`, `close`, `_call`, "
+                    "`_setattr`, `_check_spaces`}."
+                )
+    except (KeyboardInterrupt, Exception):
+        error_queue.put((index,) + sys.exc_info()[:2])
+        pipe.send((None, False))
+    finally:
+        for env in envs:
+            env.close()
@@ -0,0 +1,172 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab(iDLab), Tsinghua University
+
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+
+#  Description: Vector environment wrapping a data environment which steps a batch of environments natively
+
+
+"""A vector environment wrapping a batched data environment."""
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from gymnasium import Env
+from gops.env.vector.vector_env import VectorEnv
+
+
+__all__ = ["BatchVectorEnv"]
+
+
+class BatchVectorEnv(VectorEnv):
+    """Vectorized environment backed by one data environment holding a batch of `env_num` environments.
+
+    The batched environment, e.g. :class:`SimuVeh3dofcontiBatch`, takes batched actions in `step`
+    and returns batched observations, rewards, dones and info, and its `reset` accepts a
+    `reset_mask` of the environments to reset, returning the observations and info of the whole
+    batch. All environments are thus stepped by single NumPy expressions in the main process,
+    without subprocesses or copies between them.
+
+    Episodes are truncated at `max_episode_steps` by this class instead of a `TimeLimit` wrapper,
+    and rows which terminate or are truncated are reset, with their final observation and info
+    returned in `"final_observation"` and `"final_info"`, like :class:`SyncVectorEnv`.
+
+    Example:
+        >>> from gops.create_pkg.create_env import create_env
+        >>> env = create_env("pyth_veh3dofconti", vector_env_num=1024, vector_env_type="batch",
+        ...                  gym2gymnasium=True)
+        >>> obs, info = env.reset()
+        >>> obs.shape
+        (1024, 46)
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], Env],
+        max_episode_steps: Optional[int] = None,
+    ):
+        """Vectorized environment backed by a batched data environment.
+
+        Args:
+            env_fn: callable function creating the batched data environment.
+            max_episode_steps: maximum number of steps of an episode. If ``None``, then the
+                `max_episode_steps` attribute of the environment is taken.
+        """
+        self.env = env_fn()
+        self.metadata = self.env.metadata
+        unwrapped = self.env.unwrapped
+        super().__init__(
+            num_envs=unwrapped.env_num,
+            observation_space=self.env.observation_space,
+            action_space=self.env.action_space,
+        )
+
+        if max_episode_steps is None:
+            max_episode_steps = getattr(unwrapped, "max_episode_steps", None)
+        self.max_episode_steps = max_episode_steps
+        self.elapsed_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self._actions = None
+
+    def seed(self, seed: Optional[int] = None):
+        """Sets the seed of the batched environment.
+
+        Args:
+            seed: The seed
+        """
+        return self.env.seed(seed)
+
+    def reset_wait(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        """Resets all sub-environments.
+
+        Args:
+            seed: The reset environment seed, only an integer seed of the first sub-environment is used
+            options: Option information for the environment reset
+
+        Returns:
+            The reset observation of the environment and reset information
+        """
+        if isinstance(seed, (list, tuple)):
+            seed = seed[0]
+        if seed is not None:
+            self.seed(seed)
+        if options is None:
+            obs, info = self.env.reset()
+        else:
+            obs, info = self.env.reset(options=options)
+        self.elapsed_steps[:] = 0
+        return obs, self._info(info)
+
+    def step_async(self, actions):
+        """Sets :attr:`_actions` for use by the :meth:`step_wait`."""
+        self._actions = np.asarray(actions)
+
+    def step_wait(self) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        """Steps all sub-environments at once, resetting finished rows.
+
+        Returns:
+            The batched environment step results
+        """
+        obs, reward, terminated, _, info = self.env.step(self._actions)
+        terminated = np.array(terminated, dtype=bool).reshape(self.num_envs)
+        self.elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            # consistent with the TimeLimit wrapper, termination takes precedence over truncation
+            truncated = (self.elapsed_steps >= self.max_episode_steps) & ~terminated
+        else:
+            truncated = np.zeros_like(terminated)
+        info["TimeLimit.truncated"] = truncated
+
+        reset = terminated | truncated
+        if reset.any():
+            index = np.flatnonzero(reset)
+            final_observation = np.empty(self.num_envs, dtype=object)
+            final_info = np.empty(self.num_envs, dtype=object)
+            for i in index:
+                final_observation[i] = obs[i]
+                final_info[i] = {k: v[i] for k, v in info.items()}
+
+            obs, reset_info = self.env.reset(reset_mask=reset)
+            info.update(reset_info)
+            self.elapsed_steps[index] = 0
+            info = self._info(info)
+            info["final_observation"] = final_observation
+            info["_final_observation"] = reset
+            info["final_info"] = final_info
+            info["_final_info"] = reset
+        else:
+            info = self._info(info)
+
+        return (
+            obs,
+            np.asarray(reward, dtype=np.float64).reshape(self.num_envs),
+            terminated,
+            truncated,
+            info,
+        )
+
+    def call(self, name, *args, **kwargs) -> tuple:
+        """Calls the method with name of the batched environment once for all sub-environments."""
+        function = getattr(self.env, name)
+        if callable(function):
+            return (function(*args, **kwargs),) * self.num_envs
+        return (function,) * self.num_envs
+
+    def close_extras(self, **kwargs):
+        """Close the batched environment."""
+        self.env.close()
+
+    def _info(self, info: dict) -> dict:
+        """Info of all rows with a mask of valid rows for each key."""
+        infos = {}
+        for k, v in info.items():
+            infos[k] = v
+            infos[f"_{k}"] = np.ones(self.num_envs, dtype=bool)
+        return infos
@@ -227,6 +227,12 @@ class SyncVectorEnv(VectorEnv):
         """Close the environments."""
         [env.close() for env in self.envs]
 
+    def __getstate__(self):
+        """Pickles the environments without the functions creating them, which may be local functions."""
+        state = self.__dict__.copy()
+        state["env_fns"] = None
+        return state
+
     def _check_spaces(self) -> bool:
         for env in self.envs:
             if not (env.observation_space == self.single_observation_space):
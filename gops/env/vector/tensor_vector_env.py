@@ -0,0 +1,267 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab(iDLab), Tsinghua University
+
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+
+#  Description: Vector environment stepping a batch of env_gen_ocp states with the torch environment model
+
+
+"""A vector environment stepping batched torch states with an environment model."""
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+from gymnasium import Env
+from gops.env.env_gen_ocp.pyth_base import Context, ContextState, State
+from gops.env.vector.vector_env import VectorEnv
+
+
+__all__ = ["TensorVectorEnv"]
+
+
+class TensorVectorEnv(VectorEnv):
+    """Vectorized env_gen_ocp environment holding the states of all sub-environments as one `State[torch.Tensor]`.
+
+    Each step applies the `forward` of the environment model, i.e. its `get_next_state`, `get_obs`,
+    `get_reward` and `get_terminated`, to the whole batch, and subtracts the termination penalty of
+    the environment from the rewards of terminated rows. Rows which terminate or reach
+    `max_episode_steps` are reset to initial states drawn by `reset` of a single data environment,
+    following the reset distribution of its robot and context, and their final observation and
+    info are returned in `"final_observation"` and `"final_info"`, like :class:`SyncVectorEnv`.
+
+    Contexts indexed by time only hold a finite reference window, which `Context.step` shifts
+    along the reference trajectory. The reference of a reset row is therefore computed for its
+    whole episode at once by `Context.rollout_reference`, and each step indexes the reference
+    window of every row at its episode step, so that the model always sees the window the data
+    environment would hold.
+
+    Example:
+        >>> from gops.create_pkg.create_env import create_env
+        >>> env = create_env("veh3dof_tracking", vector_env_num=4096, vector_env_type="tensor",
+        ...                  gym2gymnasium=True)
+        >>> obs, info = env.reset()
+        >>> obs.shape
+        (4096, 46)
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], Env],
+        env_model,
+        num_envs: int,
+        reward_scale: float = 1.0,
+        max_episode_steps: Optional[int] = None,
+    ):
+        """Vectorized environment stepping a batch of states with an environment model.
+
+        Args:
+            env_fn: callable function creating the data environment used for resets and spaces.
+            env_model: environment model of the same environment, wrapped by `create_env_model`
+                consistently with the wrappers of the data environment.
+            num_envs: number of sub-environments.
+            reward_scale: reward scale of the data environment, which also scales the termination penalty.
+            max_episode_steps: maximum number of steps of an episode. If ``None``, then the
+                `max_episode_steps` attribute of the environment is taken.
+
+        Raises:
+            ValueError: If the environment is not an env_gen_ocp environment, or its context is
+                indexed by time and it has no maximum number of steps.
+        """
+        self.env = env_fn()
+        self.env_model = env_model
+        self.metadata = self.env.metadata
+        unwrapped = self.env.unwrapped
+        self.context = getattr(unwrapped, "context", None)
+        if not isinstance(self.context, Context):
+            raise ValueError("Tensor vector environments only support env_gen_ocp environments!")
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=self.env.observation_space,
+            action_space=self.env.action_space,
+        )
+
+        if max_episode_steps is None:
+            max_episode_steps = getattr(unwrapped, "max_episode_steps", None)
+        self.max_episode_steps = max_episode_steps
+        self.termination_penalty = reward_scale * getattr(unwrapped, "termination_penalty", 0.0)
+
+        zero_reference = np.asarray(self.context.get_zero_state().reference)
+        self.window = len(zero_reference)
+        self.time_indexed = zero_reference.ndim > 1
+        if self.time_indexed and self.max_episode_steps is None:
+            raise ValueError(
+                "Tensor vector environments need max_episode_steps for contexts indexed by time!"
+            )
+
+        self.rows = torch.arange(num_envs)
+        self.window_index = torch.arange(self.window)
+        self.obs = None
+        self.robot_state = None
+        # reference of the whole episode of each row if the context is indexed by time
+        self.reference = None
+        self.constraint = None
+        self.elapsed_steps = torch.zeros(num_envs, dtype=torch.long)
+        self._actions = None
+
+    def seed(self, seed: Optional[int] = None):
+        """Sets the seed of the data environment drawing initial states.
+
+        Args:
+            seed: The seed
+        """
+        self.env.seed(seed)
+
+    def reset_wait(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        """Resets all sub-environments.
+
+        Args:
+            seed: The reset environment seed, only an integer seed of the first sub-environment is used
+            options: Option information for the environment reset
+
+        Returns:
+            The reset observation of the environment and reset information
+        """
+        if isinstance(seed, (list, tuple)):
+            seed = seed[0]
+        if seed is not None:
+            self.seed(seed)
+        obs, robot_state, reference, constraint = self._initial_rows(self.num_envs, options)
+        self.obs = obs
+        self.robot_state = robot_state
+        self.reference = reference
+        self.constraint = constraint
+        self.elapsed_steps.zero_()
+        return self.obs.numpy().copy(), self._info(self._state())
+
+    def step_async(self, actions):
+        """Sets :attr:`_actions` for use by the :meth:`step_wait`."""
+        self._actions = torch.as_tensor(np.asarray(actions, dtype=np.float32))
+
+    def step_wait(self) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        """Steps the batch of states with the environment model, resetting finished rows.
+
+        Returns:
+            The batched environment step results
+        """
+        with torch.no_grad():
+            next_obs, reward, terminated, next_info = self.env_model.forward(
+                self.obs,
+                self._actions,
+                torch.zeros(self.num_envs, dtype=torch.bool),
+                {"state": self._state()},
+            )
+        terminated = terminated.reshape(-1).bool()
+        reward = reward.reshape(-1) - self.termination_penalty * terminated
+        self.obs = next_obs.to(torch.float32)
+        self.robot_state = next_info["state"].robot_state
+        self.elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            # consistent with the TimeLimit wrapper, termination takes precedence over truncation
+            truncated = (self.elapsed_steps >= self.max_episode_steps) & ~terminated
+        else:
+            truncated = torch.zeros_like(terminated)
+
+        infos = self._info(self._state())
+        reset = (terminated | truncated).numpy()
+        if reset.any():
+            index = np.where(reset)[0]
+            final_observation = np.empty(self.num_envs, dtype=object)
+            final_info = np.empty(self.num_envs, dtype=object)
+            final_states = infos["state"][index]
+            for j, i in enumerate(index):
+                final_observation[i] = self.obs[i].numpy().copy()
+                final_info[i] = {"state": final_states[j]}
+            infos["final_observation"] = final_observation
+            infos["_final_observation"] = reset
+            infos["final_info"] = final_info
+            infos["_final_info"] = reset
+
+            rows = torch.from_numpy(index)
+            obs, robot_state, reference, constraint = self._initial_rows(len(index))
+            self.obs[rows] = obs
+            self.robot_state[rows] = robot_state.to(self.robot_state.dtype)
+            self.reference[rows] = reference
+            if self.constraint is not None:
+                self.constraint[rows] = constraint.to(self.constraint.dtype)
+            self.elapsed_steps[rows] = 0
+            infos["state"][index] = self._state()[rows].tensor2array()
+
+        return (
+            self.obs.numpy().copy(),
+            reward.numpy().astype(np.float64),
+            terminated.numpy(),
+            truncated.numpy(),
+            infos,
+        )
+
+    def call(self, name, *args, **kwargs) -> tuple:
+        """Calls the method with name of the data environment once for all sub-environments."""
+        function = getattr(self.env, name)
+        if callable(function):
+            return (function(*args, **kwargs),) * self.num_envs
+        return (function,) * self.num_envs
+
+    def close_extras(self, **kwargs):
+        """Close the data environment."""
+        self.env.close()
+
+    def _initial_rows(self, n: int, options: Optional[dict] = None) -> tuple:
+        """Initial observations, robot states, references and constraints of `n` rows, as batched tensors."""
+        obs, robot_states, references, constraints = [], [], [], []
+        for _ in range(n):
+            if options is None:
+                o, info = self.env.reset()
+            else:
+                o, info = self.env.reset(options=options)
+            state = info["state"]
+            reference = np.array(state.context_state.reference)
+            if self.time_indexed:
+                reference = np.concatenate((
+                    reference,
+                    self.context.rollout_reference(self.max_episode_steps).astype(reference.dtype),
+                ))
+            obs.append(o)
+            robot_states.append(state.robot_state)
+            references.append(reference)
+            constraints.append(state.context_state.constraint)
+        constraint = None
+        if constraints[0] is not None:
+            constraint = torch.from_numpy(np.stack(constraints))
+        return (
+            torch.as_tensor(np.stack(obs), dtype=torch.float32),
+            torch.from_numpy(np.stack(robot_states)),
+            torch.from_numpy(np.stack(references)),
+            constraint,
+        )
+
+    def _state(self) -> State:
+        """Batched state of all rows, whose reference is the window at the episode step of each row."""
+        reference = self.reference
+        if self.time_indexed:
+            index = self.elapsed_steps.unsqueeze(1) + self.window_index
+            reference = reference[self.rows.unsqueeze(1), index]
+        return State(
+            robot_state=self.robot_state,
+            context_state=ContextState(reference=reference, constraint=self.constraint),
+        )
+
+    def _info(self, state: State) -> dict:
+        """Info of all rows holding a numpy copy of their batched state."""
+        state = state.tensor2array()
+        state = State(
+            robot_state=state.robot_state.copy(),
+            context_state=ContextState(
+                reference=state.context_state.reference.copy(),
+                constraint=None if self.constraint is None else state.context_state.constraint.copy(),
+            ),
+        )
+        return {"state": state, "_state": np.ones(self.num_envs, dtype=bool)}
@@ -43,11 +43,11 @@ class NoiseData(gym.Wrapper):
             return observation
         elif self.noise_type == "normal":
             return observation + self.np_random.normal(
-                loc=self.noise_data[0], scale=self.noise_data[1]
+                loc=self.noise_data[0], scale=self.noise_data[1], size=np.shape(observation)
             )
         elif self.noise_type == "uniform":
             return observation + self.np_random.uniform(
-                low=self.noise_data[0], high=self.noise_data[1]
+                low=self.noise_data[0], high=self.noise_data[1], size=np.shape(observation)
             )
 
     def reset(self, **kwargs):
@@ -0,0 +1,25 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Prioritized replay buffer backed by memory-mapped files
+
+
+from gops.trainer.buffer.memmap_replay_buffer import MemmapReplayBuffer
+from gops.trainer.buffer.prioritized_replay_buffer import PrioritizedReplayBuffer
+
+__all__ = ["MemmapPrioritizedReplayBuffer"]
+
+
+class MemmapPrioritizedReplayBuffer(MemmapReplayBuffer, PrioritizedReplayBuffer):
+    """
+    Implementation of replay buffer with prioritized sampling probability,
+    whose columns and sum/min trees are stored in memory-mapped .npy files.
+    See `MemmapReplayBuffer` and `PrioritizedReplayBuffer` for arguments.
+    When opened read-only, priority updates only live in memory.
+    """
+    pass
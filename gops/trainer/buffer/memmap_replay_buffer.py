@@ -0,0 +1,161 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer backed by memory-mapped files
+
+
+from dataclasses import fields
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+from gops.env.env_gen_ocp.pyth_base import State
+from gops.trainer.buffer.replay_buffer import META_FILE, ReplayBuffer, combined_shape
+
+__all__ = ["MemmapReplayBuffer"]
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    Implementation of replay buffer with uniform sampling probability,
+    whose columns are stored in memory-mapped .npy files instead of RAM.
+    Hot pages are kept in the OS page cache, so the buffer can be larger than RAM.
+    Metadata (write pointer and size) is written by `flush` and while storing at most
+    every `buffer_meta_interval` seconds, so a buffer reopened without `flush` may miss
+    the newest samples.
+
+    Args:
+        buffer_dir (str, optional): Directory of column files.
+                                    Defaults to `save_folder/buffer_{index}`.
+        buffer_read_only (bool, optional): Open an existing buffer directory without modifying it,
+                                           e.g. for offline training. New samples are ignored.
+                                           Defaults to False.
+        buffer_meta_interval (float, optional): Minimum seconds between metadata writes while storing.
+                                                Defaults to 10.
+    """
+
+    meta_file = META_FILE
+    copy_on_write_keys = ("sum_tree", "min_tree")
+
+    def __init__(self, index=0, **kwargs):
+        self.buffer_dir = kwargs.get("buffer_dir", None)
+        if self.buffer_dir is None:
+            self.buffer_dir = os.path.join(kwargs["save_folder"], "buffer_{}".format(index))
+        self.read_only = kwargs.get("buffer_read_only", False)
+        self.meta_interval = kwargs.get("buffer_meta_interval", 10.0)
+        self.memmaps = []
+        if kwargs.get("buffer_compact_obs", False) or kwargs.get("buffer_dedup_context", False):
+            raise ValueError("Compact or deduplicated storage is not supported by memmap buffers")
+        if self.read_only:
+            if not os.path.isfile(os.path.join(self.buffer_dir, self.meta_file)):
+                raise FileNotFoundError("No replay buffer found in {}".format(self.buffer_dir))
+        else:
+            os.makedirs(self.buffer_dir, exist_ok=True)
+
+        super().__init__(index, **kwargs)
+
+        if self.read_only:
+            self._load_meta()
+        else:
+            self._write_meta()
+
+    def _allocate(self, key: str, shape: tuple, dtype, fill: float = 0) -> np.ndarray:
+        if int(np.prod(shape)) == 0:
+            return super()._allocate(key, shape, dtype, fill)
+        filename = os.path.join(self.buffer_dir, key + ".npy")
+        if self.read_only:
+            # priorities may still be updated in memory during offline training
+            mode = "c" if key in self.copy_on_write_keys else "r"
+            array = np.lib.format.open_memmap(filename, mode=mode)
+            if array.shape != tuple(shape) or array.dtype != np.dtype(dtype):
+                raise ValueError(
+                    "{} has shape {} and dtype {}, expected {} and {}".format(
+                        filename, array.shape, array.dtype, tuple(shape), np.dtype(dtype)
+                    )
+                )
+            return array
+        array = np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=tuple(shape))
+        if fill != 0:
+            array[:] = fill
+        self.memmaps.append(array)
+        return array
+
+    def _allocate_state(self, key: str, state: State) -> State:
+        robot_state = self._allocate(
+            key + ".robot_state",
+            combined_shape(self.max_size, state.robot_state.shape),
+            state.robot_state.dtype,
+        )
+        context_values = []
+        for field in fields(state.context_state):
+            v = getattr(state.context_state, field.name)
+            if isinstance(v, np.ndarray):
+                context_values.append(self._allocate(
+                    key + ".context_state." + field.name,
+                    combined_shape(self.max_size, v.shape),
+                    v.dtype,
+                ))
+            else:
+                context_values.append(v)
+        return State(robot_state, state.context_state.__class__(*context_values))
+
+    def _write_meta(self) -> None:
+        filename = os.path.join(self.buffer_dir, self.meta_file)
+        with open(filename + ".tmp", "w") as f:
+            json.dump(self._meta(), f)
+        os.replace(filename + ".tmp", filename)
+        self.meta_time = time.monotonic()
+
+    def _write_meta_if_due(self) -> None:
+        if time.monotonic() - self.meta_time >= self.meta_interval:
+            self._write_meta()
+
+    def _load_meta(self) -> None:
+        with open(os.path.join(self.buffer_dir, self.meta_file)) as f:
+            meta = json.load(f)
+        if meta["max_size"] != self.max_size:
+            raise ValueError(
+                "Buffer in {} has max size {}, but buffer_max_size is {}".format(
+                    self.buffer_dir, meta["max_size"], self.max_size
+                )
+            )
+        self._set_meta(meta)
+
+    def store(self, *args, **kwargs) -> None:
+        if self._ignore_samples():
+            return
+        super().store(*args, **kwargs)
+        self._write_meta_if_due()
+
+    def store_batch(self, batch: dict) -> None:
+        if self._ignore_samples():
+            return
+        super().store_batch(batch)
+        self._write_meta_if_due()
+
+    def load(self, path: str, chunk_size: int = 1 << 26) -> None:
+        if self.read_only:
+            raise RuntimeError("Replay buffer in {} is read-only".format(self.buffer_dir))
+        super().load(path, chunk_size)
+        self.flush()
+
+    def _ignore_samples(self) -> bool:
+        if self.read_only and not getattr(self, "_warned_read_only", False):
+            warnings.warn("Replay buffer in {} is read-only, new samples are ignored".format(self.buffer_dir))
+            self._warned_read_only = True
+        return self.read_only
+
+    def flush(self) -> None:
+        """Flush column files and metadata to disk."""
+        if self.read_only:
+            return
+        for array in self.memmaps:
+            array.flush()
+        self._write_meta()
@@ -15,6 +15,7 @@ from typing import Tuple
 import numpy as np
 import torch
 from gops.trainer.buffer.replay_buffer import ReplayBuffer
+from gops.utils.profiler import profile
 
 __all__ = ["PrioritizedReplayBuffer"]
 
@@ -23,28 +24,36 @@ class PrioritizedReplayBuffer(ReplayBuffer):
     """
     Implementation of replay buffer with prioritized sampling probability.
 
+    The sum tree and min tree are stored in heap layout with the number of leaves
+    padded to a power of two, so that all leaves share the same depth and a batch
+    of queries or updates can advance one tree level per NumPy operation.
+
     Paper:
         https://openreview.net/forum?id=pBbWjZdoRiN
 
     Args:
-        alpha (float, optional): Determines how much prioritization is used,
-                                 with alpha = 0 corresponding to uniform case.
-                                 Defaults to 0.6.
-        beta (float, optional): Initial strength of compensation for non-uniform probabilities,
-                                with beta = 1 corresponding to fully compensation.
-                                Defaults to 0.4.
-        beta_increment (float, optional): Schedule on beta that finally reaches 1.
-                                          Defaults to 0.01.
+        per_alpha (float, optional): Determines how much prioritization is used,
+                                     with alpha = 0 corresponding to uniform case.
+                                     Defaults to 0.6.
+        per_beta (float, optional): Initial strength of compensation for non-uniform probabilities,
+                                    with beta = 1 corresponding to fully compensation.
+                                    Defaults to 0.4.
+        per_beta_increment (float, optional): Increment of beta per sampled batch until it reaches 1.
+                                              Defaults to 0.01.
     """
 
     def __init__(self, index=0, **kwargs):
         super().__init__(index, **kwargs)
 
-        self.sum_tree = np.zeros(2 * self.max_size - 1)
-        self.min_tree = float("inf") * np.ones(2 * self.max_size - 1)
-        self.alpha = 0.6  #TODO: make it specifiable?
-        self.beta = 0.4
-        self.beta_increment = 0.01
+        self.tree_depth = int(np.ceil(np.log2(self.max_size)))
+        self.tree_capacity = 2 ** self.tree_depth
+        self.sum_tree = self._allocate("sum_tree", (2 * self.tree_capacity - 1,), np.float64)
+        self.min_tree = self._allocate(
+            "min_tree", (2 * self.tree_capacity - 1,), np.float64, fill=float("inf")
+        )
+        self.alpha = kwargs.get("per_alpha", 0.6)
+        self.beta = kwargs.get("per_beta", 0.4)
+        self.beta_increment = kwargs.get("per_beta_increment", 0.01)
         self.epsilon = 1e-6
         self.max_priority = 1.0 ** self.alpha
 
@@ -59,93 +68,81 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         next_info: dict,
         logp: np.ndarray,
     ) -> None:
-        self.buf["obs"][self.ptr] = obs
-        self.buf["obs2"][self.ptr] = next_obs
-        self.buf["act"][self.ptr] = act
-        self.buf["rew"][self.ptr] = rew
-        self.buf["done"][self.ptr] = done
-        self.buf["logp"][self.ptr] = logp
-        for k in self.additional_info.keys():
-            self.buf[k][self.ptr] = info[k]
-            self.buf["next_" + k][self.ptr] = next_info[k]
-        tree_idx = self.ptr + self.max_size - 1
+        tree_idx = self.ptr + self.tree_capacity - 1
+        super().store(obs, act, rew, done, info, next_obs, next_info, logp)
         self.sum_tree[tree_idx] = self.max_priority
         self.min_tree[tree_idx] = self.max_priority
         self.update_tree(tree_idx)
-        self.ptr = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
+
+    def store_batch(self, batch: dict) -> None:
+        n = min(len(batch["rew"]), self.max_size)
+        ptrs = (self.ptr + len(batch["rew"]) - n + np.arange(n)) % self.max_size
+        super().store_batch(batch)
+        self.set_leaves(ptrs + self.tree_capacity - 1, self.max_priority)
+
+    def _named_arrays(self) -> dict:
+        arrays = super()._named_arrays()
+        arrays["sum_tree"] = self.sum_tree
+        arrays["min_tree"] = self.min_tree
+        return arrays
 
     def update_tree(self, tree_idx: int) -> None:
-        parent = (tree_idx - 1) // 2
-        while True:
-            left = 2 * parent + 1
-            right = left + 1
-            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
-            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
-            if parent == 0:
-                break
+        parent = tree_idx
+        while parent > 0:
             parent = (parent - 1) // 2
-
-    def get_leaf(self, value: float) -> Tuple[int, float]:
-        parent = 0
-        while True:
             left = 2 * parent + 1
-            right = left + 1
-            if left >= len(self.sum_tree):
-                idx = parent
-                break
-            else:
-                if value <= self.sum_tree[left]:
-                    parent = left
-                else:
-                    value -= self.sum_tree[left]
-                    parent = right
-        return idx, self.sum_tree[idx]
-
+            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[left + 1]
+            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[left + 1])
+
+    def set_leaves(self, tree_idxes: np.ndarray, priorities) -> None:
+        """Write leaf priorities and recompute their ancestors level by level."""
+        self.sum_tree[tree_idxes] = priorities
+        self.min_tree[tree_idxes] = priorities
+        parents = np.unique(tree_idxes)
+        for _ in range(self.tree_depth):
+            parents = np.unique((parents - 1) // 2)
+            left = 2 * parents + 1
+            self.sum_tree[parents] = self.sum_tree[left] + self.sum_tree[left + 1]
+            self.min_tree[parents] = np.minimum(self.min_tree[left], self.min_tree[left + 1])
+
+    def get_leaves(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Descend the sum tree for all values at once, one level per step."""
+        idxes = np.zeros(len(values), dtype=np.int64)
+        values = values.copy()
+        for _ in range(self.tree_depth):
+            left = 2 * idxes + 1
+            left_sum = self.sum_tree[left]
+            go_right = values > left_sum
+            values -= left_sum * go_right
+            idxes = left + go_right
+        # guard against floating point round-off walking into empty leaves
+        idxes = np.minimum(idxes, self.size + self.tree_capacity - 2)
+        return idxes, self.sum_tree[idxes]
+
+    @profile("buffer.sample_batch")
     def sample_batch(self, batch_size: int) -> dict:
-        idxes, weights = np.zeros(batch_size, dtype=np.int32), np.zeros(batch_size)
         segment = self.sum_tree[0] / batch_size
-        self.beta = min(1.0, self.beta + self.beta_increment)  #TODO: technically useless
+        self.beta = min(1.0, self.beta + self.beta_increment)
         min_prob = self.min_tree[0] / self.sum_tree[0]
         max_weight = (min_prob * self.size) ** (-self.beta)
 
         values = np.random.uniform(np.arange(batch_size) * segment, np.arange(batch_size) * segment + segment)
-        idxes, priorities = zip(*map(self.get_leaf, values))
-        idxes = np.array(idxes, dtype=np.int32)
-        priorities = np.array(priorities)
+        idxes, priorities = self.get_leaves(values)
         probs = priorities / self.sum_tree[0]
         weights = (probs * self.size) ** (-self.beta) / max_weight
 
-        batch = {}
-        ptrs = idxes - self.max_size + 1
+        ptrs = idxes - self.tree_capacity + 1
+        batch = self.gather(ptrs)
         batch["idx"] = torch.as_tensor(idxes, dtype=torch.int32)
         batch["weight"] = torch.as_tensor(weights, dtype=torch.float32)
-        for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
-                batch[k] = torch.as_tensor(v[ptrs], dtype=torch.float32)
-            else:
-                batch[k] = v[ptrs].array2tensor()
         return batch
 
+    @profile("buffer.update_batch")
     def update_batch(self, idxes: int, priorities: float) -> None:
         if isinstance(idxes, torch.Tensor):
-            idxes = idxes.detach().numpy()
+            idxes = idxes.detach().cpu().numpy()
         if isinstance(priorities, torch.Tensor):
-            priorities = priorities.detach().numpy()
+            priorities = priorities.detach().cpu().numpy()
         priorities = (priorities + self.epsilon) ** self.alpha
-        self.sum_tree[idxes] = priorities
-        self.min_tree[idxes] = priorities
+        self.set_leaves(idxes.astype(np.int64), priorities)
         self.max_priority = max(self.max_priority, priorities.max())
-
-        idxes_to_update = {}  # lazy update to avoid redundancy
-        for idx in idxes:
-            while idx > 0 and idx not in idxes_to_update:
-                idxes_to_update[idx] = True
-                idx = (idx - 1) // 2
-        for idx in sorted(idxes_to_update.keys(), reverse=True):
-            parent = (idx - 1) // 2
-            left = 2 * parent + 1
-            right = left + 1
-            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
-            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
-
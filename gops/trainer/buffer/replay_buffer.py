@@ -10,13 +10,25 @@
 #  Update: 2021-03-05, Yuheng Lei: Create replay buffer
 
 
+from dataclasses import fields
+from typing import Optional, Union
+
+import json
 import numpy as np
+import os
+import shutil
 import sys
+import threading
+import time
 import torch
+from gops.env.env_gen_ocp.pyth_base import ContextState, State, concat_context_state, stack_context_state
 from gops.utils.common_utils import set_seed
+from gops.utils.profiler import configure_profiler, get_profiler, profile
 
 __all__ = ["ReplayBuffer"]
 
+META_FILE = "meta.json"
+
 
 def combined_shape(length: int, shape=None):
     if shape is None:
@@ -24,46 +36,461 @@ def combined_shape(length: int, shape=None):
     return (length, shape) if np.isscalar(shape) else (length, *shape)
 
 
+def stack_column(values: list) -> Union[np.ndarray, State, ContextState]:
+    """Stack a list of per-transition values into one column."""
+    if isinstance(values[0], State):
+        return State.stack(values)
+    elif isinstance(values[0], ContextState):
+        return stack_context_state(values)
+    else:
+        return np.stack(values)
+
+
+def concat_column(columns: list) -> Union[np.ndarray, State, ContextState]:
+    """Concatenate columns along the first dimension."""
+    if isinstance(columns[0], State):
+        return State.concat(columns)
+    elif isinstance(columns[0], ContextState):
+        return concat_context_state(columns)
+    else:
+        return np.concatenate(columns)
+
+
+def zeros_like_column(column: Union[np.ndarray, State, ContextState], length: int):
+    """Allocate an empty column with `length` rows shaped like `column`."""
+    if isinstance(column, ReferenceWindowColumn):
+        return column.template.batch(length)
+    elif isinstance(column, np.ndarray):
+        return np.zeros((length, *column.shape[1:]), dtype=column.dtype)
+    elif isinstance(column, State):
+        return State(
+            zeros_like_column(column.robot_state, length),
+            zeros_like_column(column.context_state, length),
+        )
+    else:
+        values = []
+        for field in fields(column):
+            v = getattr(column, field.name)
+            values.append(zeros_like_column(v, length) if isinstance(v, np.ndarray) else v)
+        return column.__class__(*values)
+
+
+def rows_equal(a: Union[np.ndarray, State, ContextState], b: Union[np.ndarray, State, ContextState]) -> np.ndarray:
+    """Compare two columns row by row, returning a boolean array."""
+    if isinstance(a, np.ndarray):
+        return (a == b).reshape(len(a), int(np.prod(a.shape[1:]))).all(axis=1)
+    elif isinstance(a, State):
+        return rows_equal(a.robot_state, b.robot_state) & rows_equal(a.context_state, b.context_state)
+    else:
+        equal = True
+        for field in fields(a):
+            v = getattr(a, field.name)
+            if isinstance(v, np.ndarray):
+                equal = equal & rows_equal(v, getattr(b, field.name))
+        return equal
+
+
+def column_to_tensor(column: Union[np.ndarray, State]):
+    if isinstance(column, np.ndarray):
+        return torch.as_tensor(column, dtype=torch.float32)
+    else:
+        return column.array2tensor()
+
+
+def column_nbytes(column) -> int:
+    if isinstance(column, (np.ndarray, ReferenceWindowColumn)):
+        return column.nbytes
+    elif isinstance(column, State):
+        return column_nbytes(column.robot_state) + column_nbytes(column.context_state)
+    else:
+        return sum(
+            getattr(column, field.name).nbytes for field in fields(column)
+            if isinstance(getattr(column, field.name), np.ndarray)
+        )
+
+
+def named_column_arrays(key: str, column) -> dict:
+    """Arrays of a column keyed by file name, e.g. `state.robot_state` for a `State` column."""
+    if isinstance(column, np.ndarray):
+        return {key: column}
+    elif isinstance(column, ReferenceWindowColumn):
+        return {key + "." + k: v for k, v in column.named_arrays().items()}
+    arrays = {key + ".robot_state": column.robot_state}
+    for field in fields(column.context_state):
+        v = getattr(column.context_state, field.name)
+        if isinstance(v, np.ndarray):
+            arrays[key + ".context_state." + field.name] = v
+    return arrays
+
+
+def write_npy(filename: str, array: np.ndarray, chunk_size: int) -> None:
+    """Write `array` as an uncompressed .npy file, at most `chunk_size` bytes per write."""
+    array = np.ascontiguousarray(array)
+    with open(filename, "wb") as f:
+        np.lib.format.write_array_header_1_0(f, np.lib.format.header_data_from_array_1_0(array))
+        rows = max(1, chunk_size // max(1, array[:1].nbytes))
+        for i in range(0, len(array), rows):
+            f.write(array[i:i + rows].tobytes())
+
+
+def copy_chunks(source: np.ndarray, target: np.ndarray, chunk_size: int) -> None:
+    if source.shape != target.shape or source.dtype != target.dtype:
+        raise ValueError(
+            "Saved array has shape {} and dtype {}, expected {} and {}".format(
+                source.shape, source.dtype, target.shape, target.dtype
+            )
+        )
+    rows = max(1, chunk_size // max(1, target[:1].nbytes))
+    for i in range(0, len(target), rows):
+        target[i:i + rows] = source[i:i + rows]
+
+
+# a save process is waited for by the training loop and checkpoint writer threads, but reaped once
+_waitpid_lock = threading.Lock()
+
+
+class BufferSaveProcess:
+    """Handle of a forked process saving a replay buffer, see `ReplayBuffer.save`."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exitcode = None
+
+    def done(self) -> bool:
+        with _waitpid_lock:
+            if self.exitcode is None:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+                if pid != 0:
+                    self.exitcode = os.waitstatus_to_exitcode(status)
+        return self.exitcode is not None
+
+    def wait(self) -> None:
+        while not self.done():
+            time.sleep(0.01)
+        if self.exitcode != 0:
+            raise RuntimeError("Saving replay buffer failed with exit code {}".format(self.exitcode))
+
+
+class ColumnCodec:
+    """
+    Storage dtype of a buffer column, encoding values on insertion and decoding
+    them into float32 tensors on sampling.
+
+    Args:
+        dtype (str): One of float32, float16, bfloat16, uint8, bool, affine_uint8
+                     and affine_uint16. uint8 suits pixel observations, affine_* map
+                     [low, high] linearly onto the integer range.
+        low (array-like, optional): Lower bound used by affine_* dtypes.
+        high (array-like, optional): Upper bound used by affine_* dtypes.
+    """
+
+    storage_dtypes = {
+        "float32": np.float32,
+        "float16": np.float16,
+        "bfloat16": np.int16,
+        "uint8": np.uint8,
+        "bool": np.bool_,
+        "affine_uint8": np.uint8,
+        "affine_uint16": np.uint16,
+    }
+
+    def __init__(self, dtype: str, low=None, high=None):
+        if dtype not in self.storage_dtypes:
+            raise ValueError("Unsupported buffer storage dtype {}".format(dtype))
+        self.dtype = dtype
+        self.storage_dtype = np.dtype(self.storage_dtypes[dtype])
+        if dtype.startswith("affine"):
+            if low is None or high is None:
+                raise ValueError("Storage dtype {} requires low and high bounds".format(dtype))
+            low = np.asarray(low, dtype=np.float32)
+            high = np.asarray(high, dtype=np.float32)
+            if not (np.all(np.isfinite(low)) and np.all(np.isfinite(high))):
+                raise ValueError("Storage dtype {} requires finite bounds".format(dtype))
+            self.qmax = np.iinfo(self.storage_dtype).max
+            self.low = low
+            self.scale = np.maximum(high - low, 1e-8) / self.qmax
+            self.low_tensor = torch.from_numpy(self.low)
+            self.scale_tensor = torch.from_numpy(self.scale.astype(np.float32))
+
+    def encode(self, value: np.ndarray) -> np.ndarray:
+        if self.dtype == "bfloat16":
+            value = torch.from_numpy(np.ascontiguousarray(value, dtype=np.float32))
+            return value.to(torch.bfloat16).view(torch.int16).numpy()
+        elif self.dtype == "bool":
+            return np.asarray(value) != 0
+        elif self.dtype.startswith("affine"):
+            q = np.rint((np.asarray(value, dtype=np.float32) - self.low) / self.scale)
+            return np.clip(q, 0, self.qmax).astype(self.storage_dtype)
+        return np.asarray(value).astype(self.storage_dtype, copy=False)
+
+    def decode(self, value: np.ndarray) -> torch.Tensor:
+        value = torch.from_numpy(np.ascontiguousarray(value))
+        if self.dtype == "bfloat16":
+            return value.view(torch.bfloat16).float()
+        elif self.dtype.startswith("affine"):
+            return value.float() * self.scale_tensor + self.low_tensor
+        return value.float()
+
+
+class ReferenceWindowColumn:
+    """
+    Column of `State` whose context reference is a sliding window over a trajectory,
+    as produced by e.g. `RefTrajContext`, where consecutive windows differ by one shifted row.
+
+    Reference rows are kept once in a growable ring and every slot only stores the
+    absolute index of the first row of its window. A written window that equals the
+    previous one, or the previous one shifted by one row, appends zero or one row;
+    any other window appends all of its rows. Windows are materialized with one gather.
+    Slots must be written in ring order, as `ReplayBuffer.store_batch` does.
+    """
+
+    def __init__(self, state: State, max_size: int):
+        self.template = state
+        self.max_size = max_size
+        self.robot_state = zeros_like_column(state.batch(1).robot_state, max_size)
+        context_state = state.context_state
+        self.context_fields = {}
+        for field in fields(context_state):
+            v = getattr(context_state, field.name)
+            if field.name != "reference" and isinstance(v, np.ndarray):
+                self.context_fields[field.name] = np.zeros((max_size, *v.shape), dtype=v.dtype)
+        reference = context_state.reference
+        self.window = reference.shape[0]
+        self.row_shape = reference.shape[1:]
+        self.rows = np.zeros((max(max_size // 4, 1) + self.window, *self.row_shape), dtype=reference.dtype)
+        self.start = np.zeros(max_size, dtype=np.int64)
+        self.total_rows = 0
+        self.filled = 0
+        self.last_window = None
+        self.last_start = 0
+
+    @staticmethod
+    def supports(state: State) -> bool:
+        reference = getattr(state.context_state, "reference", None)
+        return isinstance(reference, np.ndarray) and reference.ndim >= 2
+
+    def __len__(self):
+        return self.max_size
+
+    def __getitem__(self, index) -> State:
+        starts = self.start[index]
+        rows = (starts[..., None] + np.arange(self.window)) % len(self.rows)
+        values = []
+        for field in fields(self.template.context_state):
+            if field.name == "reference":
+                values.append(self.rows[rows])
+            elif field.name in self.context_fields:
+                values.append(self.context_fields[field.name][index])
+            else:
+                values.append(getattr(self.template.context_state, field.name))
+        return State(self.robot_state[index], self.template.context_state.__class__(*values))
+
+    def __setitem__(self, index, value: State) -> None:
+        slots = np.atleast_1d(np.arange(self.max_size)[index])
+        n = len(slots)
+        if n == 0:
+            return
+        self.robot_state[slots] = value.robot_state
+        for name, v in self.context_fields.items():
+            v[slots] = getattr(value.context_state, name)
+
+        windows = value.context_state.reference.reshape(n, self.window, *self.row_shape)
+        same = np.zeros(n, dtype=np.bool_)
+        shift = np.zeros(n, dtype=np.bool_)
+        if self.last_window is None:
+            same[1:] = rows_equal(windows[1:], windows[:-1])
+            shift[1:] = rows_equal(windows[1:, :-1], windows[:-1, 1:])
+        else:
+            prev = np.concatenate((self.last_window[None], windows[:-1]))
+            same = rows_equal(windows, prev)
+            shift = rows_equal(windows[:, :-1], prev[:, 1:])
+        shift &= ~same
+        new = ~(same | shift)
+
+        counts = np.where(new, self.window, shift.astype(np.int64))
+        offsets = self.total_rows + np.cumsum(counts) - counts
+        steps = np.cumsum(shift)
+        last_new = np.maximum.accumulate(np.where(new, np.arange(n), -1))
+        starts = np.where(
+            last_new >= 0,
+            offsets[last_new] + steps - steps[np.maximum(last_new, 0)],
+            self.last_start + steps,
+        )
+
+        # make sure rows still referenced after this write are not overwritten
+        filled = max(self.filled, slots[-1] + 1)
+        oldest = (slots[-1] + 1) % self.max_size if filled == self.max_size else 0
+        in_batch = np.nonzero(slots == oldest)[0]
+        oldest_start = starts[in_batch[-1]] if len(in_batch) > 0 else self.start[oldest]
+        end = self.total_rows + counts.sum()
+        if end - oldest_start > len(self.rows):
+            self._grow(end - oldest_start, min(oldest_start, self.total_rows))
+
+        capacity = len(self.rows)
+        new_rows = (offsets[new, None] + np.arange(self.window)) % capacity
+        self.rows[new_rows] = windows[new]
+        self.rows[offsets[shift] % capacity] = windows[shift, -1]
+        self.start[slots] = starts
+        self.total_rows = end
+        self.filled = filled
+        self.last_window = windows[-1].copy()
+        self.last_start = starts[-1]
+
+    def _grow(self, required: int, keep_from: int) -> None:
+        old_rows = self.rows
+        # no more than one full window per slot can ever be referenced
+        capacity = max(min(2 * max(len(old_rows), required), self.max_size * self.window), required)
+        self.rows = np.zeros((capacity, *self.row_shape), dtype=old_rows.dtype)
+        keep = np.arange(keep_from, self.total_rows)
+        self.rows[keep % capacity] = old_rows[keep % len(old_rows)]
+
+    def named_arrays(self) -> dict:
+        arrays = {"robot_state": self.robot_state, "rows": self.rows, "start": self.start}
+        for name, v in self.context_fields.items():
+            arrays["context_state." + name] = v
+        if self.last_window is not None:
+            arrays["last_window"] = self.last_window
+        return arrays
+
+    def meta(self) -> dict:
+        return {"total_rows": int(self.total_rows), "filled": int(self.filled), "last_start": int(self.last_start)}
+
+    def prepare_load(self, arrays: dict) -> None:
+        """Resize storage to match `arrays` produced by `named_arrays` before copying them."""
+        self.rows = np.zeros(arrays["rows"].shape, dtype=self.rows.dtype)
+        self.last_window = None
+        if "last_window" in arrays:
+            self.last_window = np.zeros(arrays["last_window"].shape, dtype=self.rows.dtype)
+
+    def set_meta(self, meta: dict) -> None:
+        for k, v in meta.items():
+            setattr(self, k, v)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.robot_state.nbytes + self.rows.nbytes + self.start.nbytes
+            + sum(v.nbytes for v in self.context_fields.values())
+        )
+
+
 class ReplayBuffer:
     """
     Implementation of replay buffer with uniform sampling probability.
+
+    Args:
+        buffer_compact_obs (bool, optional): Store each observation (and additional info) once.
+            Since obs2[i] == obs[i + 1] unless an episode or a sampled batch ends at slot i,
+            only a boundary flag is kept per slot and the true next values of boundary slots
+            are kept in a small side table. obs2 and next_* are rebuilt when sampling.
+            Defaults to False.
+        buffer_dedup_context (bool, optional): Store sliding reference windows of `State`
+            additional info once per trajectory row, see `ReferenceWindowColumn`.
+            Defaults to False.
+        buffer_storage_dtype (dict, optional): Storage dtype of array columns, keyed by
+            column name (obs, act, rew, done, logp or an additional info key), see
+            `ColumnCodec`. A value is either a dtype name or a dict with keys dtype, low
+            and high. Bounds of obs and act default to the environment spaces. The
+            dtype of obs/k also applies to obs2/next_k. Values are decoded to float32
+            tensors when sampling. Defaults to float32 for all columns.
     """
 
     def __init__(self, index=0, **kwargs):
         set_seed(kwargs["trainer"], kwargs["seed"], index + 100)
+        configure_profiler(**kwargs)
         self.obsv_dim = kwargs["obsv_dim"]
         self.act_dim = kwargs["action_dim"]
         self.max_size = kwargs["buffer_max_size"]
+        self.compact = kwargs.get("buffer_compact_obs", False)
+        self.dedup_context = kwargs.get("buffer_dedup_context", False)
+        self.additional_info = kwargs["additional_info"]
+        # map from key of next value to key of current value
+        self.next_keys = {"obs2": "obs"}
+        for k in self.additional_info.keys():
+            self.next_keys["next_" + k] = k
+        self._init_codecs(kwargs)
+
         self.buf = {
-            "obs": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
+            "obs": self._allocate(
+                "obs", combined_shape(self.max_size, self.obsv_dim), self._storage_dtype("obs", np.float32)
             ),
-            "obs2": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
+            "act": self._allocate(
+                "act", combined_shape(self.max_size, self.act_dim), self._storage_dtype("act", np.float32)
             ),
-            "act": np.zeros(
-                combined_shape(self.max_size, self.act_dim), dtype=np.float32
-            ),
-            "rew": np.zeros(self.max_size, dtype=np.float32),
-            "done": np.zeros(self.max_size, dtype=np.float32),
-            "logp": np.zeros(self.max_size, dtype=np.float32),
+            "rew": self._allocate("rew", (self.max_size,), self._storage_dtype("rew", np.float32)),
+            "done": self._allocate("done", (self.max_size,), self._storage_dtype("done", np.float32)),
+            "logp": self._allocate("logp", (self.max_size,), self._storage_dtype("logp", np.float32)),
         }
-        self.additional_info = kwargs["additional_info"]
+        if not self.compact:
+            self.buf["obs2"] = self._allocate(
+                "obs2", combined_shape(self.max_size, self.obsv_dim), self._storage_dtype("obs2", np.float32)
+            )
         for k, v in self.additional_info.items():
-            if isinstance(v, dict):
-                self.buf[k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-                self.buf["next_" + k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-            else:
-                self.buf[k] = v.batch(self.max_size)
-                self.buf["next_" + k] = v.batch(self.max_size)
+            keys = [k] if self.compact else [k, "next_" + k]
+            for key in keys:
+                if isinstance(v, dict):
+                    self.buf[key] = self._allocate(
+                        key, combined_shape(self.max_size, v["shape"]), self._storage_dtype(key, v["dtype"])
+                    )
+                else:
+                    self.buf[key] = self._allocate_state(key, v)
+
+        if self.compact:
+            self.boundary = np.zeros(self.max_size, dtype=np.bool_)
+            self.final_idx = np.full(self.max_size, -1, dtype=np.int64)
+            self._init_final_table(max(1, self.max_size // 64))
+
         self.ptr, self.size, = (
             0,
             0,
         )
+        self.save_process = None
+
+    def _init_codecs(self, kwargs: dict) -> None:
+        bounds = {
+            "obs": (kwargs.get("obsv_low_limit", None), kwargs.get("obsv_high_limit", None)),
+            "act": (kwargs.get("action_low_limit", None), kwargs.get("action_high_limit", None)),
+        }
+        self.codecs = {}
+        storage_dtype = kwargs.get("buffer_storage_dtype", None) or {}
+        for key, spec in storage_dtype.items():
+            if not isinstance(self.additional_info.get(key, {}), dict):
+                raise ValueError("Storage dtype of State column {} is not configurable".format(key))
+            if isinstance(spec, str):
+                spec = {"dtype": spec}
+            low, high = bounds.get(key, (None, None))
+            codec = ColumnCodec(spec["dtype"], spec.get("low", low), spec.get("high", high))
+            if codec.dtype == "float32":
+                continue
+            self.codecs[key] = codec
+            for next_key, k in self.next_keys.items():
+                if k == key:
+                    self.codecs[next_key] = codec
+
+    def _storage_dtype(self, key: str, default):
+        codec = self.codecs.get(key, None)
+        return default if codec is None else codec.storage_dtype
+
+    def _allocate(self, key: str, shape: tuple, dtype, fill: float = 0) -> np.ndarray:
+        """Allocate storage of one column, overridden by buffers with other backends."""
+        if fill == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.full(shape, fill, dtype=dtype)
+
+    def _allocate_state(self, key: str, state: State) -> State:
+        """Allocate storage of a `State` column shaped like `state`."""
+        if self.dedup_context and ReferenceWindowColumn.supports(state):
+            return ReferenceWindowColumn(state, self.max_size)
+        return state.batch(self.max_size)
+
+    def _init_final_table(self, capacity: int) -> None:
+        self.final_capacity = capacity
+        self.final_owner = np.full(capacity, -1, dtype=np.int64)
+        self.final_ptr = 0
+        self.final_buf = {
+            next_key: zeros_like_column(self.buf[key], capacity)
+            for next_key, key in self.next_keys.items()
+        }
 
     def __len__(self):
         return self.size
@@ -71,6 +498,10 @@ class ReplayBuffer:
     def __get_RAM__(self):
         return int(sys.getsizeof(self.buf)) * self.size / (self.max_size * 1000000)
 
+    def pop_profile(self) -> tuple:
+        """Profile of the stages timed in the process of this remote buffer, see `Profiler.pop_profile`."""
+        return get_profiler().pop_profile()
+
     def store(
         self,
         obs: np.ndarray,
@@ -82,6 +513,11 @@ class ReplayBuffer:
         next_info: dict,
         logp: np.ndarray,
     ) -> None:
+        if self.compact or self.dedup_context or self.codecs:
+            self.store_batch(self.experiences_to_batch(
+                [(obs, act, rew, done, info, next_obs, next_info, logp)]
+            ))
+            return
         self.buf["obs"][self.ptr] = obs
         self.buf["obs2"][self.ptr] = next_obs
         self.buf["act"][self.ptr] = act
@@ -94,15 +530,258 @@ class ReplayBuffer:
         self.ptr = (self.ptr + 1) % self.max_size
         self.size = min(self.size + 1, self.max_size)
 
-    def add_batch(self, samples: list) -> None:
-        list(map(lambda sample: self.store(*sample), samples))
+    @profile("buffer.add_batch")
+    def add_batch(self, samples: Union[list, dict]) -> None:
+        """Add samples to buffer.
 
-    def sample_batch(self, batch_size: int) -> dict:
-        idxes = np.random.randint(0, self.size, size=batch_size)
+        Args:
+            samples: either a columnar batch, i.e. a dict with keys obs, obs2, act, rew,
+                done, logp and each additional info key k and next_k, whose values are
+                stacked along the first dimension, or a list of `Experience`.
+        """
+        if not isinstance(samples, dict):
+            samples = self.experiences_to_batch(samples)
+        self.store_batch(samples)
+
+    def experiences_to_batch(self, samples: list) -> dict:
+        """Convert a list of `Experience` to a columnar batch."""
+        obs, act, rew, done, info, next_obs, next_info, logp = zip(*samples)
+        batch = {
+            "obs": np.stack(obs),
+            "obs2": np.stack(next_obs),
+            "act": np.stack(act),
+            "rew": np.asarray(rew),
+            "done": np.asarray(done),
+            "logp": np.asarray(logp),
+        }
+        for k in self.additional_info.keys():
+            batch[k] = stack_column([i[k] for i in info])
+            batch["next_" + k] = stack_column([i[k] for i in next_info])
+        return batch
+
+    def store_batch(self, batch: dict) -> None:
+        """Write a columnar batch with (at most two) contiguous slice assignments per column."""
+        n = len(batch["rew"])
+        if n == 0:
+            return
+        # only the newest max_size transitions can survive in the ring
+        skip = max(n - self.max_size, 0)
+        start = (self.ptr + skip) % self.max_size
+        n = n - skip
+        first = min(n, self.max_size - start)
+        if skip > 0:
+            batch = {k: v[skip:] for k, v in batch.items()}
+        if self.codecs:
+            batch = {k: self.codecs[k].encode(v) if k in self.codecs else v for k, v in batch.items()}
+        for k, v in self.buf.items():
+            value = batch[k]
+            v[start:start + first] = value[:first]
+            if first < n:
+                v[:n - first] = value[first:]
+        if self.compact:
+            self._store_final(batch, (start + np.arange(n)) % self.max_size)
+        self.ptr = (start + n) % self.max_size
+        self.size = min(self.size + n, self.max_size)
+
+    def _store_final(self, batch: dict, slots: np.ndarray) -> None:
+        """Mark boundary slots of a freshly written batch and keep their true next values."""
+        n = len(slots)
+        self.final_idx[slots] = -1
+        boundary = np.zeros(n, dtype=np.bool_)
+        boundary[-1] = True
+        for next_key, key in self.next_keys.items():
+            boundary[:-1] |= ~rows_equal(batch[next_key][:-1], batch[key][1:])
+        self.boundary[slots] = boundary
+
+        # the batch may continue the transition written just before it
+        prev = (slots[0] - 1) % self.max_size
+        if self.size > 0 and n < self.max_size and self.boundary[prev] and self.final_idx[prev] >= 0:
+            pos = self.final_idx[prev]
+            if all(
+                rows_equal(self.final_buf[next_key][pos:pos + 1], batch[key][:1])[0]
+                for next_key, key in self.next_keys.items()
+            ):
+                self.boundary[prev] = False
+                self.final_idx[prev] = -1
+
+        local = np.nonzero(boundary)[0]
+        positions = self._reserve_final(len(local))
+        for next_key in self.next_keys.keys():
+            self.final_buf[next_key][positions] = batch[next_key][local]
+        self.final_idx[slots[local]] = positions
+        self.final_owner[positions] = slots[local]
+
+    def _reserve_final(self, num: int) -> np.ndarray:
+        positions = (self.final_ptr + np.arange(num)) % self.final_capacity
+        if num > self.final_capacity or self._final_in_use(positions).any():
+            self._rebuild_final(num)
+            positions = self.final_ptr + np.arange(num)
+        self.final_ptr = (self.final_ptr + num) % self.final_capacity
+        return positions
+
+    def _final_in_use(self, positions: np.ndarray) -> np.ndarray:
+        owner = self.final_owner[positions]
+        return (owner >= 0) & (self.final_idx[owner] == positions)
+
+    def _rebuild_final(self, num: int) -> None:
+        """Compact the side table, growing it if it is more than half full."""
+        live = np.nonzero(self.final_idx >= 0)[0]
+        old_pos = self.final_idx[live]
+        old_buf = self.final_buf
+        needed = len(live) + num
+        capacity = self.final_capacity
+        if 2 * needed > capacity:
+            capacity = max(min(2 * needed, self.max_size), needed)
+        self._init_final_table(capacity)
+        for next_key, v in old_buf.items():
+            self.final_buf[next_key][:len(live)] = v[old_pos]
+        self.final_idx[live] = np.arange(len(live))
+        self.final_owner[:len(live)] = live
+        self.final_ptr = len(live)
+
+    def gather(self, idxes: np.ndarray) -> dict:
+        """Collect the transitions at buffer slots `idxes` as tensors."""
         batch = {}
         for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
-                batch[k] = torch.as_tensor(v[idxes], dtype=torch.float32)
-            else:
-                batch[k] = v[idxes].array2tensor()
+            batch[k] = self._to_tensor(k, v[idxes])
+        if self.compact:
+            next_idxes = (idxes + 1) % self.max_size
+            boundary = self.boundary[idxes]
+            positions = self.final_idx[idxes[boundary]]
+            for next_key, key in self.next_keys.items():
+                value = self.buf[key][next_idxes]
+                value[boundary] = self.final_buf[next_key][positions]
+                batch[next_key] = self._to_tensor(next_key, value)
         return batch
+
+    def _to_tensor(self, key: str, column):
+        if key in self.codecs:
+            return self.codecs[key].decode(column)
+        return column_to_tensor(column)
+
+    def bytes_per_transition(self) -> dict:
+        """Storage bytes per transition of each column, including compact storage side tables."""
+        report = {k: column_nbytes(v) / self.max_size for k, v in self.buf.items()}
+        if self.compact:
+            for next_key, v in self.final_buf.items():
+                report[next_key] = column_nbytes(v) / self.max_size
+            report["boundary"] = (
+                self.boundary.nbytes + self.final_idx.nbytes + self.final_owner.nbytes
+            ) / self.max_size
+        return report
+
+    @profile("buffer.sample_batch")
+    def sample_batch(self, batch_size: int) -> dict:
+        idxes = np.random.randint(0, self.size, size=batch_size)
+        return self.gather(idxes)
+
+    def _named_arrays(self) -> dict:
+        """Arrays holding the content of the buffer, keyed by file name."""
+        arrays = {}
+        for k, v in self.buf.items():
+            arrays.update(named_column_arrays(k, v))
+        if self.compact:
+            arrays["boundary"] = self.boundary
+            arrays["final_idx"] = self.final_idx
+            arrays["final_owner"] = self.final_owner
+            for next_key, v in self.final_buf.items():
+                arrays.update(named_column_arrays("final." + next_key, v))
+        return arrays
+
+    def _meta(self) -> dict:
+        meta = {"max_size": self.max_size, "ptr": self.ptr, "size": self.size}
+        for k in ("max_priority", "beta"):
+            if hasattr(self, k):
+                meta[k] = float(getattr(self, k))
+        if self.compact:
+            meta["final_ptr"] = int(self.final_ptr)
+        for k, v in self.buf.items():
+            if isinstance(v, ReferenceWindowColumn):
+                meta[k] = v.meta()
+        return meta
+
+    def _set_meta(self, meta: dict) -> None:
+        if meta["max_size"] != self.max_size:
+            raise ValueError(
+                "Saved buffer has max size {}, but buffer_max_size is {}".format(meta["max_size"], self.max_size)
+            )
+        for k, v in meta.items():
+            if k in self.buf:
+                self.buf[k].set_meta(v)
+            elif k != "max_size":
+                setattr(self, k, v)
+
+    def save(self, path: str, blocking: bool = True, chunk_size: int = 1 << 26) -> Optional[BufferSaveProcess]:
+        """
+        Save the buffer to directory `path`, one uncompressed .npy file per array
+        (columns, `State` fields, prioritized trees) plus meta.json, so that columns
+        can be memory-mapped with `np.load(..., mmap_mode="r")`. Files are written
+        in chunks of at most `chunk_size` bytes into a temporary directory, which
+        replaces `path` when complete.
+
+        If `blocking` is False and the platform supports fork, a snapshot of the
+        buffer is written by a forked process sharing memory copy-on-write, and a
+        `BufferSaveProcess` is returned, so that training is not blocked.
+        """
+        if self.save_process is not None:
+            self.save_process.wait()
+            self.save_process = None
+        if blocking or not hasattr(os, "fork"):
+            self._write_files(path, chunk_size)
+            return None
+        pid = os.fork()
+        if pid == 0:
+            exitcode = 1
+            try:
+                self._write_files(path, chunk_size)
+                exitcode = 0
+            finally:
+                os._exit(exitcode)
+        self.save_process = BufferSaveProcess(pid)
+        return self.save_process
+
+    def save_finished(self) -> bool:
+        """Whether the last non-blocking `save` is complete, raising if it failed."""
+        if self.save_process is None:
+            return True
+        if not self.save_process.done():
+            return False
+        self.save_process.wait()
+        self.save_process = None
+        return True
+
+    def _write_files(self, path: str, chunk_size: int) -> None:
+        path = os.path.normpath(path)
+        tmp_path, old_path = path + ".tmp", path + ".old"
+        for p in (tmp_path, old_path):
+            if os.path.isdir(p):
+                shutil.rmtree(p)
+        os.makedirs(tmp_path)
+        for name, array in self._named_arrays().items():
+            write_npy(os.path.join(tmp_path, name + ".npy"), array, chunk_size)
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump(self._meta(), f)
+        if os.path.isdir(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+
+    def load(self, path: str, chunk_size: int = 1 << 26) -> None:
+        """Restore the content of the buffer saved by `save` to directory `path`."""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {
+            filename[:-4]: np.load(os.path.join(path, filename), mmap_mode="r")
+            for filename in os.listdir(path) if filename.endswith(".npy")
+        }
+        if self.compact and arrays["final_owner"].shape[0] != self.final_capacity:
+            self._init_final_table(arrays["final_owner"].shape[0])
+        for k, v in self.buf.items():
+            if isinstance(v, ReferenceWindowColumn):
+                v.prepare_load({name[len(k) + 1:]: a for name, a in arrays.items() if name.startswith(k + ".")})
+        for name, target in self._named_arrays().items():
+            if name not in arrays:
+                raise ValueError("{} is missing in saved buffer {}".format(name, path))
+            copy_chunks(arrays[name], target, chunk_size)
+        self._set_meta(meta)
@@ -0,0 +1,100 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer sampling observation sequences for recurrent policies
+
+
+import numpy as np
+import torch
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, rows_equal
+
+__all__ = ["SequenceReplayBuffer"]
+
+
+class SequenceReplayBuffer(ReplayBuffer):
+    """
+    Implementation of replay buffer with uniform sampling probability, which stores
+    single-step observations and samples windows of the last `seq_len` observations,
+    the input of RNN approximate functions with obs_dim (seq_len, obsv_dim).
+
+    A slot starts a new segment if the previous transition is done, or if its
+    observation is not the next observation of the previously stored transition
+    (episode reset, truncation, or transitions of another environment or sampler).
+    Window indices of a batch are built at once from the sampled slots, and steps
+    before the start of the segment, or older than the oldest stored transition,
+    repeat the first valid observation, as `ObservationWindow` does while sampling.
+    Sampled batches contain obs and obs2 of shape (B, seq_len, obsv_dim), and a
+    float mask of shape (B, seq_len) whose zeros mark repeated steps.
+
+    Transitions of a vector environment are stored grouped by environment, so a
+    window does not reach beyond the part of a sampled batch its environment wrote.
+
+    Args:
+        seq_len (int): Length of sampled observation windows.
+    """
+
+    def __init__(self, index=0, **kwargs):
+        super().__init__(index, **kwargs)
+        self.seq_len = kwargs["seq_len"]
+        self.seq_start = self._allocate("seq_start", (self.max_size,), np.bool_, fill=True)
+        self.last_obs2 = None
+        self.last_done = True
+
+    def store(self, *experience) -> None:
+        self.store_batch(self.experiences_to_batch([experience]))
+
+    def store_batch(self, batch: dict) -> None:
+        n = len(batch["rew"])
+        if n == 0:
+            return
+        done = np.asarray(batch["done"]).astype(np.bool_)
+        start = np.empty(n, dtype=np.bool_)
+        start[0] = self.last_done or not np.array_equal(self.last_obs2, batch["obs"][0])
+        start[1:] = done[:-1] | ~rows_equal(np.asarray(batch["obs2"][:-1]), np.asarray(batch["obs"][1:]))
+        self.last_obs2 = np.array(batch["obs2"][-1])
+        self.last_done = bool(done[-1])
+
+        m = min(n, self.max_size)
+        slots = (self.ptr + n - m + np.arange(m)) % self.max_size
+        super().store_batch(batch)
+        self.seq_start[slots] = start[n - m:]
+
+    def window_indices(self, idxes: np.ndarray):
+        """Slots of the observation windows ending at `idxes`, and their mask."""
+        offsets = np.arange(self.seq_len) - (self.seq_len - 1)
+        windows = (idxes[:, None] + offsets) % self.max_size
+        # position of each slot counted from the oldest stored transition
+        oldest = self.ptr if self.size == self.max_size else 0
+        position = (idxes - oldest) % self.max_size
+        valid = -offsets <= position[:, None]
+        # a step is cut off by a segment start at any later step of the window
+        later_start = np.zeros_like(valid)
+        later_start[:, :-1] = self.seq_start[windows[:, 1:]]
+        valid &= ~np.logical_or.accumulate(later_start[:, ::-1], axis=1)[:, ::-1]
+        first = np.argmax(valid, axis=1)
+        windows = np.where(valid, windows, windows[np.arange(len(idxes)), first][:, None])
+        return windows, valid
+
+    def gather(self, idxes: np.ndarray) -> dict:
+        batch = super().gather(idxes)
+        windows, valid = self.window_indices(idxes)
+        obs = self._to_tensor("obs", self.buf["obs"][windows])
+        batch["obs"] = obs
+        batch["obs2"] = torch.cat((obs[:, 1:], batch["obs2"].unsqueeze(1)), dim=1)
+        batch["mask"] = torch.from_numpy(valid.astype(np.float32))
+        return batch
+
+    def bytes_per_transition(self) -> dict:
+        report = super().bytes_per_transition()
+        report["seq_start"] = self.seq_start.nbytes / self.max_size
+        return report
+
+    def _named_arrays(self) -> dict:
+        arrays = super()._named_arrays()
+        arrays["seq_start"] = self.seq_start
+        return arrays
@@ -0,0 +1,251 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer shared by the processes of a single node
+
+
+from contextlib import contextmanager
+from dataclasses import fields, is_dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple
+import os
+import tempfile
+import time
+import uuid
+import weakref
+
+import numpy as np
+from gops.env.env_gen_ocp.pyth_base import State
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, combined_shape
+
+__all__ = ["SharedMemoryReplayBuffer"]
+
+
+class SharedColumn(NamedTuple):
+    """Placeholder of a shared memory column in a pickled buffer."""
+    key: str
+
+
+class SharedMemoryReplayBuffer(ReplayBuffer):
+    """
+    Implementation of replay buffer with uniform sampling probability,
+    whose columns live in `multiprocessing.shared_memory` blocks of a single node.
+
+    Pickling the buffer (e.g. passing it to a Ray actor) only transfers block names,
+    the receiving process attaches the same memory. Writers reserve rows by advancing
+    a shared write cursor under a file lock and copy their batch without holding it,
+    so samplers append directly and learners sample directly from any process.
+    Rows become visible to sampling in reservation order: a writer commits only after
+    all earlier reservations are committed, so unwritten rows are never sampled. A writer
+    dying between reserving and committing blocks later commits, which raise after
+    `buffer_commit_timeout` seconds.
+    Rows being overwritten may be sampled while the copy is in flight, and a non-blocking
+    `save` may include rows written during the save, since shared memory is not copied on write.
+    The process creating the buffer owns the blocks and unlinks them on `close`
+    or at exit.
+
+    Args:
+        buffer_shm_name (str, optional): Prefix of shared memory block names.
+                                         Defaults to a random name.
+        buffer_commit_timeout (float, optional): Seconds a writer waits for earlier reservations
+                                                 to be committed, None to wait forever.
+                                                 Defaults to 60.
+    """
+
+    process_shared = True
+
+    def __init__(self, index=0, **kwargs):
+        if kwargs.get("buffer_compact_obs", False) or kwargs.get("buffer_dedup_context", False):
+            raise ValueError("Compact or deduplicated storage is not supported by shared memory buffers")
+        self.shm_name = kwargs.get("buffer_shm_name", None)
+        if self.shm_name is None:
+            self.shm_name = "gops_{}".format(uuid.uuid4().hex[:12])
+        self.shm_name = "{}_{}".format(self.shm_name, index)
+        self.commit_timeout = kwargs.get("buffer_commit_timeout", 60.0)
+        self.owner = True
+        self.blocks = {}
+        self.block_specs = {}
+        self.arrays = {}
+        self.array_keys = {}
+        # write cursor: [reserved rows, committed rows] since creation, the committed rows
+        # being a prefix of the reserved ones
+        self.cursor = self._allocate("cursor", (2,), np.int64)
+        self.lock_path = os.path.join(tempfile.gettempdir(), self.shm_name + ".lock")
+        self.lock_file = open(self.lock_path, "a")
+        super().__init__(index, **kwargs)
+        self.tracker_pid = resource_tracker._resource_tracker._pid
+        weakref.finalize(self, SharedMemoryReplayBuffer._release, self.blocks, self.lock_file, self.lock_path)
+
+    @property
+    def ptr(self) -> int:
+        return int(self.cursor[0]) % self.max_size
+
+    @ptr.setter
+    def ptr(self, value: int) -> None:
+        self.cursor[0] = value
+
+    @property
+    def size(self) -> int:
+        return min(int(self.cursor[1]), self.max_size)
+
+    @size.setter
+    def size(self, value: int) -> None:
+        self.cursor[1] = value
+
+    def _allocate(self, key: str, shape: tuple, dtype, fill: float = 0) -> np.ndarray:
+        name = "{}_{}".format(self.shm_name, len(self.blocks))
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        block = shared_memory.SharedMemory(name=name, create=True, size=max(nbytes, 1))
+        self.blocks[key] = block
+        self.block_specs[key] = (name, tuple(shape), np.dtype(dtype).str)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array[...] = fill
+        self.arrays[key] = array
+        self.array_keys[id(array)] = key
+        return array
+
+    def _allocate_state(self, key: str, state: State) -> State:
+        robot_state = self._allocate(
+            key + ".robot_state",
+            combined_shape(self.max_size, state.robot_state.shape),
+            state.robot_state.dtype,
+        )
+        context_values = []
+        for field in fields(state.context_state):
+            v = getattr(state.context_state, field.name)
+            if isinstance(v, np.ndarray):
+                context_values.append(self._allocate(
+                    key + ".context_state." + field.name,
+                    combined_shape(self.max_size, v.shape),
+                    v.dtype,
+                ))
+            else:
+                context_values.append(v)
+        return State(robot_state, state.context_state.__class__(*context_values))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for k in ("blocks", "arrays", "array_keys", "cursor", "lock_file"):
+            del state[k]
+        state["buf"] = {k: self._detach(v) for k, v in self.buf.items()}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.owner = False
+        self.blocks, self.arrays = {}, {}
+        # only the owner may unlink the blocks, so attached blocks are removed from the resource
+        # tracker of this process, unless it is the one of the owner, see https://bugs.python.org/issue39959
+        tracker = resource_tracker._resource_tracker
+        private_tracker = tracker._fd is None or tracker._pid not in (None, self.tracker_pid)
+        for key, (name, shape, dtype) in self.block_specs.items():
+            block = shared_memory.SharedMemory(name=name)
+            if private_tracker:
+                resource_tracker.unregister(block._name, "shared_memory")
+            self.blocks[key] = block
+            self.arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        self.array_keys = {id(v): k for k, v in self.arrays.items()}
+        self.cursor = self.arrays["cursor"]
+        self.buf = {k: self._attach(v) for k, v in self.buf.items()}
+        self.lock_file = open(self.lock_path, "a")
+
+    def _detach(self, value):
+        if isinstance(value, np.ndarray):
+            return SharedColumn(self.array_keys[id(value)])
+        elif is_dataclass(value):
+            return value.__class__(*[self._detach(getattr(value, f.name)) for f in fields(value)])
+        return value
+
+    def _attach(self, value):
+        if isinstance(value, SharedColumn):
+            return self.arrays[value.key]
+        elif is_dataclass(value):
+            return value.__class__(*[self._attach(getattr(value, f.name)) for f in fields(value)])
+        return value
+
+    @contextmanager
+    def _locked(self):
+        import fcntl
+
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def store(self, *experience) -> None:
+        self.store_batch(self.experiences_to_batch([experience]))
+
+    def store_batch(self, batch: dict) -> None:
+        n = len(batch["rew"])
+        if n == 0:
+            return
+        # only the newest max_size transitions can survive in the ring
+        skip = max(n - self.max_size, 0)
+        with self._locked():
+            reserved = int(self.cursor[0])
+            self.cursor[0] = reserved + n
+        start = (reserved + skip) % self.max_size
+        n = n - skip
+        first = min(n, self.max_size - start)
+        if skip > 0:
+            batch = {k: v[skip:] for k, v in batch.items()}
+        if self.codecs:
+            batch = {k: self.codecs[k].encode(v) if k in self.codecs else v for k, v in batch.items()}
+        for k, v in self.buf.items():
+            value = batch[k]
+            v[start:start + first] = value[:first]
+            if first < n:
+                v[:n - first] = value[first:]
+        # commit after the earlier reservations, which may still be copied by other writers
+        deadline = None if self.commit_timeout is None else time.monotonic() + self.commit_timeout
+        while True:
+            with self._locked():
+                committed = int(self.cursor[1])
+                if committed == reserved:
+                    self.cursor[1] = reserved + n + skip
+                    return
+            if deadline is not None and time.monotonic() > deadline:
+                raise RuntimeError(
+                    "Rows [{}, {}) of shared memory buffer {} were not committed within {} s, "
+                    "their writer may have died".format(committed, reserved, self.shm_name, self.commit_timeout)
+                )
+            time.sleep(1e-4)
+
+    def _set_meta(self, meta: dict) -> None:
+        super()._set_meta(meta)
+        # rows since creation, whose ring position and capped count are those of the saved buffer
+        rows = meta["size"] + meta["ptr"] if meta["size"] == self.max_size else meta["size"]
+        self.cursor[:] = rows
+
+    def close(self) -> None:
+        """Detach from the shared memory, and unlink it if this process created the buffer."""
+        self.buf, self.arrays, self.array_keys = {}, {}, {}
+        self.cursor = np.array([0, 0], dtype=np.int64)
+        if self.owner:
+            SharedMemoryReplayBuffer._release(self.blocks, self.lock_file, self.lock_path)
+        else:
+            for block in self.blocks.values():
+                block.close()
+            self.lock_file.close()
+        self.blocks = {}
+
+    @staticmethod
+    def _release(blocks: dict, lock_file, lock_path: str) -> None:
+        for block in blocks.values():
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                block.close()
+            except BufferError:
+                pass
+        lock_file.close()
+        if os.path.exists(lock_path):
+            os.remove(lock_path)
@@ -13,10 +13,13 @@ import torch
 from gops.create_pkg.create_env import create_env
 from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.utils.common_utils import set_seed
+from gops.utils.observation_window import ObservationWindow
+from gops.utils.profiler import configure_profiler, get_profiler, profile
 
 
 class Evaluator:
     def __init__(self, index=0, **kwargs):
+        configure_profiler(**kwargs)
         kwargs.update({
             "reward_scale": None,
             "repeat_num": None,
@@ -35,6 +38,7 @@ class Evaluator:
         self.policy_func_name = kwargs["policy_func_name"]
         self.save_folder = kwargs["save_folder"]
         self.eval_save = kwargs.get("eval_save", True)
+        self.seq_len = kwargs.get("seq_len", None)
 
         self.print_time = 0
         self.print_iteration = -1
@@ -42,6 +46,10 @@ class Evaluator:
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
+    def pop_profile(self) -> tuple:
+        """Profile of the stages timed in the process of this remote evaluator, see `Profiler.pop_profile`."""
+        return get_profiler().pop_profile()
+
     def run_an_episode(self, iteration, render=True):
         if self.print_iteration != iteration:
             self.print_iteration = iteration
@@ -54,8 +62,12 @@ class Evaluator:
         obs, info = self.env.reset()
         done = 0
         info["TimeLimit.truncated"] = False
+        if self.seq_len is not None:
+            obs_window = ObservationWindow(self.seq_len, np.expand_dims(obs, axis=0))
         while not (done or info["TimeLimit.truncated"]):
             batch_obs = torch.from_numpy(np.expand_dims(obs, axis=0).astype("float32"))
+            if self.seq_len is not None:
+                batch_obs = torch.from_numpy(obs_window.get())
             logits = self.networks.policy(batch_obs)
             action_distribution = self.networks.create_action_distributions(logits)
             action = action_distribution.mode()
@@ -65,6 +77,8 @@ class Evaluator:
             action_list.append(action)
             obs = next_obs
             info = next_info
+            if self.seq_len is not None:
+                obs_window.push(np.expand_dims(obs, axis=0), np.array([False]))
             if "TimeLimit.truncated" not in info.keys():
                 info["TimeLimit.truncated"] = False
             # Draw environment animation
@@ -91,5 +105,6 @@ class Evaluator:
             episode_return_list.append(self.run_an_episode(iteration, self.render))
         return np.mean(episode_return_list)
 
+    @profile("evaluator.run_evaluation")
     def run_evaluation(self, iteration):
         return self.run_n_episodes(self.num_eval_episode, iteration)
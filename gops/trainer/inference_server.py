@@ -0,0 +1,120 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Central policy actor batching the action requests of samplers
+
+__all__ = ["InferenceServer"]
+
+import asyncio
+import time
+from collections import deque
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from gops.create_pkg.create_alg import create_approx_contrainer
+from gops.utils.tensorboard_setup import tb_tags
+
+
+class InferenceServer:
+    """
+    Policy actor shared by the samplers of a parallel trainer, so that the networks
+    live in one place and are updated once per weight sync. Samplers send their
+    observations to `act`, requests arriving within `inference_batch_timeout` are
+    concatenated into one batch, up to `inference_max_batch_size` rows, and served
+    by a single policy forward. Actions are sampled from the action distribution,
+    exploration noise and clipping are left to the samplers.
+
+    `act` is a coroutine, the server must be created as an async Ray actor, so that
+    requests of different samplers are awaited concurrently.
+
+    Args:
+        inference_max_batch_size (int, optional): Number of observation rows that
+            triggers a forward without waiting. Defaults to 4096.
+        inference_batch_timeout (float, optional): Time in ms the first request of
+            a batch waits for other requests. Defaults to 2.
+    """
+
+    def __init__(self, **kwargs):
+        self.networks = create_approx_contrainer(**kwargs)
+        self.max_batch_size = kwargs.get("inference_max_batch_size", 4096)
+        self.batch_timeout = kwargs.get("inference_batch_timeout", 2.0) / 1000
+        # pending requests: (observations, future of the result, arrival time)
+        self.requests = []
+        self.pending_rows = 0
+        self.flush_handle = None
+        self.latencies = deque(maxlen=10000)
+        self.served_rows = 0
+        self.forward_num = 0
+        self.stats_time = time.perf_counter()
+
+    def load_state_dict(self, state_dict) -> None:
+        self.networks.load_state_dict(state_dict)
+
+    async def act(self, obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample actions and their log probabilities for a batch of observations."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests.append((obs, future, time.perf_counter()))
+        self.pending_rows += len(obs)
+        if self.pending_rows >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_timeout, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        requests, self.requests, self.pending_rows = self.requests, [], 0
+        if not requests:
+            return
+        try:
+            batch_obs = torch.from_numpy(np.concatenate([r[0] for r in requests]).astype("float32"))
+            with torch.no_grad():
+                logits = self.networks.policy(batch_obs)
+                action_distribution = self.networks.create_action_distributions(logits)
+                action, logp = action_distribution.sample()
+            action, logp = action.numpy(), logp.numpy()
+        except Exception as e:
+            # _flush may run as a loop callback, whose errors would only be logged, so the
+            # error is raised by every request of the batch instead of leaving them pending
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        end = time.perf_counter()
+        start = 0
+        for obs, future, arrival in requests:
+            stop = start + len(obs)
+            if not future.done():
+                future.set_result((action[start:stop], logp[start:stop]))
+            self.latencies.append(end - arrival)
+            start = stop
+        self.served_rows += start
+        self.forward_num += 1
+
+    def stats(self) -> dict:
+        """Action latency percentiles and throughput since the last call, as tensorboard scalars."""
+        now = time.perf_counter()
+        tb_info = {}
+        if self.latencies:
+            p50, p90, p99 = np.percentile(np.array(self.latencies) * 1000, [50, 90, 99])
+            tb_info[tb_tags["inference_latency_p50"]] = p50
+            tb_info[tb_tags["inference_latency_p90"]] = p90
+            tb_info[tb_tags["inference_latency_p99"]] = p99
+            tb_info[tb_tags["inference_batch_size"]] = self.served_rows / self.forward_num
+        tb_info[tb_tags["inference_throughput"]] = self.served_rows / (now - self.stats_time)
+        self.latencies.clear()
+        self.served_rows = 0
+        self.forward_num = 0
+        self.stats_time = now
+        return tb_info
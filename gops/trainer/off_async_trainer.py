@@ -13,6 +13,7 @@
 __all__ = ["OffAsyncTrainer"]
 
 from cmath import inf
+import functools
 import importlib
 import os
 import random
@@ -23,8 +24,21 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.trainer.inference_server import InferenceServer
+from gops.trainer.parameter_store import ParameterStore
+from gops.trainer.rate_limiter import RateLimiter
+from gops.utils.checkpoint import (
+    CheckpointWriter,
+    checkpoint_dir,
+    get_rng_state,
+    load_checkpoint,
+    set_rng_state,
+    snapshot,
+    wait_remote_buffer_save,
+)
 from gops.utils.common_utils import random_choice_with_index
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.profiler import configure_profiler
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 from gops.utils.log_data import LogData
 from gops.utils.gops_path import camel2underline
@@ -37,7 +51,9 @@ class OffAsyncTrainer:
         self.algs = alg
         self.samplers = sampler
         self.buffers = buffer
-        self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.per_flag = kwargs["buffer_name"].endswith("prioritized_replay_buffer")
+        # samplers write into and the trainer samples from process-shared buffers directly
+        self.shared_buffer = getattr(self.buffers[0], "process_shared", False)
         if self.per_flag and kwargs["num_buffers"] > 1:
             raise RuntimeError(
                 "Using multiple prioritized_replay_buffers is not supported!"
@@ -61,6 +77,20 @@ class OffAsyncTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # or resume the full training state from a checkpoint of `save_checkpoint`
+        checkpoint, checkpoint_path = None, None
+        if kwargs.get("resume_from", None) is not None:
+            checkpoint, checkpoint_path = load_checkpoint(kwargs["resume_from"], type(self).__name__)
+            self.networks.load_checkpoint_state(checkpoint["alg"])
+            if len(checkpoint["samplers"]) != len(self.samplers):
+                warnings.warn("Checkpoint has {} samplers, states of the first {} are restored".format(
+                    len(checkpoint["samplers"]), len(self.samplers)
+                ))
+            ray.get([
+                sampler.load_checkpoint_state.remote(state)
+                for sampler, state in zip(self.samplers, checkpoint["samplers"])
+            ])
+
         self.replay_batch_size = kwargs["replay_batch_size"]
         self.max_iteration = kwargs["max_iteration"]
         self.sample_interval = kwargs.get("sample_interval", 1)
@@ -71,6 +101,9 @@ class OffAsyncTrainer:
         self.save_folder = kwargs["save_folder"]
         self.iteration = 0
 
+        # optionally, time the stages of each iteration
+        self.profiler = configure_profiler(**kwargs)
+
         self.writer = SummaryWriter(log_dir=self.save_folder, flush_secs=20)
         # flush tensorboard at the beginning
         add_scalars(
@@ -78,28 +111,54 @@ class OffAsyncTrainer:
         )
         self.writer.flush()
 
+        # weights are sent to samplers, learners and evaluator only when they lag behind
+        self.parameter_store = ParameterStore(self.networks, kwargs.get("weight_staleness", 0))
+
+        # samplers may request actions from one central policy actor instead of their own networks
+        self.inference_server = None
+        if kwargs.get("inference_server", False):
+            self.inference_server = ray.remote(num_cpus=1)(InferenceServer).remote(**kwargs)
+
         # create sample tasks and pre sampling
         self.sample_tasks = TaskPool()
+        self.rate_limiter = None
         self._set_samplers()
         self.sampler_tb_dict = LogData()
 
-        self.warm_size = kwargs["buffer_warm_size"]
+        # restore replay buffers, or pre sampling
+        self.buffer_load_dir = checkpoint_path or kwargs.get("buffer_load_dir", None)
+        self.buffer_save_interval = kwargs.get("buffer_save_interval", None)
+        if self.buffer_load_dir is not None:
+            self._load_buffers(self.buffer_load_dir)
+        self.warm_size = 0 if self.buffer_load_dir is not None else kwargs["buffer_warm_size"]
         while not all(
             [
                 l >= self.warm_size
-                for l in ray.get([rb.__len__.remote() for rb in self.buffers])
+                for l in self._buffer_sizes()
             ]
         ):
             for sampler, objID in list(self.sample_tasks.completed()):
-                batch_data, _ = ray.get(objID)
-                random.choice(self.buffers).add_batch.remote(batch_data)
-                self.sample_tasks.add(sampler, sampler.sample.remote())
+                self._collect_samples(objID)
+                self.sample_tasks.add(sampler, self._sample_remote(sampler))
 
         self.use_gpu = kwargs["use_gpu"]
         if self.use_gpu:
             for alg in self.algs:
                 alg.to.remote("cuda")
 
+        # optionally, samplers and learners wait while they are ahead of the target update ratio
+        if kwargs.get("update_sample_ratio", None) is not None:
+            self.rate_limiter = RateLimiter(
+                kwargs["update_sample_ratio"],
+                kwargs["sample_batch_size"],
+                kwargs.get("update_sample_ratio_tolerance", None),
+                sampler_num=len(self.samplers),
+                learner_num=len(self.algs),
+            )
+        # workers waiting for the rate limiter, with the time they started waiting
+        self.idle_samplers = []
+        self.idle_algs = []
+
         # create alg tasks and start computing gradient
         self.learn_tasks = TaskPool()
         self._set_algs()
@@ -108,82 +167,139 @@ class OffAsyncTrainer:
         self.evluate_tasks = TaskPool()
         self.last_eval_iteration = 0
 
+        # optionally, save checkpoints of the full training state in the background
+        self.checkpoint_interval = kwargs.get("checkpoint_interval", None)
+        self.checkpoint_writer = CheckpointWriter(kwargs.get("checkpoint_max_to_keep", 2))
+        self.last_checkpoint_iteration = None
+        if checkpoint is not None:
+            self.iteration = checkpoint["iteration"]
+            self.best_tar = checkpoint["best_tar"]
+            self.last_eval_iteration = checkpoint["last_eval_iteration"]
+            self.last_checkpoint_iteration = self.iteration
+            set_rng_state(checkpoint["rng_state"])
+
         self.start_time = time.time()
 
     def _set_samplers(self):
-        weights = self.networks.state_dict()
-        for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
-            self.sample_tasks.add(sampler, sampler.sample.remote())
+        if self.inference_server is not None:
+            self.parameter_store.sync(self.inference_server)
+        for i, sampler in enumerate(self.samplers):
+            if self.inference_server is not None:
+                sampler.set_inference_server.remote(self.inference_server)
+            else:
+                self.parameter_store.sync(sampler)
+            if self.shared_buffer:
+                sampler.set_buffer.remote(self.buffers[i % len(self.buffers)])
+            self.sample_tasks.add(sampler, self._sample_remote(sampler))
 
     def _set_algs(self):
-        weights = self.networks.state_dict()
         for alg in self.algs:
             alg.train.remote()
-            alg.load_state_dict.remote(weights)
-            buffer, _ = random_choice_with_index(self.buffers)
-            data = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
-            if self.use_gpu:
+            self._add_learn_task(alg)
+
+    def _add_sample_task(self, sampler):
+        if self.rate_limiter is not None:
+            if not self.rate_limiter.can_insert():
+                self.idle_samplers.append((sampler, time.perf_counter()))
+                return
+            self.rate_limiter.insert()
+        if self.inference_server is None:
+            self.parameter_store.sync(sampler)
+        self.sample_tasks.add(sampler, self._sample_remote(sampler))
+
+    def _add_learn_task(self, alg):
+        if self.rate_limiter is not None:
+            if not self.rate_limiter.can_update():
+                self.idle_algs.append((alg, time.perf_counter()))
+                return
+            self.rate_limiter.update()
+        buffer, _ = random_choice_with_index(self.buffers)
+        data = self._sample_replay(buffer)
+        if self.use_gpu:
+            with self.profiler.span("host_to_device"):
                 for k, v in data.items():
                     data[k] = v.cuda()
-            self.learn_tasks.add(
-                alg, alg.get_remote_update_info.remote(data, self.iteration)
-            )
+        self.parameter_store.sync(alg)
+        self.learn_tasks.add(
+            alg, alg.get_remote_update_info.remote(data, self.iteration)
+        )
+
+    def _resume_idle_workers(self):
+        now = time.perf_counter()
+        while self.idle_samplers and self.rate_limiter.can_insert():
+            sampler, idle_time = self.idle_samplers.pop(0)
+            self.rate_limiter.add_blocked_time("sampler", now - idle_time)
+            self._add_sample_task(sampler)
+        while self.idle_algs and self.rate_limiter.can_update():
+            alg, idle_time = self.idle_algs.pop(0)
+            self.rate_limiter.add_blocked_time("learner", now - idle_time)
+            self._add_learn_task(alg)
 
     def step(self):
+        if self.rate_limiter is not None:
+            self._resume_idle_workers()
+
         # sampling
-        if self.iteration % self.sample_interval == 0:
+        if self.rate_limiter is not None or self.iteration % self.sample_interval == 0:
             if self.sample_tasks.completed_num > 0:
-                weights = ray.put(self.networks.state_dict())
+                if self.inference_server is not None:
+                    self.parameter_store.sync(self.inference_server)
                 for sampler, objID in self.sample_tasks.completed():
-                    batch_data, sampler_tb_dict = ray.get(objID)
-                    random.choice(self.buffers).add_batch.remote(batch_data)
-                    sampler.load_state_dict.remote(weights)
-                    self.sample_tasks.add(sampler, sampler.sample.remote())
+                    sampler_tb_dict = self._collect_samples(objID)
+                    self._add_sample_task(sampler)
                     self.sampler_tb_dict.add_average(sampler_tb_dict)
 
         # learning
         for alg, objID in self.learn_tasks.completed():
-            if self.per_flag:
-                extra_info, update_info = ray.get(objID)
-                alg_tb_dict, idx, new_priority = extra_info
-                self.buffers[0].update_batch.remote(idx, new_priority)
-            else:
-                alg_tb_dict, update_info = ray.get(objID)
+            with self.profiler.span("learner_get"):
+                if self.per_flag:
+                    extra_info, update_info = ray.get(objID)
+                    alg_tb_dict, idx, new_priority = extra_info
+                    self.buffers[0].update_batch.remote(idx, new_priority)
+                else:
+                    alg_tb_dict, update_info = ray.get(objID)
 
             # replay
-            data = ray.get(
-                random.choice(self.buffers).sample_batch.remote(self.replay_batch_size)
-            )
-            if self.use_gpu:
-                for k, v in data.items():
-                    data[k] = v.cuda()
-
-            weights = ray.put(self.networks.state_dict())
-            alg.load_state_dict.remote(weights)
-            self.learn_tasks.add(
-                alg, alg.get_remote_update_info.remote(data, self.iteration)
-            )
+            self._add_learn_task(alg)
             if self.use_gpu:
                 for k, v in update_info.items():
                     if isinstance(v, list):
                         for i in range(len(v)):
                             update_info[k][i] = v[i].cpu()
-            self.networks.remote_update(update_info)
+            with self.profiler.span("remote_update"):
+                self.networks.remote_update(update_info)
+            self.parameter_store.update()
 
             self.iteration += 1
 
             # log
             if self.iteration % self.log_save_interval == 0:
-                print("Iter = ", self.iteration)
-                add_scalars(alg_tb_dict, self.writer, step=self.iteration)
-                add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+                with self.profiler.span("log"):
+                    print("Iter = ", self.iteration)
+                    add_scalars(alg_tb_dict, self.writer, step=self.iteration)
+                    add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+                    add_scalars(self.parameter_store.stats(), self.writer, step=self.iteration)
+                    if self.inference_server is not None:
+                        add_scalars(ray.get(self.inference_server.stats.remote()), self.writer, step=self.iteration)
+                    if self.rate_limiter is not None:
+                        add_scalars(self.rate_limiter.stats(), self.writer, step=self.iteration)
+                    self.profiler.add_to_writer(self.writer, self.iteration)
+                    self.profiler.add_remote_to_writer(self.writer, self.iteration, self._remote_profile_actors())
 
             # save networks
-            if self.iteration % self.apprfunc_save_interval == 0:
-                self.save_apprfunc()
+            with self.profiler.span("save"):
+                if self.iteration % self.apprfunc_save_interval == 0:
+                    self.save_apprfunc()
+                if self.buffer_save_interval is not None and self.iteration % self.buffer_save_interval == 0:
+                    self.save_buffers(blocking=False)
+                if self.checkpoint_interval is not None and self.iteration % self.checkpoint_interval == 0:
+                    self.save_checkpoint()
 
         # evaluate
+        with self.profiler.span("evaluate"):
+            self._evaluate()
+
+    def _evaluate(self):
         if self.iteration - self.last_eval_iteration >= self.eval_interval:
             if self.evluate_tasks.count == 0:
                 # There is no evaluation task, add one.
@@ -213,11 +329,7 @@ class OffAsyncTrainer:
 
                 self.writer.add_scalar(
                     tb_tags["Buffer RAM of RL iteration"],
-                    sum(
-                        ray.get(
-                            [buffer.__get_RAM__.remote() for buffer in self.buffers]
-                        )
-                    ),
+                    self._buffer_ram(),
                     self.iteration,
                 )
                 self.writer.add_scalar(
@@ -248,10 +360,107 @@ class OffAsyncTrainer:
 
     def train(self):
         while self.iteration < self.max_iteration:
-            self.step()
+            with self.profiler.iteration():
+                self.step()
 
+        if self.checkpoint_interval is not None:
+            if self.last_checkpoint_iteration != self.iteration:
+                self.save_checkpoint()
+            self.checkpoint_writer.wait()
         self.save_apprfunc()
+        if self.buffer_save_interval is not None:
+            self.save_buffers()
+        if self.shared_buffer:
+            for buffer in self.buffers:
+                buffer.close()
         self.writer.flush()
+        self.profiler.save_trace()
+
+    def _sample_remote(self, sampler):
+        if self.shared_buffer:
+            return sampler.sample_to_buffer.remote()
+        return sampler.sample.remote()
+
+    def _collect_samples(self, objID) -> dict:
+        with self.profiler.span("collect_samples"):
+            if self.shared_buffer:
+                return ray.get(objID)
+            batch_data, sampler_tb_dict = ray.get(objID)
+            random.choice(self.buffers).add_batch.remote(batch_data)
+            return sampler_tb_dict
+
+    def _sample_replay(self, buffer) -> dict:
+        with self.profiler.span("replay"):
+            if self.shared_buffer:
+                return buffer.sample_batch(self.replay_batch_size)
+            return ray.get(buffer.sample_batch.remote(self.replay_batch_size))
+
+    def _buffer_sizes(self) -> list:
+        if self.shared_buffer:
+            return [len(buffer) for buffer in self.buffers]
+        return ray.get([buffer.__len__.remote() for buffer in self.buffers])
+
+    def _buffer_ram(self) -> float:
+        if self.shared_buffer:
+            return sum(buffer.__get_RAM__() for buffer in self.buffers)
+        return sum(ray.get([buffer.__get_RAM__.remote() for buffer in self.buffers]))
+
+    def _remote_profile_actors(self) -> dict:
+        actors = {"sampler_{}".format(i): sampler for i, sampler in enumerate(self.samplers)}
+        if not self.shared_buffer:
+            actors.update({"buffer_{}".format(i): buffer for i, buffer in enumerate(self.buffers)})
+        actors["evaluator"] = self.evaluator
+        return actors
+
+    def _load_buffers(self, load_dir: str) -> None:
+        paths = [os.path.join(load_dir, "buffer_{}".format(i)) for i in range(len(self.buffers))]
+        if self.shared_buffer:
+            for buffer, path in zip(self.buffers, paths):
+                buffer.load(path)
+        else:
+            ray.get([buffer.load.remote(path) for buffer, path in zip(self.buffers, paths)])
+
+    def save_buffers(self, blocking: bool = True) -> None:
+        paths = [
+            os.path.join(self.save_folder, "buffer_snapshot", "buffer_{}".format(i)) for i in range(len(self.buffers))
+        ]
+        if self.shared_buffer:
+            for buffer, path in zip(self.buffers, paths):
+                buffer.save(path, blocking=blocking)
+        else:
+            tasks = [buffer.save.remote(path, blocking=blocking) for buffer, path in zip(self.buffers, paths)]
+            if blocking:
+                ray.get(tasks)
+
+    def save_checkpoint(self, blocking: bool = False):
+        """
+        Save the full training state, i.e. central algorithm with optimizers, counters, random
+        streams, samplers and buffers, to be resumed with the `resume_from` argument. The state
+        is copied, and written in the background unless `blocking`, the buffers by forked processes.
+        Samples still collected by samplers are not in the saved buffers.
+        """
+        path = checkpoint_dir(self.save_folder, self.iteration)
+        paths = [os.path.join(path, "buffer_{}".format(i)) for i in range(len(self.buffers))]
+        if self.shared_buffer:
+            save_processes = [buffer.save(p, blocking=False) for buffer, p in zip(self.buffers, paths)]
+            wait_fns = [process.wait for process in save_processes if process is not None]
+        else:
+            for buffer, p in zip(self.buffers, paths):
+                buffer.save.remote(p, blocking=False)
+            wait_fns = [functools.partial(wait_remote_buffer_save, buffer) for buffer in self.buffers]
+        state = snapshot({
+            "trainer": type(self).__name__,
+            "iteration": self.iteration,
+            "best_tar": self.best_tar,
+            "last_eval_iteration": self.last_eval_iteration,
+            "alg": self.networks.checkpoint_state(),
+            "samplers": ray.get([sampler.checkpoint_state.remote() for sampler in self.samplers]),
+            "rng_state": get_rng_state(),
+        })
+        self.checkpoint_writer.write(path, state, wait_fns)
+        self.last_checkpoint_iteration = self.iteration
+        if blocking:
+            self.checkpoint_writer.wait()
 
     def save_apprfunc(self):
         torch.save(
@@ -260,7 +469,8 @@ class OffAsyncTrainer:
         )
 
     def _add_eval_task(self):
-        self.evaluator.load_state_dict.remote(self.networks.state_dict())
+        # evaluation results are logged at the current iteration, so the evaluator is always current
+        self.parameter_store.sync(self.evaluator, staleness=0)
         self.evluate_tasks.add(
             self.evaluator,
             self.evaluator.run_evaluation.remote(self.iteration)
@@ -21,8 +21,19 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.trainer.prefetcher import BufferPrefetcher
+from gops.trainer.rate_limiter import RateLimiter
+from gops.utils.checkpoint import (
+    CheckpointWriter,
+    checkpoint_dir,
+    get_rng_state,
+    load_checkpoint,
+    set_rng_state,
+    snapshot,
+)
 from gops.utils.common_utils import ModuleOnDevice
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.profiler import configure_profiler
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 from gops.utils.log_data import LogData
 
@@ -32,7 +43,7 @@ class OffSerialTrainer:
         self.alg = alg
         self.sampler = sampler
         self.buffer = buffer
-        self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.per_flag = kwargs["buffer_name"].endswith("prioritized_replay_buffer")
         self.evaluator = evaluator
 
         # create center network
@@ -43,6 +54,12 @@ class OffSerialTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # or resume the full training state from a checkpoint of `save_checkpoint`
+        checkpoint, checkpoint_path = None, None
+        if kwargs.get("resume_from", None) is not None:
+            checkpoint, checkpoint_path = load_checkpoint(kwargs["resume_from"], type(self).__name__)
+            self.sampler.load_checkpoint_state(checkpoint["samplers"][0])
+
         self.replay_batch_size = kwargs["replay_batch_size"]
         self.max_iteration = kwargs["max_iteration"]
         self.sample_interval = kwargs.get("sample_interval", 1)
@@ -53,6 +70,9 @@ class OffSerialTrainer:
         self.save_folder = kwargs["save_folder"]
         self.iteration = 0
 
+        # optionally, time the stages of each iteration
+        self.profiler = configure_profiler(**kwargs)
+
         self.writer = SummaryWriter(log_dir=self.save_folder, flush_secs=20)
         # flush tensorboard at the beginning
         add_scalars(
@@ -60,12 +80,25 @@ class OffSerialTrainer:
         )
         self.writer.flush()
 
-        # pre sampling
-        while self.buffer.size < kwargs["buffer_warm_size"]:
+        # restore replay buffer, or pre sampling
+        self.buffer_load_dir = checkpoint_path or kwargs.get("buffer_load_dir", None)
+        self.buffer_save_interval = kwargs.get("buffer_save_interval", None)
+        if self.buffer_load_dir is not None:
+            self.buffer.load(os.path.join(self.buffer_load_dir, "buffer_0"))
+        while self.buffer_load_dir is None and self.buffer.size < kwargs["buffer_warm_size"]:
             samples, _ = self.sampler.sample()
             self.buffer.add_batch(samples)
         self.sampler_tb_dict = LogData()
 
+        # optionally, samples are collected whenever updates run ahead of the target ratio
+        self.rate_limiter = None
+        if kwargs.get("update_sample_ratio", None) is not None:
+            self.rate_limiter = RateLimiter(
+                kwargs["update_sample_ratio"],
+                self.sampler.sample_batch_size,
+                kwargs.get("update_sample_ratio_tolerance", None),
+            )
+
         # create evaluation tasks
         self.evluate_tasks = TaskPool()
         self.last_eval_iteration = 0
@@ -73,46 +106,89 @@ class OffSerialTrainer:
         self.use_gpu = kwargs["use_gpu"]
         if self.use_gpu:
             self.networks.cuda()
+        # optimizer states are loaded onto the device of the parameters, so after moving them
+        if checkpoint is not None:
+            self.alg.load_checkpoint_state(checkpoint["alg"])
+
+        # sample replay batches in a background thread
+        self.prefetch_size = kwargs.get("buffer_prefetch_size", 0)
+        if self.prefetch_size > 0:
+            self.buffer = BufferPrefetcher(
+                self.buffer, self.replay_batch_size, self.prefetch_size, pin_memory=self.use_gpu
+            )
+
+        # optionally, save checkpoints of the full training state in the background
+        self.checkpoint_interval = kwargs.get("checkpoint_interval", None)
+        self.checkpoint_writer = CheckpointWriter(kwargs.get("checkpoint_max_to_keep", 2))
+        self.last_checkpoint_iteration = None
+        if checkpoint is not None:
+            self.iteration = checkpoint["iteration"]
+            self.best_tar = checkpoint["best_tar"]
+            self.last_eval_iteration = checkpoint["last_eval_iteration"]
+            self.last_checkpoint_iteration = self.iteration
+            set_rng_state(checkpoint["rng_state"])
 
         self.start_time = time.time()
 
     def step(self):
         # sampling
-        if self.iteration % self.sample_interval == 0:
-            with ModuleOnDevice(self.networks, "cpu"):
-                sampler_samples, sampler_tb_dict = self.sampler.sample()
-            self.buffer.add_batch(sampler_samples)
-            self.sampler_tb_dict.add_average(sampler_tb_dict)
+        with self.profiler.span("sample"):
+            if self.rate_limiter is not None:
+                # learning waits for the samples it is owed
+                while not self.rate_limiter.can_update():
+                    start_time = time.perf_counter()
+                    self._sample()
+                    self.rate_limiter.add_blocked_time("learner", time.perf_counter() - start_time)
+                self.rate_limiter.update()
+            elif self.iteration % self.sample_interval == 0:
+                self._sample()
 
         # replay
-        replay_samples = self.buffer.sample_batch(self.replay_batch_size)
+        with self.profiler.span("replay"):
+            replay_samples = self.buffer.sample_batch(self.replay_batch_size)
 
         # learning
         if self.use_gpu:
-            for k, v in replay_samples.items():
-                replay_samples[k] = v.cuda()
+            with self.profiler.span("host_to_device"):
+                for k, v in replay_samples.items():
+                    replay_samples[k] = v.cuda(non_blocking=True) if isinstance(v, torch.Tensor) else v.cuda()
 
-        self.networks.train()
-        if self.per_flag:
-            alg_tb_dict, idx, new_priority = self.alg.local_update(
-                replay_samples, self.iteration
-            )
-            self.buffer.update_batch(idx, new_priority)
-        else:
-            alg_tb_dict = self.alg.local_update(replay_samples, self.iteration)
-        self.networks.eval()
+        with self.profiler.span("update"):
+            self.networks.train()
+            if self.per_flag:
+                alg_tb_dict, idx, new_priority = self.alg.local_update(
+                    replay_samples, self.iteration
+                )
+                self.buffer.update_batch(idx, new_priority)
+            else:
+                alg_tb_dict = self.alg.local_update(replay_samples, self.iteration)
+            self.networks.eval()
 
         # log
         if self.iteration % self.log_save_interval == 0:
-            print("Iter = ", self.iteration)
-            add_scalars(alg_tb_dict, self.writer, step=self.iteration)
-            add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+            with self.profiler.span("log"):
+                print("Iter = ", self.iteration)
+                add_scalars(alg_tb_dict, self.writer, step=self.iteration)
+                add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+                if self.prefetch_size > 0:
+                    add_scalars(self.buffer.pop_tb_dict(), self.writer, step=self.iteration)
+                if self.rate_limiter is not None:
+                    add_scalars(self.rate_limiter.stats(), self.writer, step=self.iteration)
+                self.profiler.add_to_writer(self.writer, self.iteration)
+                self.profiler.add_remote_to_writer(self.writer, self.iteration, {"evaluator": self.evaluator})
 
         # save
-        if self.iteration % self.apprfunc_save_interval == 0:
-            self.save_apprfunc()
+        with self.profiler.span("save"):
+            if self.iteration % self.apprfunc_save_interval == 0:
+                self.save_apprfunc()
+            if self.buffer_save_interval is not None and self.iteration % self.buffer_save_interval == 0:
+                self.save_buffer(blocking=False)
 
         # evaluate
+        with self.profiler.span("evaluate"):
+            self._evaluate()
+
+    def _evaluate(self):
         if self.iteration - self.last_eval_iteration >= self.eval_interval:
             if self.evluate_tasks.count == 0:
                 # There is no evaluation task, add one.
@@ -166,11 +242,32 @@ class OffSerialTrainer:
 
     def train(self):
         while self.iteration < self.max_iteration:
-            self.step()
+            with self.profiler.iteration():
+                self.step()
             self.iteration += 1
+            if self.checkpoint_interval is not None and self.iteration % self.checkpoint_interval == 0:
+                with self.profiler.span("checkpoint"):
+                    self.save_checkpoint()
 
+        if self.checkpoint_interval is not None:
+            if self.last_checkpoint_iteration != self.iteration:
+                self.save_checkpoint()
+            self.checkpoint_writer.wait()
+        if self.prefetch_size > 0:
+            self.buffer.close()
         self.save_apprfunc()
+        if self.buffer_save_interval is not None:
+            self.save_buffer()
         self.writer.flush()
+        self.profiler.save_trace()
+
+    def _sample(self):
+        with ModuleOnDevice(self.networks, "cpu"):
+            sampler_samples, sampler_tb_dict = self.sampler.sample()
+        self.buffer.add_batch(sampler_samples)
+        self.sampler_tb_dict.add_average(sampler_tb_dict)
+        if self.rate_limiter is not None:
+            self.rate_limiter.insert()
 
     def save_apprfunc(self):
         torch.save(
@@ -178,6 +275,31 @@ class OffSerialTrainer:
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
 
+    def save_buffer(self, blocking: bool = True):
+        self.buffer.save(os.path.join(self.save_folder, "buffer_snapshot", "buffer_0"), blocking=blocking)
+
+    def save_checkpoint(self, blocking: bool = False):
+        """
+        Save the full training state, i.e. algorithm with optimizers, counters, random streams,
+        sampler and buffer, to be resumed with the `resume_from` argument. The state is copied,
+        and written in the background unless `blocking`, the buffer by a forked process.
+        """
+        path = checkpoint_dir(self.save_folder, self.iteration)
+        save_process = self.buffer.save(os.path.join(path, "buffer_0"), blocking=False)
+        state = snapshot({
+            "trainer": type(self).__name__,
+            "iteration": self.iteration,
+            "best_tar": self.best_tar,
+            "last_eval_iteration": self.last_eval_iteration,
+            "alg": self.alg.checkpoint_state(),
+            "samplers": [self.sampler.checkpoint_state()],
+            "rng_state": get_rng_state(),
+        })
+        self.checkpoint_writer.write(path, state, [save_process.wait] if save_process is not None else [])
+        self.last_checkpoint_iteration = self.iteration
+        if blocking:
+            self.checkpoint_writer.wait()
+
     def _add_eval_task(self):
         with ModuleOnDevice(self.networks, "cpu"):
             self.evaluator.load_state_dict.remote(self.networks.state_dict())
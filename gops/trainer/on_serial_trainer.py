@@ -21,8 +21,17 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.utils.checkpoint import (
+    CheckpointWriter,
+    checkpoint_dir,
+    get_rng_state,
+    load_checkpoint,
+    set_rng_state,
+    snapshot,
+)
 from gops.utils.common_utils import ModuleOnDevice
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.profiler import configure_profiler
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 from gops.utils.log_data import LogData
 
@@ -41,6 +50,15 @@ class OnSerialTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # or resume the full training state from a checkpoint of `save_checkpoint`
+        checkpoint = None
+        if kwargs.get("resume_from", None) is not None:
+            checkpoint, _ = load_checkpoint(kwargs["resume_from"], type(self).__name__)
+            # networks are only moved to the GPU for updates, where the optimizer states live
+            with ModuleOnDevice(self.networks, "cuda" if kwargs["use_gpu"] else "cpu"):
+                self.alg.load_checkpoint_state(checkpoint["alg"])
+            self.sampler.load_checkpoint_state(checkpoint["samplers"][0])
+
         self.max_iteration = kwargs.get("max_iteration")
         self.log_save_interval = kwargs["log_save_interval"]
         self.apprfunc_save_interval = kwargs["apprfunc_save_interval"]
@@ -49,6 +67,9 @@ class OnSerialTrainer:
         self.save_folder = kwargs["save_folder"]
         self.iteration = 0
 
+        # optionally, time the stages of each iteration
+        self.profiler = configure_profiler(**kwargs)
+
         self.writer = SummaryWriter(log_dir=self.save_folder, flush_secs=20)
         # flush tensorboard at the beginning
         add_scalars(
@@ -64,38 +85,60 @@ class OnSerialTrainer:
 
         self.use_gpu = kwargs["use_gpu"]
 
+        # optionally, save checkpoints of the full training state in the background
+        self.checkpoint_interval = kwargs.get("checkpoint_interval", None)
+        self.checkpoint_writer = CheckpointWriter(kwargs.get("checkpoint_max_to_keep", 2))
+        self.last_checkpoint_iteration = None
+        if checkpoint is not None:
+            self.iteration = checkpoint["iteration"]
+            self.best_tar = checkpoint["best_tar"]
+            self.last_eval_iteration = checkpoint["last_eval_iteration"]
+            self.last_checkpoint_iteration = self.iteration
+            set_rng_state(checkpoint["rng_state"])
+
         self.start_time = time.time()
 
     def step(self):
         # sampling
-        (
-            samples_with_replay_format,
-            sampler_tb_dict,
-        ) = self.sampler.sample_with_replay_format()
-        self.sampler_tb_dict.add_average(sampler_tb_dict)
+        with self.profiler.span("sample"):
+            (
+                samples_with_replay_format,
+                sampler_tb_dict,
+            ) = self.sampler.sample_with_replay_format()
+            self.sampler_tb_dict.add_average(sampler_tb_dict)
 
         # learning
         if self.use_gpu:
-            for k, v in samples_with_replay_format.items():
-                samples_with_replay_format[k] = v.cuda()
-        with ModuleOnDevice(self.networks, "cuda" if self.use_gpu else "cpu"):
-            self.networks.train()
-            alg_tb_dict = self.alg.local_update(
-                samples_with_replay_format, self.iteration
-            )
-            self.networks.eval()
+            with self.profiler.span("host_to_device"):
+                for k, v in samples_with_replay_format.items():
+                    samples_with_replay_format[k] = v.cuda()
+        with self.profiler.span("update"):
+            with ModuleOnDevice(self.networks, "cuda" if self.use_gpu else "cpu"):
+                self.networks.train()
+                alg_tb_dict = self.alg.local_update(
+                    samples_with_replay_format, self.iteration
+                )
+                self.networks.eval()
 
         # log
         if self.iteration % self.log_save_interval == 0:
-            print("Iter = ", self.iteration)
-            add_scalars(alg_tb_dict, self.writer, step=self.iteration)
-            add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+            with self.profiler.span("log"):
+                print("Iter = ", self.iteration)
+                add_scalars(alg_tb_dict, self.writer, step=self.iteration)
+                add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+                self.profiler.add_to_writer(self.writer, self.iteration)
+                self.profiler.add_remote_to_writer(self.writer, self.iteration, {"evaluator": self.evaluator})
 
         # save
-        if self.iteration % self.apprfunc_save_interval == 0:
-            self.save_apprfunc()
+        with self.profiler.span("save"):
+            if self.iteration % self.apprfunc_save_interval == 0:
+                self.save_apprfunc()
 
         # evaluate
+        with self.profiler.span("evaluate"):
+            self._evaluate()
+
+    def _evaluate(self):
         if self.iteration - self.last_eval_iteration >= self.eval_interval:
             if self.evluate_tasks.count == 0:
                 # There is no evaluation task, add one.
@@ -139,11 +182,20 @@ class OnSerialTrainer:
 
     def train(self):
         while self.iteration < self.max_iteration:
-            self.step()
+            with self.profiler.iteration():
+                self.step()
             self.iteration += 1
-
+            if self.checkpoint_interval is not None and self.iteration % self.checkpoint_interval == 0:
+                with self.profiler.span("checkpoint"):
+                    self.save_checkpoint()
+
+        if self.checkpoint_interval is not None:
+            if self.last_checkpoint_iteration != self.iteration:
+                self.save_checkpoint()
+            self.checkpoint_writer.wait()
         self.save_apprfunc()
         self.writer.flush()
+        self.profiler.save_trace()
 
     def save_apprfunc(self):
         torch.save(
@@ -151,6 +203,27 @@ class OnSerialTrainer:
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
 
+    def save_checkpoint(self, blocking: bool = False):
+        """
+        Save the full training state, i.e. algorithm with optimizers, counters, random streams
+        and sampler, to be resumed with the `resume_from` argument. The state is copied, and
+        written in the background unless `blocking`.
+        """
+        path = checkpoint_dir(self.save_folder, self.iteration)
+        state = snapshot({
+            "trainer": type(self).__name__,
+            "iteration": self.iteration,
+            "best_tar": self.best_tar,
+            "last_eval_iteration": self.last_eval_iteration,
+            "alg": self.alg.checkpoint_state(),
+            "samplers": [self.sampler.checkpoint_state()],
+            "rng_state": get_rng_state(),
+        })
+        self.checkpoint_writer.write(path, state)
+        self.last_checkpoint_iteration = self.iteration
+        if blocking:
+            self.checkpoint_writer.wait()
+
     def _add_eval_task(self):
         with ModuleOnDevice(self.networks, "cpu"):
             self.evaluator.load_state_dict.remote(self.networks.state_dict())
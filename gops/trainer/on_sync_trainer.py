@@ -22,7 +22,16 @@ import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
+from gops.utils.checkpoint import (
+    CheckpointWriter,
+    checkpoint_dir,
+    get_rng_state,
+    load_checkpoint,
+    set_rng_state,
+    snapshot,
+)
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.profiler import configure_profiler
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 from gops.utils.log_data import LogData
 from gops.utils.gops_path import camel2underline
@@ -53,6 +62,19 @@ class OnSyncTrainer:
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
 
+        # or resume the full training state from a checkpoint of `save_checkpoint`
+        checkpoint = None
+        if kwargs.get("resume_from", None) is not None:
+            checkpoint, _ = load_checkpoint(kwargs["resume_from"], type(self).__name__)
+            if len(checkpoint["samplers"]) != len(self.samplers):
+                warnings.warn("Checkpoint has {} samplers, states of the first {} are restored".format(
+                    len(checkpoint["samplers"]), len(self.samplers)
+                ))
+            ray.get([
+                sampler.load_checkpoint_state.remote(state)
+                for sampler, state in zip(self.samplers, checkpoint["samplers"])
+            ])
+
         self.max_iteration = kwargs["max_iteration"]
         self.log_save_interval = kwargs["log_save_interval"]
         self.apprfunc_save_interval = kwargs["apprfunc_save_interval"]
@@ -61,6 +83,9 @@ class OnSyncTrainer:
         self.save_folder = kwargs["save_folder"]
         self.iteration = 0
 
+        # optionally, time the stages of each iteration
+        self.profiler = configure_profiler(**kwargs)
+
         self.writer = SummaryWriter(log_dir=self.save_folder, flush_secs=20)
         # flush tensorboard at the beginning
         add_scalars(
@@ -77,44 +102,71 @@ class OnSyncTrainer:
         self.use_gpu = kwargs["use_gpu"]
         if self.use_gpu:
             self.alg.networks.cuda()
+        # optimizer states are loaded onto the device of the parameters, so after moving them
+        if checkpoint is not None:
+            self.alg.load_checkpoint_state(checkpoint["alg"])
+            self.networks.load_state_dict(self.alg.state_dict())
         self.alg.networks.train()
 
+        # optionally, save checkpoints of the full training state in the background
+        self.checkpoint_interval = kwargs.get("checkpoint_interval", None)
+        self.checkpoint_writer = CheckpointWriter(kwargs.get("checkpoint_max_to_keep", 2))
+        self.last_checkpoint_iteration = None
+        if checkpoint is not None:
+            self.iteration = checkpoint["iteration"]
+            self.best_tar = checkpoint["best_tar"]
+            self.last_eval_iteration = checkpoint["last_eval_iteration"]
+            self.last_checkpoint_iteration = self.iteration
+            set_rng_state(checkpoint["rng_state"])
+
         self.start_time = time.time()
 
     def step(self):
         # sampling
-        weights = ray.put(self.networks.state_dict())
-        for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
-        samples, sampler_tb_dict = zip(
-            *ray.get(
-                [
-                    sampler.sample_with_replay_format.remote()
-                    for sampler in self.samplers
-                ]
+        with self.profiler.span("weight_sync"):
+            weights = ray.put(self.networks.state_dict())
+            for sampler in self.samplers:
+                sampler.load_state_dict.remote(weights)
+        with self.profiler.span("sample"):
+            samples, sampler_tb_dict = zip(
+                *ray.get(
+                    [
+                        sampler.sample_with_replay_format.remote()
+                        for sampler in self.samplers
+                    ]
+                )
             )
-        )
-        self.sampler_tb_dict.add_average(sampler_tb_dict)
-        all_samples = concate(samples)
+            self.sampler_tb_dict.add_average(sampler_tb_dict)
+            all_samples = concate(samples)
 
         # learning
         if self.use_gpu:
-            for k, v in all_samples.items():
-                all_samples[k] = v.cuda()
-        alg_tb_dict = self.alg.local_update(all_samples, self.iteration)
-        self.networks.load_state_dict(self.alg.state_dict())
+            with self.profiler.span("host_to_device"):
+                for k, v in all_samples.items():
+                    all_samples[k] = v.cuda()
+        with self.profiler.span("update"):
+            alg_tb_dict = self.alg.local_update(all_samples, self.iteration)
+            self.networks.load_state_dict(self.alg.state_dict())
 
         # log
         if self.iteration % self.log_save_interval == 0:
-            print("Iter = ", self.iteration)
-            add_scalars(alg_tb_dict, self.writer, step=self.iteration)
-            add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+            with self.profiler.span("log"):
+                print("Iter = ", self.iteration)
+                add_scalars(alg_tb_dict, self.writer, step=self.iteration)
+                add_scalars(self.sampler_tb_dict.pop(), self.writer, step=self.iteration)
+                self.profiler.add_to_writer(self.writer, self.iteration)
+                self.profiler.add_remote_to_writer(self.writer, self.iteration, self._remote_profile_actors())
 
         # save
-        if self.iteration % self.apprfunc_save_interval == 0:
-            self.save_apprfunc()
+        with self.profiler.span("save"):
+            if self.iteration % self.apprfunc_save_interval == 0:
+                self.save_apprfunc()
 
         # evaluate
+        with self.profiler.span("evaluate"):
+            self._evaluate()
+
+    def _evaluate(self):
         if self.iteration - self.last_eval_iteration >= self.eval_interval:
             if self.evluate_tasks.count == 0:
                 # There is no evaluation task, add one.
@@ -165,11 +217,25 @@ class OnSyncTrainer:
 
     def train(self):
         while self.iteration < self.max_iteration:
-            self.step()
+            with self.profiler.iteration():
+                self.step()
             self.iteration += 1
+            if self.checkpoint_interval is not None and self.iteration % self.checkpoint_interval == 0:
+                with self.profiler.span("checkpoint"):
+                    self.save_checkpoint()
 
+        if self.checkpoint_interval is not None:
+            if self.last_checkpoint_iteration != self.iteration:
+                self.save_checkpoint()
+            self.checkpoint_writer.wait()
         self.save_apprfunc()
         self.writer.flush()
+        self.profiler.save_trace()
+
+    def _remote_profile_actors(self) -> dict:
+        actors = {"sampler_{}".format(i): sampler for i, sampler in enumerate(self.samplers)}
+        actors["evaluator"] = self.evaluator
+        return actors
 
     def save_apprfunc(self):
         torch.save(
@@ -177,6 +243,27 @@ class OnSyncTrainer:
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
 
+    def save_checkpoint(self, blocking: bool = False):
+        """
+        Save the full training state, i.e. algorithm with optimizers, counters, random streams
+        and samplers, to be resumed with the `resume_from` argument. The state is copied, and
+        written in the background unless `blocking`.
+        """
+        path = checkpoint_dir(self.save_folder, self.iteration)
+        state = snapshot({
+            "trainer": type(self).__name__,
+            "iteration": self.iteration,
+            "best_tar": self.best_tar,
+            "last_eval_iteration": self.last_eval_iteration,
+            "alg": self.alg.checkpoint_state(),
+            "samplers": ray.get([sampler.checkpoint_state.remote() for sampler in self.samplers]),
+            "rng_state": get_rng_state(),
+        })
+        self.checkpoint_writer.write(path, state)
+        self.last_checkpoint_iteration = self.iteration
+        if blocking:
+            self.checkpoint_writer.wait()
+
     def _add_eval_task(self):
         self.evaluator.load_state_dict.remote(self.networks.state_dict())
         self.evluate_tasks.add(
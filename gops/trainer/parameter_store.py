@@ -0,0 +1,120 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Versioned weights of the center networks of parallel trainers
+
+__all__ = ["FlatStateDict", "ParameterStore"]
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+from gops.utils.profiler import profile
+from gops.utils.tensorboard_setup import tb_tags
+
+
+def unflatten_state_dict(buffers: dict, spec: list) -> OrderedDict:
+    """Rebuild the state dict of a `FlatStateDict` from its buffers and spec."""
+    # buffers received from the object store are read-only, so each one is copied once
+    flat = {dtype: torch.from_numpy(np.array(buffer)) for dtype, buffer in buffers.items()}
+    state_dict = OrderedDict()
+    for key, dtype, offset, shape, value in spec:
+        if dtype is None:
+            state_dict[key] = value
+        else:
+            state_dict[key] = flat[dtype][offset:offset + int(np.prod(shape))].view(shape)
+    return state_dict
+
+
+class FlatStateDict:
+    """
+    State dict flattened into one contiguous buffer per dtype. It is pickled as the
+    buffers and a spec of keys, offsets and shapes, and unpickled as an `OrderedDict`
+    of tensor views of the buffers, so it can be passed to `load_state_dict` of remote
+    actors as is.
+    """
+
+    def __init__(self, state_dict: dict):
+        arrays, sizes, self.spec = {}, {}, []
+        for key, value in state_dict.items():
+            if isinstance(value, torch.Tensor):
+                array = value.detach().cpu().numpy().reshape(-1)
+                dtype = array.dtype.str
+                offset = sizes.get(dtype, 0)
+                arrays.setdefault(dtype, []).append(array)
+                sizes[dtype] = offset + array.size
+                self.spec.append((key, dtype, offset, tuple(value.shape), None))
+            else:
+                self.spec.append((key, None, 0, None, value))
+        self.buffers = {dtype: np.concatenate(v) for dtype, v in arrays.items()}
+        self.nbytes = sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def __reduce__(self):
+        return unflatten_state_dict, (self.buffers, self.spec)
+
+
+class ParameterStore:
+    """
+    Weights of the center networks of a parallel trainer, tagged with a version that
+    the trainer increments with `update` whenever the networks change. Each version
+    is flattened and put into the Ray object store once, on its first `sync`, and
+    `sync` skips receivers which already hold the current version, or lag behind it
+    by at most the staleness bound.
+
+    Args:
+        networks: Center networks, whose `state_dict` is published.
+        staleness (int, optional): Number of versions a receiver may lag behind before
+            it is sent the current weights. Defaults to 0, receivers are sent every
+            new version, but never one they already hold.
+    """
+
+    def __init__(self, networks, staleness: int = 0):
+        self.networks = networks
+        self.staleness = staleness
+        self.version = 0
+        # version, object reference and size of the published weights
+        self.published = None
+        self.receiver_versions = {}
+        self.sent_bytes = 0
+        self.stats_time = time.perf_counter()
+
+    def update(self) -> None:
+        """Mark the center networks as changed."""
+        self.version += 1
+
+    @profile("parameter_store.publish")
+    def publish(self) -> tuple:
+        if self.published is None or self.published[0] != self.version:
+            import ray
+
+            flat = FlatStateDict(self.networks.state_dict())
+            self.published = (self.version, ray.put(flat), flat.nbytes)
+        return self.published
+
+    @profile("parameter_store.sync")
+    def sync(self, receiver, staleness: int = None) -> bool:
+        """Load the current weights into the actor `receiver` if it lags behind by more than the staleness bound."""
+        staleness = self.staleness if staleness is None else staleness
+        received = self.receiver_versions.get(receiver, None)
+        if received is not None and self.version - received <= staleness:
+            return False
+        version, weights, nbytes = self.publish()
+        receiver.load_state_dict.remote(weights)
+        self.receiver_versions[receiver] = version
+        self.sent_bytes += nbytes
+        return True
+
+    def stats(self) -> dict:
+        """Bytes of weights sent per second since the last call, as tensorboard scalars."""
+        now = time.perf_counter()
+        tb_info = {tb_tags["weight_sync_bytes"]: self.sent_bytes / (now - self.stats_time)}
+        self.sent_bytes = 0
+        self.stats_time = now
+        return tb_info
@@ -0,0 +1,131 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Background prefetcher of replay batches for off-policy trainers
+
+__all__ = ["BufferPrefetcher"]
+
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+from gops.utils.log_data import LogData
+from gops.utils.tensorboard_setup import tb_tags
+
+
+class BufferPrefetcher:
+    """
+    Wrap a replay buffer so that `sample_batch` is served from a bounded queue filled
+    by a background thread, taking buffer sampling and tensor conversion off the
+    critical path of the learner.
+
+    All buffer accesses go through a lock, so the trainer keeps calling `add_batch`
+    and `update_batch` on the prefetcher as it would on the buffer. Served batches
+    lag the buffer by at most `prefetch_size + 1` samplings. Delayed priority updates
+    of prioritized buffers skip slots that have been overwritten since the batch was
+    sampled.
+
+    Args:
+        buffer: Replay buffer to sample from.
+        replay_batch_size (int): Size of prefetched batches.
+        prefetch_size (int): Number of ready batches kept in the queue.
+        pin_memory (bool): Copy prefetched tensors into pinned memory, so that the
+            transfer to GPU can be non-blocking.
+    """
+
+    def __init__(self, buffer, replay_batch_size: int, prefetch_size: int = 2, pin_memory: bool = False):
+        self.buffer = buffer
+        self.replay_batch_size = replay_batch_size
+        self.pin_memory = pin_memory
+        self.queue = queue.Queue(maxsize=prefetch_size)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.error = None
+        # total number of stored transitions, used to detect overwritten slots
+        self.stored = 0
+        self.sampled_stored = 0
+        self.tb_dict = LogData()
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["buffer"], name)
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name="buffer_prefetcher", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def add_batch(self, samples) -> None:
+        with self.lock:
+            self.buffer.add_batch(samples)
+            self.stored += len(samples["rew"]) if isinstance(samples, dict) else len(samples)
+
+    def sample_batch(self, batch_size: int) -> dict:
+        assert batch_size == self.replay_batch_size, "Prefetched batches have a fixed size"
+        if self.thread is None:
+            self.start()
+        start_time = time.perf_counter()
+        depth = self.queue.qsize()
+        while True:
+            try:
+                batch, self.sampled_stored = self.queue.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if self.error is not None:
+                    raise self.error
+        self.tb_dict.add_average({
+            tb_tags["prefetch_queue_depth"]: depth,
+            tb_tags["prefetch_stall_time"]: (time.perf_counter() - start_time) * 1000,
+        })
+        return batch
+
+    def update_batch(self, idxes, priorities) -> None:
+        if isinstance(idxes, torch.Tensor):
+            idxes = idxes.detach().cpu().numpy()
+        if isinstance(priorities, torch.Tensor):
+            priorities = priorities.detach().cpu().numpy()
+        with self.lock:
+            written = self.stored - self.sampled_stored
+            if written > 0:
+                # idxes are leaf positions in the sum tree of the prioritized buffer
+                slots = idxes.astype(np.int64) - self.buffer.tree_capacity + 1
+                age = (self.buffer.ptr - 1 - slots) % self.buffer.max_size
+                keep = age >= written
+                idxes, priorities = idxes[keep], priorities[keep]
+            if len(idxes) > 0:
+                self.buffer.update_batch(idxes, priorities)
+
+    def pop_tb_dict(self) -> dict:
+        return self.tb_dict.pop()
+
+    def _run(self) -> None:
+        try:
+            while not self.stop_event.is_set():
+                with self.lock:
+                    batch = self.buffer.sample_batch(self.replay_batch_size)
+                    stored = self.stored
+                if self.pin_memory:
+                    for k, v in batch.items():
+                        if isinstance(v, torch.Tensor):
+                            batch[k] = v.pin_memory()
+                while not self.stop_event.is_set():
+                    try:
+                        self.queue.put((batch, stored), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            self.error = e
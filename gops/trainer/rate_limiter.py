@@ -0,0 +1,108 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Rate limiter keeping the ratio of network updates to collected samples of off-policy trainers
+
+__all__ = ["RateLimiter"]
+
+import time
+
+from gops.utils.tensorboard_setup import tb_tags
+
+
+class RateLimiter:
+    """
+    Target number of network updates per collected sample, shared by the off-policy
+    trainers. Before a sampler task or a learner update is started, the trainer asks
+    `can_insert` or `can_update`, which allow it as long as the number of updates stays
+    within `tolerance` updates of `update_sample_ratio` times the number of samples.
+    Workers which are not allowed to start wait until the other side has caught up,
+    and the time they wait is reported as blocked time. Samples collected before
+    training starts, e.g. to warm up the buffer, are not counted.
+
+    Both sides can always proceed for some state of the counters if the tolerance is
+    at least half of one update plus the updates owed for one sample batch, so that the
+    trainer never deadlocks; smaller tolerances are rejected.
+
+    Args:
+        update_sample_ratio (float): Target number of network updates per collected sample.
+        sample_batch_size (int): Number of samples collected by one sampler task.
+        tolerance (float, optional): Number of updates the learners may be ahead of,
+            or behind, the target. Defaults to the updates owed for one sample batch plus
+            one, i.e. about one sample batch of slack in both directions.
+        sampler_num (int, optional): Number of samplers. Defaults to 1.
+        learner_num (int, optional): Number of learners. Defaults to 1.
+    """
+
+    def __init__(
+        self,
+        update_sample_ratio: float,
+        sample_batch_size: int,
+        tolerance: float = None,
+        sampler_num: int = 1,
+        learner_num: int = 1,
+    ):
+        if update_sample_ratio <= 0:
+            raise ValueError("update_sample_ratio must be positive")
+        self.ratio = update_sample_ratio
+        self.sample_batch_size = sample_batch_size
+        min_tolerance = (1 + sample_batch_size * update_sample_ratio) / 2
+        if tolerance is None:
+            tolerance = 2 * min_tolerance
+        elif tolerance < min_tolerance:
+            raise ValueError(
+                f"Rate limiter tolerance {tolerance} is smaller than {min_tolerance}, "
+                "the samplers and learners could block each other"
+            )
+        self.tolerance = tolerance
+        self.sampler_num = sampler_num
+        self.learner_num = learner_num
+
+        self.sample_num = 0
+        self.update_num = 0
+        self.blocked_time = {"sampler": 0.0, "learner": 0.0}
+        self.last_sample_num = 0
+        self.last_update_num = 0
+        self.stats_time = time.perf_counter()
+
+    def can_insert(self) -> bool:
+        """Whether one more sampler task keeps the learners within tolerance behind the target."""
+        return (self.sample_num + self.sample_batch_size) * self.ratio - self.update_num <= self.tolerance
+
+    def can_update(self) -> bool:
+        """Whether one more update keeps the learners within tolerance ahead of the target."""
+        return self.update_num + 1 - self.sample_num * self.ratio <= self.tolerance
+
+    def insert(self) -> None:
+        """Count a started sampler task."""
+        self.sample_num += self.sample_batch_size
+
+    def update(self) -> None:
+        """Count a started network update."""
+        self.update_num += 1
+
+    def add_blocked_time(self, side: str, seconds: float) -> None:
+        """Add the time a worker of `side`, "sampler" or "learner", waited for the other side."""
+        self.blocked_time[side] += seconds
+
+    def stats(self) -> dict:
+        """Achieved update ratio and percentage of time workers were blocked since the last call, as tensorboard scalars."""
+        now = time.perf_counter()
+        elapsed = now - self.stats_time
+        sample_num = self.sample_num - self.last_sample_num
+        tb_info = {
+            tb_tags["sampler_blocked_time"]: 100 * self.blocked_time["sampler"] / (self.sampler_num * elapsed),
+            tb_tags["learner_blocked_time"]: 100 * self.blocked_time["learner"] / (self.learner_num * elapsed),
+        }
+        if sample_num > 0:
+            tb_info[tb_tags["update_sample_ratio"]] = (self.update_num - self.last_update_num) / sample_num
+        self.last_sample_num = self.sample_num
+        self.last_update_num = self.update_num
+        self.blocked_time = {"sampler": 0.0, "learner": 0.0}
+        self.stats_time = now
+        return tb_info
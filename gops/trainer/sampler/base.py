@@ -11,8 +11,12 @@
 
 
 from abc import ABCMeta, abstractmethod
-from typing import List, NamedTuple, Tuple, Union
+from copy import deepcopy
+from dataclasses import fields, is_dataclass
+from typing import List, NamedTuple, Optional, Tuple, Union
+import pickle
 import time
+import warnings
 
 import numpy as np
 import torch
@@ -20,8 +24,12 @@ import torch
 from gops.create_pkg.create_env import create_env
 from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.env.vector.vector_env import VectorEnv
+from gops.trainer.buffer.replay_buffer import concat_column, stack_column
+from gops.utils.checkpoint import get_rng_state, set_rng_state
 from gops.utils.common_utils import set_seed
-from gops.utils.explore_noise import GaussNoise, EpsilonGreedy
+from gops.utils.explore_noise import create_noise_process
+from gops.utils.observation_window import ObservationWindow
+from gops.utils.profiler import configure_profiler, get_profiler, profile
 from gops.utils.tensorboard_setup import tb_tags
 
 
@@ -36,7 +44,80 @@ class Experience(NamedTuple):
     logp: float
 
 
+class ExperienceBatch(dict):
+    """
+    Columnar rollout of a sampler, a dict with keys obs, act, rew, done, logp,
+    time_limited, obs2 and each additional info key k and next_k, whose values
+    are stacked along the first dimension with transitions grouped by environment.
+    It is accepted by `ReplayBuffer.add_batch` as is, `experiences` converts it
+    for code that still iterates over `Experience`.
+    """
+
+    def experiences(self) -> List[Experience]:
+        info_keys = [k[len("next_"):] for k in self.keys() if k.startswith("next_")]
+        return [
+            Experience(
+                obs=self["obs"][i],
+                action=self["act"][i],
+                reward=self["rew"][i],
+                done=self["done"][i],
+                info={k: self[k][i] for k in info_keys},
+                next_obs=self["obs2"][i],
+                next_info={
+                    "TimeLimit.truncated": bool(self["time_limited"][i]),
+                    **{k: self["next_" + k][i] for k in info_keys},
+                },
+                logp=self["logp"][i],
+            )
+            for i in range(len(self["rew"]))
+        ]
+
+
+def allocate_rollout(column, horizon: int):
+    """Allocate `horizon` steps of a column batched over environments."""
+    if isinstance(column, np.ndarray):
+        return np.zeros((horizon, *column.shape), dtype=column.dtype)
+    values = []
+    for field in fields(column):
+        v = getattr(column, field.name)
+        values.append(allocate_rollout(v, horizon) if isinstance(v, np.ndarray) or is_dataclass(v) else v)
+    return column.__class__(*values)
+
+
+def group_by_env(column):
+    """Copy a (horizon, num_envs, ...) rollout column into rows grouped by environment."""
+    if isinstance(column, np.ndarray):
+        return np.array(column.swapaxes(0, 1)).reshape(-1, *column.shape[2:])
+    values = []
+    for field in fields(column):
+        v = getattr(column, field.name)
+        values.append(group_by_env(v) if isinstance(v, np.ndarray) or is_dataclass(v) else v)
+    return column.__class__(*values)
+
+
+class EnvHalf:
+    """Half of the environments of a pipelined sampler, with its own observations and pending actions."""
+
+    def __init__(self, env: VectorEnv, seq_len: Optional[int] = None):
+        self.env = env
+        self.obs, self.info = env.reset()
+        self.obs_window = ObservationWindow(seq_len, self.obs) if seq_len is not None else None
+        # action, logp and clipped action being stepped
+        self.pending = None
+        self.noise_processor = None
+
+
 class BaseSampler(metaclass=ABCMeta):
+    """
+    Base class of samplers.
+
+    Args:
+        sampler_pipeline (bool, optional): Split the vector environments into two halves
+            and choose the actions of one half while the other half is stepping, so that
+            policy inference overlaps environment simulation. Effective with
+            vector_env_type async and an even vector_env_num. Defaults to False.
+    """
+
     def __init__(
         self, 
         sample_batch_size,
@@ -44,14 +125,29 @@ class BaseSampler(metaclass=ABCMeta):
         noise_params=None,
         **kwargs
     ):
-        self.env = create_env(**kwargs)
-        _, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 200, self.env)  #? seed here?
+        configure_profiler(**kwargs)
+        self.pipeline = kwargs.get("sampler_pipeline", False)
+        if self.pipeline:
+            num_envs = kwargs.get("vector_env_num", None)
+            if num_envs is None or num_envs % 2 != 0:
+                raise ValueError("sampler_pipeline requires an even vector_env_num")
+            half_envs = []
+            # seed the second half first, so that the global seed is the one of the first half
+            for offset in (num_envs // 2, 0):
+                env = create_env(**{**kwargs, "vector_env_num": num_envs // 2})
+                _, env = set_seed(kwargs["trainer"], kwargs["seed"], index + 200 + offset, env)
+                half_envs.insert(0, env)
+            self.env = half_envs[0]
+        else:
+            self.env = create_env(**kwargs)
+            _, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 200, self.env)  #? seed here?
         self.networks = create_approx_contrainer(**kwargs)
+        self.inference_server = None
         self.noise_params = noise_params
         self.sample_batch_size = sample_batch_size
         if isinstance(self.env, VectorEnv):
             self._is_vector = True
-            self.num_envs = self.env.num_envs
+            self.num_envs = self.env.num_envs * (2 if self.pipeline else 1)
             assert self.sample_batch_size % self.num_envs == 0, (
                 "sample_batch_size must be divisible by the number of environments"
             )
@@ -62,28 +158,54 @@ class BaseSampler(metaclass=ABCMeta):
             self.horizon = self.sample_batch_size
         self.action_type = kwargs["action_type"]
         self.reward_scale = 1.0  #? why hard-coded?
+        # exploration noise with one state per environment and a random stream per sampler
+        self.noise_seed = None if kwargs.get("seed", None) is None else [kwargs["seed"], index]
+        self.noise_processor = None
         if self.noise_params is not None:
-            if self.action_type == "continu":
-                self.noise_processor = GaussNoise(**self.noise_params)
-            elif self.action_type == "discret":
-                self.noise_processor = EpsilonGreedy(**self.noise_params)
-        
+            self.noise_processor = create_noise_process(
+                self.action_type, seed=self.noise_seed, **self.noise_params
+            )
+
         self.total_sample_number = 0
-        self.obs, self.info = self.env.reset()
-        if self._is_vector:
-            # convert a dict of batched data to a list of dict of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            self.info = [dict(zip(self.info, t)) for t in zip(*self.info.values())] if self.info else [{}] * self.num_envs
+        self.info_keys = list(kwargs["additional_info"].keys())
+        # recurrent policies act on a window of the last seq_len observations
+        seq_len = kwargs.get("seq_len", None)
+        if self.pipeline:
+            self.halves = [EnvHalf(env, seq_len) for env in half_envs]
+            for i, half in enumerate(self.halves):
+                half.info = self._info_columns(half.info)
+                if self.noise_params is not None:
+                    half.noise_processor = create_noise_process(
+                        self.action_type,
+                        seed=None if self.noise_seed is None else self.noise_seed + [i],
+                        **self.noise_params
+                    )
+            self.pipeline_step = 0
+            return
+        self.obs, info = self.env.reset()
+        # additional info of the current observations, batched into one column per key
+        self.info = self._info_columns(info)
+        if seq_len is not None:
+            self.obs_window = ObservationWindow(seq_len, self.obs if self._is_vector else self.obs[None])
+        else:
+            self.obs_window = None
 
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
-    def sample(self) -> Tuple[Union[List[Experience], dict], dict]:
+    def set_inference_server(self, server) -> None:
+        """Attach an `InferenceServer` actor, which then chooses actions instead of the local networks."""
+        self.inference_server = server
+
+    @profile("sampler.sample")
+    def sample(self) -> Tuple[Union[ExperienceBatch, dict], dict]:
         self.total_sample_number += self.sample_batch_size
+        for noise_processor in self._noise_processors():
+            noise_processor.set_total_sample_number(self.total_sample_number)
         tb_info = dict()
         start_time = time.perf_counter()
+        if self.pipeline:
+            self.pipeline_step = 0
 
         data = self._sample()
 
@@ -91,34 +213,181 @@ class BaseSampler(metaclass=ABCMeta):
         tb_info[tb_tags["sampler_time"]] = (end_time - start_time) * 1000
         return data, tb_info
     
+    def set_buffer(self, buffer) -> None:
+        """Attach a process-shared replay buffer, which `sample_to_buffer` writes into."""
+        self.buffer = buffer
+
+    def sample_to_buffer(self) -> dict:
+        """Sample and append the samples to the attached buffer, only returning logs."""
+        data, tb_info = self.sample()
+        self.buffer.add_batch(data)
+        return tb_info
+
     @abstractmethod
-    def _sample(self) -> Union[List[Experience], dict]:
+    def _sample(self) -> Union[ExperienceBatch, dict]:
         pass
 
     def get_total_sample_number(self) -> int:
         return self.total_sample_number
+
+    def pop_profile(self) -> tuple:
+        """Profile of the stages timed in the process of this remote sampler, see `Profiler.pop_profile`."""
+        return get_profiler().pop_profile()
+
+    def _noise_processors(self) -> list:
+        sources = self.halves if self.pipeline else [self]
+        return [source.noise_processor for source in sources if source.noise_processor is not None]
+
+    def checkpoint_state(self) -> dict:
+        """
+        State of the sampler for resuming training: the number of samples, the random streams
+        of its process, the exploration noise, and the environments with their episodes in
+        progress, if they can be pickled. Environments of subprocesses cannot, and are reset on resume.
+        """
+        episodes = None
+        try:
+            episodes = pickle.dumps({k: getattr(self, k) for k in self._episode_attributes()})
+        except Exception as e:
+            warnings.warn("Environments of the sampler are not saved, they cannot be pickled: {}".format(e))
+        return {
+            "total_sample_number": self.total_sample_number,
+            "noise_processors": deepcopy(self._noise_processors()),
+            "episodes": episodes,
+            "rng_state": get_rng_state(),
+        }
+
+    def load_checkpoint_state(self, state: dict) -> None:
+        """Restore the state saved by `checkpoint_state`."""
+        self.total_sample_number = state["total_sample_number"]
+        episodes = None
+        if state["episodes"] is not None:
+            try:
+                episodes = pickle.loads(state["episodes"])
+            except Exception as e:
+                warnings.warn("Environments of the sampler are reset, they cannot be unpickled: {}".format(e))
+        if episodes is not None:
+            old_envs = [half.env for half in self.halves] if self.pipeline else [self.env]
+            for k, v in episodes.items():
+                setattr(self, k, v)
+            for env in old_envs:
+                env.close()
+        sources = self.halves if self.pipeline else [self]
+        noise_sources = [source for source in sources if source.noise_processor is not None]
+        if len(noise_sources) != len(state["noise_processors"]):
+            raise ValueError("Exploration noise of the checkpoint does not match noise_params")
+        for source, noise_processor in zip(noise_sources, state["noise_processors"]):
+            source.noise_processor = noise_processor
+        set_rng_state(state["rng_state"])
+
+    def _episode_attributes(self) -> tuple:
+        """Attributes holding the environments and their episodes in progress."""
+        if self.pipeline:
+            return ("halves", "pipeline_step")
+        return ("env", "obs", "info", "obs_window")
     
-    def _step(self) -> List[Experience]:
-        # take action using behavior policy
+    def _step(self) -> dict:
+        """Step all environments once, returning a dict of columns with one row per environment."""
+        if self.pipeline:
+            return self._pipelined_step()
+        if self._is_vector:
+            action, logp, action_clip = self._act(self.obs, self.obs_window, self.noise_processor)
+            with get_profiler().span("sampler.env_step"):
+                result = self.env.step(action_clip)
+            return self._vector_transition(self, action, logp, result)
+
+        action, logp, action_clip = self._act(self.obs, self.obs_window, self.noise_processor)
+        info_columns = self.info
+        with get_profiler().span("sampler.env_step"):
+            next_obs, reward, done, next_info = self.env.step(action_clip)
+
+        # TODO: deprecate this after changing to gymnasium
+        if "TimeLimit.truncated" not in next_info.keys():
+            next_info["TimeLimit.truncated"] = False
+        if next_info["TimeLimit.truncated"]:
+            done = False
+        next_info_columns = self._info_columns(next_info)
+
+        step = {
+            "obs": np.expand_dims(self.obs, axis=0),
+            "act": np.expand_dims(action, axis=0),
+            "rew": np.array([self.reward_scale * reward]),
+            "done": np.array([done]),
+            "logp": np.expand_dims(logp, axis=0),
+            "time_limited": np.array([next_info["TimeLimit.truncated"]]),
+            "obs2": np.expand_dims(next_obs, axis=0),
+        }
+
+        self.obs = next_obs
+        self.info = next_info_columns
+        if done or next_info["TimeLimit.truncated"]:
+            self.obs, info = self.env.reset()
+            self.info = self._info_columns(info)
+        if self.obs_window is not None:
+            self.obs_window.push(self.obs[None], step["done"] | step["time_limited"])
+        if self.noise_processor is not None:
+            self.noise_processor.reset(step["done"] | step["time_limited"])
+
+        for k in self.info_keys:
+            step[k] = info_columns[k]
+            step["next_" + k] = next_info_columns[k]
+        return step
+
+    def _pipelined_step(self) -> dict:
+        """Step both halves once, choosing the actions of each half while the other one is stepping."""
+        first, second = self.halves
+        if first.pending is None:
+            self._step_async(first)
+        self._step_async(second)
+        first_step = self._step_wait(first)
+        # actions of the next step of the first half are chosen while the second half is stepping,
+        # but not beyond the batch, since the policy may be updated in between
+        self.pipeline_step += 1
+        if self.pipeline_step < self.horizon:
+            self._step_async(first)
+        second_step = self._step_wait(second)
+        return {k: concat_column([v, second_step[k]]) for k, v in first_step.items()}
+
+    def _step_async(self, half: EnvHalf) -> None:
+        half.pending = self._act(half.obs, half.obs_window, half.noise_processor)
+        half.env.step_async(half.pending[2])
+
+    def _step_wait(self, half: EnvHalf) -> dict:
+        action, logp, _ = half.pending
+        half.pending = None
+        with get_profiler().span("sampler.env_step_wait"):
+            result = half.env.step_wait()
+        return self._vector_transition(half, action, logp, result)
+
+    @profile("sampler.act")
+    def _act(self, obs: np.ndarray, obs_window: Optional[ObservationWindow], noise_processor=None) -> tuple:
+        """
+        Take action using behavior policy and the exploration noise of `noise_processor`,
+        returning the action, its log probability and the clipped action.
+        """
         if not self._is_vector:
             batch_obs = torch.from_numpy(
-                np.expand_dims(self.obs, axis=0).astype("float32")
+                np.expand_dims(obs, axis=0).astype("float32")
             )
         else:
-            batch_obs = torch.from_numpy(self.obs.astype("float32"))
-        logits = self.networks.policy(batch_obs)
-        action_distribution = self.networks.create_action_distributions(logits)
-        action, logp = action_distribution.sample()
+            batch_obs = torch.from_numpy(obs.astype("float32"))
+        if obs_window is not None:
+            batch_obs = torch.from_numpy(obs_window.get())
+        if self.inference_server is not None:
+            import ray
 
-        if self._is_vector:
-            action = action.detach().numpy()
-            logp = logp.detach().numpy()
+            action, logp = ray.get(self.inference_server.act.remote(batch_obs.numpy()))
         else:
-            action = action.detach()[0].numpy()
-            logp = logp.detach()[0].numpy()
+            logits = self.networks.policy(batch_obs)
+            action_distribution = self.networks.create_action_distributions(logits)
+            action, logp = action_distribution.sample()
+            action, logp = action.detach().numpy(), logp.detach().numpy()
 
-        if self.noise_params is not None:
-            action = self.noise_processor.sample(action)
+        # noise is applied to the batch of actions, one row per environment
+        if noise_processor is not None:
+            action = noise_processor.sample(action)
+
+        if not self._is_vector:
+            action, logp = action[0], logp[0]
         
         if self.action_type == "continu":
             action_clip = action.clip(
@@ -126,63 +395,59 @@ class BaseSampler(metaclass=ABCMeta):
             )
         else:
             action_clip = action
-        
-        # interact with environment
-        if self._is_vector:
-            curr_obs = self.obs.copy()
-            next_obs, reward, terminated, truncated, next_info = self.env.step(action_clip)
-            self.obs = next_obs.copy()
-            # For vector env, next_obs, reward, terminated, truncated, and next_info are batched data,
-            # and vector env will automatically reset the environment when terminated or truncated is True,
-            # So we need to get real final observation and info from next_info.
-
-            # Get real final observation
-            if "final_observation" in next_info.keys():
-                # get the index where next_info["_final_observation"] is True
-                index = np.where(next_info["_final_observation"])[0]
-                next_obs[index, :] = np.stack(next_info["final_observation"][index])
-                
-            
-            # convert a dict of batched data to a list of dicts of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            unbatched_infos = [dict(zip(next_info, t)) for t in zip(*next_info.values())]
-            
-            # Get real final info
-            if "final_info" in next_info.keys():
-                for i in index:
-                    unbatched_infos[i] = next_info["final_info"][i]
-
-            experiences = [Experience(*e) for e in zip(curr_obs, action, reward, terminated, self.info, next_obs, unbatched_infos, logp)]
+        return action, logp, action_clip
 
-            self.info = unbatched_infos
+    def _vector_transition(self, source, action: np.ndarray, logp: np.ndarray, result: tuple) -> dict:
+        """
+        Build the step columns of a vector env from the result of its step, and advance
+        the observations, info and observation window of `source` (the sampler or an `EnvHalf`).
+        """
+        curr_obs, info_columns = source.obs, source.info
+        next_obs, reward, terminated, truncated, next_info = result
+        source.obs = next_obs.copy()
+        # For vector env, next_obs, reward, terminated, truncated, and next_info are batched data,
+        # and vector env will automatically reset the environment when terminated or truncated is True,
+        # So we need to get real final observation and info from next_info.
+        next_info_columns = self._info_columns(next_info)
+        source.info = next_info_columns
 
-            return experiences
-            
-        else:
-            next_obs, reward, done, next_info = self.env.step(action_clip)
+        # Get real final observation and info
+        if "final_observation" in next_info.keys():
+            # get the index where next_info["_final_observation"] is True
+            index = np.where(next_info["_final_observation"])[0]
+            next_obs[index, :] = np.stack(next_info["final_observation"][index])
+            if "final_info" in next_info.keys() and self.info_keys:
+                next_info_columns = self._info_columns(next_info)
+                for i in index:
+                    for k in self.info_keys:
+                        next_info_columns[k][i] = next_info["final_info"][i][k]
 
-            # TODO: deprecate this after changing to gymnasium
-            if "TimeLimit.truncated" not in next_info.keys():
-                next_info["TimeLimit.truncated"] = False
-            if next_info["TimeLimit.truncated"]:
-                done = False
-        
-            experience = Experience(
-                obs=self.obs.copy(),
-                action=action,
-                reward=self.reward_scale * reward,
-                done=done,
-                info=self.info,
-                next_obs=next_obs.copy(),
-                next_info=next_info,
-                logp=logp,
-            )
-            
-            self.obs = next_obs
-            self.info = next_info
-            if done or next_info["TimeLimit.truncated"]:
-                self.obs, self.info = self.env.reset()
+        step = {
+            "obs": curr_obs,
+            "act": action,
+            "rew": reward,
+            "done": terminated,
+            "logp": logp,
+            "time_limited": truncated,
+            "obs2": next_obs,
+        }
+        for k in self.info_keys:
+            step[k] = info_columns[k]
+            step["next_" + k] = next_info_columns[k]
+        if source.obs_window is not None:
+            source.obs_window.push(source.obs, np.logical_or(terminated, truncated))
+        if source.noise_processor is not None:
+            source.noise_processor.reset(np.logical_or(terminated, truncated))
+        return step
 
-            return [experience]
+    def _info_columns(self, info: dict) -> dict:
+        """Batch additional info of all environments into columns, e.g. one `State` per key."""
+        if self._is_vector:
+            # async vector envs with shared memory return batched arrays and `State`s
+            return {
+                k: stack_column(list(info[k])) if getattr(info[k], "dtype", None) == object
+                else np.array(info[k]) if isinstance(info[k], np.ndarray)
+                else deepcopy(info[k])
+                for k in self.info_keys
+            }
+        return {k: stack_column([info[k]]) for k in self.info_keys}
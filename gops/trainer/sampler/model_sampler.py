@@ -0,0 +1,244 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Sampler rolling out a torch environment model for a batch of parallel states
+
+
+from dataclasses import fields, is_dataclass
+
+import numpy as np
+import torch
+
+from gops.create_pkg.create_env_model import create_env_model
+from gops.env.env_gen_ocp.pyth_base import ContextState, State
+from gops.trainer.buffer.replay_buffer import column_to_tensor, stack_column
+from gops.trainer.sampler.off_sampler import OffSampler
+from gops.utils.observation_window import ObservationWindow
+
+
+def tensor_to_column(value):
+    """Copy a batched tensor, or a `State` of batched tensors, into a numpy column."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy().copy()
+    values = []
+    for field in fields(value):
+        v = getattr(value, field.name)
+        values.append(tensor_to_column(v) if isinstance(v, torch.Tensor) or is_dataclass(v) else v)
+    return value.__class__(*values)
+
+
+def assign_rows(column, rows: torch.Tensor, value) -> None:
+    """Write `value` into the `rows` of a batched tensor or `State` column, keeping its dtypes."""
+    if isinstance(column, torch.Tensor):
+        column[rows] = value.to(column.dtype)
+        return
+    for field in fields(column):
+        v = getattr(column, field.name)
+        if isinstance(v, torch.Tensor) or is_dataclass(v):
+            assign_rows(v, rows, getattr(value, field.name))
+
+
+class ModelSampler(OffSampler):
+    """
+    Off-policy sampler stepping the environment model of `create_env_model` for a batch
+    of parallel states at once, instead of simulating environments one by one, as
+    `RPI.sample` does. Rows which terminate or reach max_episode_steps are reset in place,
+    and rollouts are returned in the replay format of `OffSampler`.
+
+    Initial states of all reset rows are drawn at once from the `init_space` of the
+    environment, its train_space in train mode. If the observation of the environment
+    is its state and it has no additional info, the drawn states are the observations;
+    otherwise each reset row is initialized by `reset(init_state=...)` of a single
+    environment, which also computes its additional info, e.g. reference trajectories.
+    Contexts of env_gen_ocp environments indexed by time only hold a finite reference window,
+    so, as in `TensorVectorEnv`, the reference of each reset row is computed for its whole
+    episode by `Context.rollout_reference`, and each step indexes the window of every row at
+    its episode step.
+
+    Args:
+        model_env_num (int, optional): Number of parallel states, which must divide
+            sample_batch_size. Defaults to sample_batch_size.
+    """
+
+    def __init__(
+        self,
+        sample_batch_size,
+        index=0,
+        noise_params=None,
+        **kwargs
+    ):
+        # a single environment is kept to compute initial observations and info
+        super().__init__(
+            sample_batch_size,
+            index,
+            noise_params,
+            **{**kwargs, "vector_env_num": None, "sampler_pipeline": False}
+        )
+        # sampler networks run on cpu, so does the model
+        self.env_model = create_env_model(**{**kwargs, "use_gpu": False})
+        self.num_envs = kwargs.get("model_env_num", sample_batch_size)
+        assert self.sample_batch_size % self.num_envs == 0, (
+            "sample_batch_size must be divisible by model_env_num"
+        )
+        self.horizon = self.sample_batch_size // self.num_envs
+        # actions of all parallel states are chosen at once
+        self._is_vector = True
+        self.info_specs = kwargs["additional_info"]
+
+        self.max_episode_steps = kwargs.get("max_episode_steps", None)
+        if self.max_episode_steps is None:
+            self.max_episode_steps = getattr(self.env.unwrapped, "max_episode_steps", None)
+        self.init_space = getattr(self.env.unwrapped, "init_space", None)
+        self.initial_distribution = getattr(self.env.unwrapped, "initial_distribution", "uniform")
+        self.generator = torch.Generator()
+        if kwargs.get("seed", None) is not None:
+            self.generator.manual_seed(kwargs["seed"] + index + 200)
+        else:
+            self.generator.seed()
+
+        # the drawn states are the observations if resetting to them returns them as is
+        self.obs_is_state = False
+        if self.init_space is not None and not self.info_keys:
+            init_state = self._sample_initial_states(1)[0].numpy()
+            obs, _ = self.env.reset(init_state=init_state)
+            self.obs_is_state = np.array_equal(np.asarray(obs, dtype=np.float32), init_state)
+
+        # reference of the whole episode of each row if the context is indexed by time
+        self.time_indexed = self._is_time_indexed()
+        if self.time_indexed and self.max_episode_steps is None:
+            raise ValueError("Model samplers need max_episode_steps for contexts indexed by time!")
+        self.rows = torch.arange(self.num_envs)
+        self.reference = None
+        self.obs, self.info, self.reference = self._initial_rows(self.num_envs)
+        self.step_per_episode = torch.zeros(self.num_envs, dtype=torch.long)
+        if self.obs_window is not None:
+            self.obs_window = ObservationWindow(self.obs_window.window.shape[1], self.obs.numpy())
+
+    def _sample_initial_states(self, n: int) -> torch.Tensor:
+        low, high = (torch.from_numpy(np.asarray(v, dtype=np.float32)) for v in self.init_space)
+        if self.initial_distribution == "uniform":
+            return low + (high - low) * torch.rand((n, len(low)), generator=self.generator)
+        elif self.initial_distribution == "normal":
+            mean, std = (low + high) / 2, (high - low) / 6
+            return mean + std * torch.randn((n, len(low)), generator=self.generator)
+        else:
+            raise ValueError(f"Invalid initial distribution: {self.initial_distribution}!")
+
+    def _initial_rows(self, n: int) -> tuple:
+        """
+        Initial observations and info of `n` parallel states, as tensors batched over states,
+        and the references of their whole episodes if the context is indexed by time.
+        """
+        init_states = self._sample_initial_states(n) if self.init_space is not None else None
+        if self.obs_is_state:
+            return init_states, {}, None
+        obs, infos, references = [], [], []
+        for i in range(n):
+            if init_states is None:
+                o, info = self.env.reset()
+            else:
+                o, info = self.env.reset(init_state=init_states[i].numpy())
+            if self.time_indexed:
+                reference = info["state"].context_state.reference
+                references.append(np.concatenate((
+                    reference,
+                    self.env.unwrapped.context.rollout_reference(self.max_episode_steps).astype(reference.dtype),
+                )))
+            obs.append(o)
+            infos.append(info)
+        info = {k: column_to_tensor(stack_column([info[k] for info in infos])) for k in self.info_keys}
+        reference = torch.from_numpy(np.stack(references)) if self.time_indexed else None
+        return torch.as_tensor(np.stack(obs), dtype=torch.float32), info, reference
+
+    def _is_time_indexed(self) -> bool:
+        state = self.info_specs.get("state", None) if "state" in self.info_keys else None
+        context_state = getattr(state, "context_state", None)
+        if context_state is None or np.asarray(context_state.reference).ndim < 2:
+            return False
+        if not hasattr(getattr(self.env.unwrapped, "context", None), "rollout_reference"):
+            raise NotImplementedError("Context of the environment indexed by time cannot be rolled out")
+        return True
+
+    def _index_reference(self, state: State) -> State:
+        """`state` whose reference is the window of the episode reference of each row at its episode step."""
+        window = self.reference.shape[1] - self.max_episode_steps
+        index = self.step_per_episode.unsqueeze(1) + torch.arange(window)
+        return State(
+            robot_state=state.robot_state,
+            context_state=ContextState(
+                reference=self.reference[self.rows.unsqueeze(1), index],
+                constraint=state.context_state.constraint,
+            ),
+        )
+
+    def _info_column(self, key: str, value):
+        column = tensor_to_column(value)
+        if isinstance(column, np.ndarray):
+            column = column.astype(self.info_specs[key]["dtype"])
+        return column
+
+    def _step(self) -> dict:
+        action, logp, action_clip = self._act(self.obs.numpy(), self.obs_window, self.noise_processor)
+        with torch.no_grad():
+            next_obs, reward, done, next_info = self.env_model.forward(
+                self.obs,
+                torch.from_numpy(action_clip.astype(np.float32)),
+                torch.zeros(self.num_envs, dtype=torch.bool),
+                self.info,
+            )
+        done = done.reshape(-1).bool()
+        self.step_per_episode += 1
+        if self.time_indexed:
+            next_info["state"] = self._index_reference(next_info["state"])
+        if self.max_episode_steps is not None:
+            # consistent with the TimeLimit wrapper, termination takes precedence over truncation
+            truncated = (self.step_per_episode >= self.max_episode_steps) & ~done
+        else:
+            truncated = torch.zeros_like(done)
+
+        step = {
+            "obs": self.obs.numpy().copy(),
+            "act": action,
+            "rew": self.reward_scale * reward.reshape(-1).numpy(),
+            "done": done.numpy(),
+            "logp": logp,
+            "time_limited": truncated.numpy(),
+            "obs2": next_obs.numpy().copy(),
+        }
+        for k in self.info_keys:
+            step[k] = self._info_column(k, self.info[k])
+            step["next_" + k] = self._info_column(k, next_info[k])
+
+        self.obs = next_obs.to(torch.float32, copy=True)
+        self.info = {k: next_info[k] for k in self.info_keys}
+        reset = done | truncated
+        if reset.any():
+            obs, info, reference = self._initial_rows(int(reset.sum()))
+            self.obs[reset] = obs
+            for k in self.info_keys:
+                assign_rows(self.info[k], reset, info[k])
+            if self.time_indexed:
+                self.reference[reset] = reference
+            self.step_per_episode[reset] = 0
+        if self.obs_window is not None:
+            self.obs_window.push(self.obs.numpy(), reset.numpy())
+        if self.noise_processor is not None:
+            self.noise_processor.reset(reset.numpy())
+        return step
+
+    def checkpoint_state(self) -> dict:
+        state = super().checkpoint_state()
+        state["generator_state"] = self.generator.get_state()
+        return state
+
+    def load_checkpoint_state(self, state: dict) -> None:
+        super().load_checkpoint_state(state)
+        self.generator.set_state(state["generator_state"])
+
+    def _episode_attributes(self) -> tuple:
+        return super()._episode_attributes() + ("step_per_episode", "reference")
@@ -12,9 +12,7 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
-
-from gops.trainer.sampler.base import BaseSampler, Experience
+from gops.trainer.sampler.base import BaseSampler, ExperienceBatch, allocate_rollout, group_by_env
 
 
 class OffSampler(BaseSampler):
@@ -31,10 +29,16 @@ class OffSampler(BaseSampler):
             noise_params,
             **kwargs
         )
-    
-    def _sample(self) -> List[Experience]:
-        batch_data = []
-        for _ in range(self.horizon):
-            experiences = self._step()
-            batch_data.extend(experiences)
-        return batch_data
\ No newline at end of file
+        # (horizon, num_envs, ...) storage of each column, allocated at the first step
+        self.rollout = None
+
+    def _sample(self) -> ExperienceBatch:
+        for t in range(self.horizon):
+            step = self._step()
+            if self.rollout is None:
+                self.rollout = {k: allocate_rollout(v, self.horizon) for k, v in step.items()}
+            for k, v in step.items():
+                self.rollout[k][t] = v
+        # group transitions by environment, so that consecutive transitions
+        # continue each other (used by compact and sequence buffer storage)
+        return ExperienceBatch({k: group_by_env(v) for k, v in self.rollout.items()})
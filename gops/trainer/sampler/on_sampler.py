@@ -13,12 +13,10 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
-
 import numpy as np
 import torch
 
-from gops.trainer.sampler.base import BaseSampler, Experience
+from gops.trainer.sampler.base import BaseSampler
 
 
 class OnSampler(BaseSampler):
@@ -37,7 +35,7 @@ class OnSampler(BaseSampler):
         )
         
         alg_name = kwargs["algorithm"]
-        self.gamma = 0.99  #? why hard-coded?
+        self.gamma = kwargs.get("gamma", 0.99)
         if self._is_vector:
             self.obs_dim = self.env.single_observation_space.shape
             self.act_dim = self.env.single_action_space.shape
@@ -57,12 +55,13 @@ class OnSampler(BaseSampler):
         self.mb_logp = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
         self.need_value_flag = not (alg_name == "FHADP" or alg_name == "INFADP")
         if self.need_value_flag:
-            self.gae_lambda = 0.95
+            self.gae_lambda = kwargs.get("gae_lambda", 0.95)
             self.mb_val = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
+            # value of next observations where a trajectory segment ends
+            self.mb_last_val = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
             self.mb_adv = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
             self.mb_ret = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
         self.mb_info = {}
-        self.info_keys = kwargs["additional_info"].keys()
         for k, v in kwargs["additional_info"].items():
             self.mb_info[k] = np.zeros(
                 (self.num_envs, self.horizon, *v["shape"]), dtype=v["dtype"]
@@ -72,19 +71,12 @@ class OnSampler(BaseSampler):
             )
 
     def _sample(self) -> dict:
-        self.ptr = np.zeros(self.num_envs, dtype=np.int32)
-        self.last_ptr = np.zeros(self.num_envs, dtype=np.int32)
         for t in range(self.horizon):
-            # batch_obs has shape (num_envs, obs_dim)
-            if not self._is_vector:
-                batch_obs = torch.from_numpy(
-                    np.expand_dims(self.obs, axis=0).astype("float32")
-                )
-            else:
-                batch_obs = torch.from_numpy(self.obs.astype("float32"))
             # interact with environment
-            experiences = self._step()
-            self._process_experiences(experiences, batch_obs, t)
+            step = self._step()
+            self._process_step(step, t)
+        if self.need_value_flag:
+            self._compute_gae()
 
         # wrap collected data into replay format
         mb_data = {
@@ -107,81 +99,46 @@ class OnSampler(BaseSampler):
     def sample_with_replay_format(self):
         return self.sample()
 
-    def _process_experiences(
-        self, 
-        experiences: List[Experience],
-        batch_obs: np.ndarray, 
+    def _process_step(
+        self,
+        step: dict,
         t: int
     ):
         if self.need_value_flag:
-            value = self.networks.value(batch_obs).detach()
-            self.mb_val[:, t] = value
-        
-        for i in np.arange(self.num_envs):
-            (
-                obs, 
-                action, 
-                reward, 
-                done, 
-                info, 
-                next_obs, 
-                next_info, 
-                logp,
-            ) = experiences[i]
-
-            (
-                self.mb_obs[i, t, ...],
-                self.mb_act[i, t, ...],
-                self.mb_rew[i, t],
-                self.mb_done[i, t],
-                self.mb_tlim[i, t],
-                self.mb_logp[i, t],
-            ) = (
-                obs,
-                action,
-                reward,
-                done,
-                next_info["TimeLimit.truncated"],
-                logp,
-            )
+            # batch_obs has shape (num_envs, obs_dim)
+            batch_obs = torch.from_numpy(step["obs"].astype("float32"))
+            self.mb_val[:, t] = self.networks.value(batch_obs).detach()
 
-            for key in self.info_keys:
-                self.mb_info[key][i, t] = info[key]
-                self.mb_info["next_" + key][i, t] = next_info[key]
+        self.mb_obs[:, t] = step["obs"]
+        self.mb_act[:, t] = step["act"]
+        self.mb_rew[:, t] = step["rew"]
+        self.mb_done[:, t] = step["done"]
+        self.mb_tlim[:, t] = step["time_limited"]
+        self.mb_logp[:, t] = step["logp"]
+        for key in self.info_keys:
+            self.mb_info[key][:, t] = step[key]
+            self.mb_info["next_" + key][:, t] = step["next_" + key]
 
-            # calculate value target (mb_ret) & gae (mb_adv)
-            if (
-                done
-                or next_info["TimeLimit.truncated"]
-                or t == self.horizon - 1
-            ) and self.need_value_flag:
-                last_obs_expand = torch.from_numpy(
-                    np.expand_dims(next_obs, axis=0).astype("float32")
-                )
-                est_last_value = self.networks.value(
-                    last_obs_expand
-                ).detach().item() * (1 - done)
-                self.ptr[i] = t
-                self._finish_trajs(i, est_last_value)
-                self.last_ptr[i] = self.ptr[i]
+        if not self.need_value_flag:
+            return
+        # bootstrap values of all segments ending at this step in one batch
+        seg_end = self.mb_done[:, t] | self.mb_tlim[:, t]
+        if t == self.horizon - 1:
+            seg_end[:] = True
+        if seg_end.any():
+            last_obs = torch.from_numpy(step["obs2"][seg_end].astype("float32"))
+            self.mb_last_val[seg_end, t] = self.networks.value(last_obs).detach().numpy()
 
-    def _finish_trajs(self, env_index: int, est_last_val: float):
-        # calculate value target (mb_ret) & gae (mb_adv) whenever episode is finished
-        path_slice = slice(self.last_ptr[env_index], self.ptr[env_index] + 1)
-        value_preds_slice = np.append(self.mb_val[env_index, path_slice], est_last_val)
-        rews_slice = self.mb_rew[env_index, path_slice]
-        length = len(rews_slice)
-        ret = np.zeros(length)
-        adv = np.zeros(length)
-        gae = 0.0
-        for i in reversed(range(length)):
-            delta = (
-                rews_slice[i]
-                + self.gamma * value_preds_slice[i + 1]
-                - value_preds_slice[i]
-            )
-            gae = delta + self.gamma * self.gae_lambda * gae
-            ret[i] = gae + value_preds_slice[i]
-            adv[i] = gae
-        self.mb_ret[env_index, path_slice] = ret
-        self.mb_adv[env_index, path_slice] = adv
+    def _compute_gae(self):
+        # calculate value target (mb_ret) & gae (mb_adv) of all envs with one reverse scan over time
+        seg_end = self.mb_done | self.mb_tlim
+        seg_end[:, -1] = True
+        next_val = np.where(seg_end, self.mb_last_val, np.roll(self.mb_val, -1, axis=1))
+        next_val = np.where(self.mb_done, 0.0, next_val)
+        delta = self.mb_rew + self.gamma * next_val - self.mb_val
+        discount = np.where(seg_end, 0.0, self.gamma * self.gae_lambda)
+        gae = np.zeros(self.num_envs, dtype=np.float32)
+        for t in reversed(range(self.horizon)):
+            gae = delta[:, t] + discount[:, t] * gae
+            self.mb_adv[:, t] = gae
+        self.mb_ret[:] = self.mb_adv + self.mb_val
@@ -0,0 +1,201 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Training checkpoints written in a background thread, and resuming from them
+
+__all__ = [
+    "CheckpointWriter",
+    "checkpoint_dir",
+    "find_checkpoint",
+    "get_rng_state",
+    "load_checkpoint",
+    "set_rng_state",
+    "snapshot",
+    "wait_remote_buffer_save",
+]
+
+import copy
+import copyreg
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+import numpy as np
+import torch
+
+# file of a checkpoint directory holding the trainer state, written last, so that
+# directories without it are incomplete
+TRAINER_FILE = "trainer.pt"
+CHECKPOINT_FOLDER = "checkpoint"
+_CHECKPOINT_PATTERN = re.compile(r"^iteration_(\d+)$")
+
+
+def _reduce_generator(generator):
+    return type(generator), (generator.bit_generator,)
+
+
+try:
+    from gym.utils.seeding import RandomNumberGenerator
+except ImportError:
+    pass
+else:
+    # the random generators of gym environments pickle, but cannot be unpickled
+    copyreg.pickle(RandomNumberGenerator, _reduce_generator)
+
+
+def checkpoint_dir(save_folder: str, iteration: int) -> str:
+    """Directory of the checkpoint of `iteration` in the training results folder `save_folder`."""
+    return os.path.join(save_folder, CHECKPOINT_FOLDER, "iteration_{}".format(iteration))
+
+
+def _complete_checkpoints(folder: str) -> list:
+    """Complete checkpoint directories in `folder`, sorted by iteration."""
+    if not os.path.isdir(folder):
+        return []
+    checkpoints = []
+    for name in os.listdir(folder):
+        match = _CHECKPOINT_PATTERN.match(name)
+        if match and os.path.isfile(os.path.join(folder, name, TRAINER_FILE)):
+            checkpoints.append((int(match.group(1)), os.path.join(folder, name)))
+    return [path for _, path in sorted(checkpoints)]
+
+
+def find_checkpoint(path: str) -> str:
+    """
+    Checkpoint directory of `path`, which is either a checkpoint directory, a folder of
+    checkpoint directories or a training results folder, whose latest complete checkpoint is taken.
+    """
+    if os.path.isfile(os.path.join(path, TRAINER_FILE)):
+        return path
+    for folder in (path, os.path.join(path, CHECKPOINT_FOLDER)):
+        checkpoints = _complete_checkpoints(folder)
+        if checkpoints:
+            return checkpoints[-1]
+    raise FileNotFoundError("No complete checkpoint found in {}".format(path))
+
+
+def load_checkpoint(path: str, trainer: Optional[str] = None) -> Tuple[dict, str]:
+    """
+    Trainer state and directory of the checkpoint of `path`, see `find_checkpoint`, checking
+    that it was saved by the trainer class `trainer`.
+    """
+    path = find_checkpoint(path)
+    trainer_file = os.path.join(path, TRAINER_FILE)
+    try:
+        # checkpoints hold random states and pickled environments besides tensors
+        state = torch.load(trainer_file, map_location="cpu", weights_only=False)
+    except TypeError:
+        # torch < 1.13 has no weights_only argument
+        state = torch.load(trainer_file, map_location="cpu")
+    if trainer is not None and state["trainer"] != trainer:
+        raise ValueError("Checkpoint {} of {} cannot be resumed by {}".format(path, state["trainer"], trainer))
+    print("Resume training from checkpoint {} at iteration {}".format(path, state["iteration"]))
+    return state, path
+
+
+def get_rng_state() -> dict:
+    """States of the random streams of Python, NumPy and torch of the current process."""
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict) -> None:
+    """Restore the random streams saved by `get_rng_state`."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def snapshot(state):
+    """
+    Copy of `state` which later training does not modify, with tensors copied to CPU,
+    so that it can be written while training goes on.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return type(state)((k, snapshot(v)) for k, v in state.items())
+    if isinstance(state, (list, tuple)) and not hasattr(state, "_fields"):
+        return type(state)(snapshot(v) for v in state)
+    return copy.deepcopy(state)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in a background thread, so that training goes on while large
+    checkpoints are written. One checkpoint is written at a time, `write` first waits for
+    the previous one, and errors of writing are raised by the next `write` or `wait`.
+
+    Each checkpoint is a directory holding the trainer state in trainer.pt, which is written
+    last, after the buffers saved into the directory by their own processes are complete.
+
+    Args:
+        max_to_keep (int, optional): Number of latest checkpoints kept in the checkpoint
+            folder, older ones are deleted, or None to keep all. Defaults to 2.
+    """
+
+    def __init__(self, max_to_keep: Optional[int] = 2):
+        self.max_to_keep = max_to_keep
+        self._thread = None
+        self._error = None
+
+    def write(self, path: str, state: dict, wait_fns: Iterable[Callable[[], None]] = ()) -> None:
+        """
+        Write `state`, which must not be modified afterwards, see `snapshot`, into checkpoint
+        directory `path`, once `wait_fns`, e.g. waiting for buffers being saved, return.
+        """
+        self.wait()
+        os.makedirs(path, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._write, args=(path, state, list(wait_fns)), name="checkpoint_writer", daemon=True
+        )
+        self._thread.start()
+
+    def wait(self) -> None:
+        """Wait until the checkpoint being written is complete."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing checkpoint failed") from error
+
+    def _write(self, path: str, state: dict, wait_fns: list) -> None:
+        try:
+            for wait_fn in wait_fns:
+                wait_fn()
+            tmp_file = os.path.join(path, TRAINER_FILE + ".tmp")
+            torch.save(state, tmp_file)
+            os.replace(tmp_file, os.path.join(path, TRAINER_FILE))
+            if self.max_to_keep is not None:
+                checkpoints = _complete_checkpoints(os.path.dirname(os.path.normpath(path)))
+                for old_path in checkpoints[:-self.max_to_keep]:
+                    if os.path.normpath(old_path) != os.path.normpath(path):
+                        shutil.rmtree(old_path, ignore_errors=True)
+        except BaseException as e:
+            self._error = e
+
+
+def wait_remote_buffer_save(buffer, poll_interval: float = 0.1) -> None:
+    """Wait until the non-blocking `save` of the buffer actor `buffer` is complete."""
+    import ray
+
+    while not ray.get(buffer.save_finished.remote()):
+        time.sleep(poll_interval)
@@ -60,6 +60,9 @@ def get_apprfunc_dict(key: str, **kwargs):
     var["apprfunc"] = kwargs[key + "_func_type"]
     var["name"] = kwargs[key + "_func_name"]
     var["obs_dim"] = kwargs["obsv_dim"]
+    if kwargs[key + "_func_type"] == "RNN" and kwargs.get("seq_len", None) is not None:
+        # single-step observations are fed to RNN in windows, see SequenceReplayBuffer
+        var["obs_dim"] = (kwargs["seq_len"], kwargs["obsv_dim"])
     var["min_log_std"] = kwargs.get(key + "_min_log_std", float("-20"))
     var["max_log_std"] = kwargs.get(key + "_max_log_std", float("2"))
     var["std_type"] = kwargs.get(key + "_std_type", "mlp_shared")
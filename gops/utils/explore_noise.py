@@ -10,6 +10,8 @@
 #  Update Date: 2021-03-10, Yuhang Zhang: Revise Codes
 
 
+from abc import ABCMeta, abstractmethod
+
 import numpy as np
 
 
@@ -41,22 +43,135 @@ class EpsilonScheduler:
             return np.random.randint(action_num)
 
 
-class EpsilonGreedy:
-    def __init__(self, epsilon, action_num):
-        self.epsilon = epsilon
+class NoiseProcess(metaclass=ABCMeta):
+    """
+    Base class of exploration noise processes, applied to a batch of actions of shape
+    (num_envs, ...) in one call. Processes with a state keep one state per environment,
+    which `reset` restarts at episode boundaries. Random numbers are drawn from a seeded
+    `np.random.Generator`, so that samplers seeded with their index draw independent streams.
+
+    The scale of the noise (std, sigma or epsilon) may be annealed from its initial value
+    to `scale_end` as the number of collected samples, set by `set_total_sample_number`, grows.
+
+    Args:
+        scale_end (float, optional): Final scale of the noise. Defaults to no annealing.
+        anneal_samples (int, optional): Number of collected samples over which the scale
+            is annealed linearly, or time constant of the exponential decay.
+        anneal_type (str, optional): "linear" or "exp", the decay of `EpsilonScheduler`.
+            Defaults to "linear".
+        seed (optional): Seed of the random number generator.
+    """
+
+    def __init__(self, scale, scale_end=None, anneal_samples=None, anneal_type="linear", seed=None):
+        self.scale_start = scale
+        self.scale = scale
+        self.scale_end = scale_end
+        self.anneal_samples = anneal_samples
+        self.anneal_type = anneal_type
+        if scale_end is not None and anneal_samples is None:
+            raise ValueError("Annealing the noise scale requires anneal_samples")
+        if anneal_type not in ("linear", "exp"):
+            raise ValueError(f"Invalid anneal_type: {anneal_type}!")
+        self.rng = np.random.default_rng(seed)
+
+    def set_total_sample_number(self, total_sample_number: int) -> None:
+        if self.scale_end is None:
+            return
+        if self.anneal_type == "linear":
+            progress = min(total_sample_number / self.anneal_samples, 1.0)
+            self.scale = self.scale_start + (self.scale_end - self.scale_start) * progress
+        else:
+            decay = np.exp(-total_sample_number / self.anneal_samples)
+            self.scale = self.scale_end + (self.scale_start - self.scale_end) * decay
+
+    def reset(self, mask: np.ndarray) -> None:
+        """Restart the state of the environments where `mask` is True."""
+        pass
+
+    @abstractmethod
+    def sample(self, action: np.ndarray) -> np.ndarray:
+        pass
+
+
+class EpsilonGreedy(NoiseProcess):
+    """Replace the action of each environment by a uniformly random one with probability epsilon."""
+
+    def __init__(self, epsilon, action_num, **kwargs):
+        super().__init__(epsilon, **kwargs)
         self.action_num = action_num
 
+    @property
+    def epsilon(self):
+        return self.scale
+
     def sample(self, action):
-        if np.random.random() > self.epsilon:
-            return action
-        else:
-            return np.array(np.random.randint(self.action_num))
+        action = np.asarray(action)
+        explore = self.rng.random(action.shape) < self.scale
+        random_action = self.rng.integers(self.action_num, size=action.shape)
+        return np.where(explore, random_action, action).astype(action.dtype)
 
 
-class GaussNoise:
-    def __init__(self, mean, std):
+class GaussNoise(NoiseProcess):
+    """Add independent Gaussian noise to the action of each environment."""
+
+    def __init__(self, mean, std, **kwargs):
+        super().__init__(std, **kwargs)
+        self.mean = mean
+
+    @property
+    def std(self):
+        return self.scale
+
+    def sample(self, action):
+        action = np.asarray(action)
+        noise = self.rng.normal(self.mean, self.scale, size=action.shape)
+        return (action + noise).astype(action.dtype)
+
+
+class OrnsteinUhlenbeckNoise(NoiseProcess):
+    """
+    Add temporally correlated noise following an Ornstein-Uhlenbeck process
+    dx = theta * (mean - x) * dt + sigma * sqrt(dt) * dW, with one state per environment,
+    which starts from zero at the beginning of each episode.
+    """
+
+    def __init__(self, mean=0.0, sigma=0.2, theta=0.15, dt=1e-2, **kwargs):
+        super().__init__(sigma, **kwargs)
         self.mean = mean
-        self.std = std
+        self.theta = theta
+        self.dt = dt
+        self.state = None
+
+    @property
+    def sigma(self):
+        return self.scale
+
+    def reset(self, mask):
+        if self.state is not None:
+            self.state[np.asarray(mask, dtype=bool)] = 0.0
 
     def sample(self, action):
-        return action + np.random.normal(self.mean, self.std)
+        action = np.asarray(action)
+        if self.state is None or self.state.shape != action.shape:
+            self.state = np.zeros(action.shape)
+        self.state = (
+            self.state
+            + self.theta * (self.mean - self.state) * self.dt
+            + self.scale * np.sqrt(self.dt) * self.rng.standard_normal(action.shape)
+        )
+        return (action + self.state).astype(action.dtype)
+
+
+def create_noise_process(action_type: str, noise_type: str = None, seed=None, **noise_params) -> NoiseProcess:
+    """
+    Create the exploration noise of `noise_params`, EpsilonGreedy for discrete actions,
+    GaussNoise or, with noise_type "ou", OrnsteinUhlenbeckNoise for continuous actions.
+    """
+    if action_type == "discret":
+        return EpsilonGreedy(seed=seed, **noise_params)
+    if noise_type is None or noise_type == "gauss":
+        return GaussNoise(seed=seed, **noise_params)
+    elif noise_type == "ou":
+        return OrnsteinUhlenbeckNoise(seed=seed, **noise_params)
+    else:
+        raise ValueError(f"Invalid noise_type: {noise_type}!")
@@ -69,6 +69,10 @@ def init_args(env, **args):
     else:
         args["obsv_dim"] = env.observation_space.shape
 
+    if isinstance(env.observation_space, (Box, GymnasiumBox)):
+        args["obsv_high_limit"] = env.observation_space.high.astype("float32")
+        args["obsv_low_limit"] = env.observation_space.low.astype("float32")
+
     if isinstance(env.action_space, (Box, GymnasiumBox)):
         # get dimension of continuous action or num of discrete action
         args["action_type"] = "continu"
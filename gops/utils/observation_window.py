@@ -0,0 +1,37 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Rolling observation window for recurrent policies
+
+
+import numpy as np
+
+
+class ObservationWindow:
+    """
+    Last `seq_len` observations of a batch of environments, the input of RNN
+    approximate functions. Steps before the start of an episode repeat its first
+    observation, consistent with windows sampled by `SequenceReplayBuffer`.
+
+    Args:
+        seq_len (int): Length of the window.
+        obs (np.ndarray): First observations, of shape (num_envs, obsv_dim).
+    """
+
+    def __init__(self, seq_len: int, obs: np.ndarray):
+        self.window = np.repeat(obs[:, None].astype(np.float32), seq_len, axis=1)
+
+    def push(self, obs: np.ndarray, reset: np.ndarray) -> None:
+        """Append the latest observations, restarting the windows where `reset` is True."""
+        self.window[:, :-1] = self.window[:, 1:]
+        self.window[:, -1] = obs
+        if reset.any():
+            self.window[reset] = obs[reset][:, None]
+
+    def get(self) -> np.ndarray:
+        return self.window
@@ -43,6 +43,7 @@ class TaskPool(object):
     @property
     def completed_num(self):
         pending = list(self._tasks)
+        ready = []
         if pending:
             ready, _ = ray.wait(pending, num_returns=len(pending), timeout=0)
         return len(ready)
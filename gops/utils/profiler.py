@@ -0,0 +1,303 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Per-stage wall-time profiler of trainers, samplers, buffers and evaluator
+
+__all__ = ["Profiler", "configure_profiler", "get_profiler", "profile", "write_profile"]
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+ITERATION = "iteration"
+
+# shared no-op span returned while profiling is disabled
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._stack().append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        stack = self.profiler._stack()
+        stack.pop()
+        self.profiler._record(self.name, self.start, end, stack)
+        return False
+
+
+class _StageStats:
+    """Count and total time of a stage, and a uniform reservoir of its times for histograms."""
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = []
+
+    def add(self, duration: float, max_samples: int, rng: random.Random) -> None:
+        self.count += 1
+        self.total += duration
+        if len(self.samples) < max_samples:
+            self.samples.append(duration)
+        else:
+            i = rng.randrange(self.count)
+            if i < max_samples:
+                self.samples[i] = duration
+
+    def __getstate__(self):
+        return self.count, self.total, self.samples
+
+    def __setstate__(self, state):
+        self.count, self.total, self.samples = state
+
+
+class Profiler:
+    """
+    Wall-time profiler of named stages. Stages are timed by `span` context managers or
+    `profile` decorators, which return a shared no-op context manager while profiling is
+    disabled. `pop_tb_dict` and `add_to_writer` report the time of each stage since
+    the last report, and the share of the trainer iterations, timed by the
+    `iteration` span, which goes to each stage directly nested in them, i.e. the
+    breakdown of the critical path of the trainer process. Spans of all threads are
+    optionally kept as a Chrome trace, which can be opened in chrome://tracing or Perfetto.
+
+    Each process has its own profiler, see `get_profiler`. Only the count, total time and
+    a bounded sample of the times of each stage are kept between reports. Profiles of remote
+    samplers, buffers and evaluators are written to their own trace files, and popped by
+    the trainer with `add_remote_to_writer`.
+
+    Args:
+        enabled (bool, optional): Time the spans. Defaults to False.
+        trace_path (str, optional): File the Chrome trace is written to by `save_trace`,
+            or None to not keep the trace. Defaults to None.
+        max_trace_events (int, optional): Maximum number of spans kept in the trace,
+            later spans are dropped. Defaults to 1000000.
+        max_samples (int, optional): Number of times of each stage kept for the histograms
+            between reports, sampled uniformly. Defaults to 10000.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        trace_path: Optional[str] = None,
+        max_trace_events: int = 1000000,
+        max_samples: int = 10000,
+    ):
+        self.enabled = False
+        self.trace_path = None
+        self.max_trace_events = max_trace_events
+        self.max_samples = max_samples
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # own random stream, so that profiling does not change the random streams of training
+        self._rng = random.Random(0)
+        self._durations: Dict[str, _StageStats] = defaultdict(_StageStats)
+        self._breakdown: Dict[str, float] = defaultdict(float)
+        self._iteration_time = 0.0
+        self._trace_events = []
+        self._dropped_events = 0
+        # pending profiles popped from remote actors, by tensorboard prefix
+        self._remote_profiles = {}
+        # wall clock of perf_counter zero, so that traces of several processes align
+        self._wall_offset = time.time() - time.perf_counter()
+        self.configure(enabled, trace_path)
+
+    def configure(self, enabled: bool, trace_path: Optional[str] = None) -> None:
+        self.enabled = enabled
+        self.trace_path = trace_path if enabled else None
+
+    def span(self, name: str):
+        """Context manager timing the stage `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def iteration(self):
+        """Context manager timing one trainer iteration, whose nested stages are broken down."""
+        return self.span(ITERATION)
+
+    def profile(self, name: Optional[str] = None) -> Callable:
+        """Decorator timing each call of a function as the stage `name`, or its qualified name."""
+
+        def decorator(func: Callable) -> Callable:
+            stage = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def pop_tb_dict(self) -> dict:
+        """Mean time of each stage and critical path shares since the last call, as tensorboard scalars."""
+        return self._tb_dict(*self._pop())
+
+    def add_to_writer(self, writer, step: int) -> None:
+        """Write wall-time histograms, mean times and critical path shares since the last call."""
+        if not self.enabled:
+            return
+        write_profile(writer, step, self.pop_profile())
+
+    def pop_profile(self) -> tuple:
+        """Stages timed since the last call, to be written by `write_profile`, e.g. in another process."""
+        return self._pop()
+
+    def add_remote_to_writer(self, writer, step: int, actors: Dict[str, object]) -> None:
+        """
+        Write the profiles of Ray actors having a `pop_profile` method, e.g. remote samplers,
+        buffers and evaluators, each under its tensorboard prefix in `actors`. Profiles are
+        requested without waiting for busy actors, and written by the first call after they arrive.
+        """
+        if not self.enabled or not actors:
+            return
+        import ray
+
+        for prefix, actor in actors.items():
+            pending = self._remote_profiles.get(prefix, None)
+            if pending is not None:
+                ready, _ = ray.wait([pending], timeout=0)
+                if not ready:
+                    continue
+                write_profile(writer, step, ray.get(pending), prefix)
+            self._remote_profiles[prefix] = actor.pop_profile.remote()
+
+    def save_trace(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the spans recorded so far as a Chrome trace JSON file, returning its path."""
+        path = path or self.trace_path
+        if path is None:
+            return None
+        with self._lock:
+            events = list(self._trace_events)
+            dropped = self._dropped_events
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {"dropped_events": dropped},
+                },
+                f,
+            )
+        return path
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name: str, start: float, end: float, stack: list) -> None:
+        duration = end - start
+        with self._lock:
+            self._durations[name].add(duration, self.max_samples, self._rng)
+            if name == ITERATION:
+                self._iteration_time += duration
+            elif len(stack) == 1 and stack[0] == ITERATION:
+                self._breakdown[name] += duration
+            if self.trace_path is not None:
+                if len(self._trace_events) < self.max_trace_events:
+                    self._trace_events.append(
+                        {
+                            "name": name,
+                            "ph": "X",
+                            "ts": (start + self._wall_offset) * 1e6,
+                            "dur": duration * 1e6,
+                            "pid": os.getpid(),
+                            "tid": threading.get_ident(),
+                        }
+                    )
+                else:
+                    self._dropped_events += 1
+
+    @staticmethod
+    def _tb_dict(durations: dict, breakdown: dict, iteration_time: float) -> dict:
+        tb_info = {}
+        for name, stats in durations.items():
+            tb_info[f"Profile/{name} [ms]-RL iter"] = 1000 * stats.total / stats.count
+        if iteration_time > 0:
+            for name, value in breakdown.items():
+                tb_info[f"Profile critical path/{name} [%]-RL iter"] = 100 * value / iteration_time
+            other = max(iteration_time - sum(breakdown.values()), 0.0)
+            tb_info["Profile critical path/other [%]-RL iter"] = 100 * other / iteration_time
+        return tb_info
+
+    def _pop(self) -> tuple:
+        with self._lock:
+            popped = (dict(self._durations), dict(self._breakdown), self._iteration_time)
+            self._durations = defaultdict(_StageStats)
+            self._breakdown = defaultdict(float)
+            self._iteration_time = 0.0
+        return popped
+
+
+def write_profile(writer, step: int, profile: tuple, prefix: Optional[str] = None) -> None:
+    """Write a profile of `Profiler.pop_profile`, with stage names prefixed by `prefix`, e.g. the remote actor."""
+    durations, breakdown, iteration_time = profile
+    if prefix is not None:
+        durations = {f"{prefix}/{name}": stats for name, stats in durations.items()}
+        breakdown = {f"{prefix}/{name}": value for name, value in breakdown.items()}
+    for name, stats in durations.items():
+        writer.add_histogram(f"Profile/{name} [ms]", 1000 * np.asarray(stats.samples), step)
+    for key, value in Profiler._tb_dict(durations, breakdown, iteration_time).items():
+        writer.add_scalar(key, value, step)
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """Profiler of the current process."""
+    return _profiler
+
+
+def configure_profiler(**kwargs) -> Profiler:
+    """
+    Configure the profiler of the current process from trainer arguments: `profile`
+    enables it, and `profile_trace` additionally writes the Chrome trace of the process to
+    `save_folder`/profile/trace_<pid>.json, when the trainer finishes or the process exits.
+    """
+    enabled = kwargs.get("profile", False)
+    trace_path = None
+    if enabled and kwargs.get("profile_trace", False):
+        trace_path = os.path.join(
+            kwargs["save_folder"], "profile", "trace_{}.json".format(os.getpid())
+        )
+    if trace_path is not None and _profiler.trace_path is None:
+        atexit.register(_profiler.save_trace)
+    _profiler.configure(enabled, trace_path)
+    return _profiler
+
+
+def profile(name: Optional[str] = None) -> Callable:
+    """Decorator timing each call of a function as a stage of the profiler of the calling process."""
+    return _profiler.profile(name)
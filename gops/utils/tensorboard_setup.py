@@ -163,6 +163,17 @@ tb_tags = {
     "loss_critic": "Loss/Critic loss-RL iter",
     "alg_time": "Time/Algorithm time [ms]-RL iter",
     "sampler_time": "Time/Sampler time [ms]-RL iter",
+    "prefetch_queue_depth": "Time/Prefetch queue depth-RL iter",
+    "prefetch_stall_time": "Time/Prefetch stall time [ms]-RL iter",
+    "inference_latency_p50": "Inference/Action latency p50 [ms]-RL iter",
+    "inference_latency_p90": "Inference/Action latency p90 [ms]-RL iter",
+    "inference_latency_p99": "Inference/Action latency p99 [ms]-RL iter",
+    "inference_batch_size": "Inference/Forward batch size-RL iter",
+    "inference_throughput": "Inference/Throughput [actions per s]-RL iter",
+    "weight_sync_bytes": "Time/Weight sync [bytes per s]-RL iter",
+    "update_sample_ratio": "Train/Updates per sample-RL iter",
+    "sampler_blocked_time": "Time/Sampler blocked time [%]-RL iter",
+    "learner_blocked_time": "Time/Learner blocked time [%]-RL iter",
     "critic_avg_value": "Train/Critic avg value-RL iter",
     "lips_value": "Lipschitz/Lipschitz value - RL iter",
 }
@@ -0,0 +1,59 @@
+import json
+
+from gops.benchmark.__main__ import main
+from gops.benchmark.compare import compare
+from gops.benchmark.suite import measure, run_suite
+
+
+def _results(**values):
+    return {
+        "metadata": {"hostname": "host", "cpu_count": 8},
+        "results": {k: {"value": v, "unit": "steps/s"} for k, v in values.items()},
+    }
+
+
+def test_measure_counts_returned_units():
+    result = measure(lambda: 4, duration=0.01)
+    assert result["calls"] >= 1 and result["seconds"] >= 0.01
+    assert abs(result["value"] - 4 * result["calls"] / result["seconds"]) < 1e-6
+
+
+def test_compare_flags_regressions_and_missing():
+    baseline = _results(a=100.0, b=100.0, c=100.0, d=100.0)
+    candidate = _results(a=85.0, b=95.0, c=120.0)
+    candidate["results"]["e"] = {"error": "ModuleNotFoundError: No module named 'ray'"}
+    candidate["metadata"]["cpu_count"] = 4
+    comparison = compare(baseline, candidate, threshold=0.1)
+    assert comparison["regressions"] == ["a"]
+    assert comparison["improvements"] == ["c"]
+    assert comparison["missing"] == ["d", "e"]
+    assert comparison["benchmarks"]["b"]["status"] == "unchanged"
+    assert comparison["machine_mismatch"] == {"cpu_count": (8, 4)}
+
+
+def test_run_and_compare_entry_point(tmp_path):
+    output = tmp_path / "results.json"
+    assert main([
+        "run", "--suites", "env", "buffer", "--env_ids", "pyth_lq", "--buffers", "replay_buffer",
+        "--duration", "0.05", "--warmup", "0", "--output", str(output),
+    ]) == 0
+    with open(output) as f:
+        results = json.load(f)
+    assert results["metadata"]["cpu_count"] > 0 and results["metadata"]["torch"]
+    assert set(results["results"]) == {
+        "env/pyth_lq/data", "env/pyth_lq/model", "buffer/replay_buffer/insert", "buffer/replay_buffer/sample"
+    }
+    assert all(r["value"] > 0 for r in results["results"].values())
+
+    slower = dict(results, results={k: dict(v, value=v["value"] / 2) for k, v in results["results"].items()})
+    slower_path = tmp_path / "slower.json"
+    with open(slower_path, "w") as f:
+        json.dump(slower, f)
+    assert main(["compare", str(output), str(output)]) == 0
+    assert main(["compare", str(output), str(slower_path)]) == 1
+
+
+def test_failed_benchmark_is_recorded():
+    results = run_suite(suites=["env"], env_ids=["no_such_env"], duration=0.01, warmup=0, verbose=False)
+    assert set(results["results"]) == {"env/no_such_env/data", "env/no_such_env/model"}
+    assert all("error" in r for r in results["results"].values())
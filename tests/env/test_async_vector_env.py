@@ -0,0 +1,125 @@
+from functools import partial
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from gops.create_pkg.create_env import create_env
+from gops.env.vector.async_vector_env import AsyncVectorEnv
+
+
+@pytest.mark.parametrize("shared_memory", [True, False])
+def test_grouped_workers_match_one_env_per_worker(shared_memory):
+    single = create_env(env_id="pyth_veh3dofconti", vector_env_num=5, vector_env_type="async", gym2gymnasium=True)
+    # 5 environments in slices of 2, 2 and 1
+    grouped = AsyncVectorEnv(single.env_fns, shared_memory=shared_memory, envs_per_worker=2)
+    assert len(grouped.processes) == 3
+
+    single.seed(0)
+    grouped.seed(0)
+    obs, info = single.reset()
+    grouped_obs, grouped_info = grouped.reset()
+    np.testing.assert_array_equal(obs, grouped_obs)
+    # shared info arrays have the dtype declared by additional_info
+    np.testing.assert_allclose(np.stack(info["state"]), np.stack(grouped_info["state"]), rtol=1e-6)
+    rng = np.random.default_rng(0)
+    reset_num = 0
+    for _ in range(210):
+        action = rng.uniform(single.action_space.low, single.action_space.high).astype(np.float32)
+        obs, rew, terminated, truncated, info = single.step(action)
+        grouped_obs, grouped_rew, grouped_terminated, grouped_truncated, grouped_info = grouped.step(action)
+        np.testing.assert_array_equal(obs, grouped_obs)
+        np.testing.assert_array_equal(rew, grouped_rew)
+        np.testing.assert_array_equal(terminated, grouped_terminated)
+        np.testing.assert_array_equal(truncated, grouped_truncated)
+        reset_num += np.sum(terminated | truncated)
+    assert reset_num > 0
+    assert grouped.get_attr("max_episode_steps") == single.get_attr("max_episode_steps")
+    single.close()
+    grouped.close()
+
+
+def test_shared_channels_match_pipes_for_state_info():
+    from gops.env.env_gen_ocp.pyth_base import State
+
+    piped = create_env(env_id="veh3dof_tracking", vector_env_num=3, vector_env_type="async", gym2gymnasium=True)
+    piped.close()
+    piped = AsyncVectorEnv(piped.env_fns, shared_memory=False)
+    shared = AsyncVectorEnv(piped.env_fns, envs_per_worker=2, shared_info_probe=True)
+    # only declared and float info fields are shared, flags are sent through pipes
+    assert set(shared.channels.info_templates) >= {"state", "raw_action"}
+    assert "TimeLimit.truncated" not in shared.channels.info_templates
+
+    piped.seed(0)
+    shared.seed(0)
+    _, piped_info = piped.reset()
+    _, shared_info = shared.reset()
+    assert isinstance(shared_info["state"], State)
+    np.testing.assert_array_equal(
+        State.stack(list(piped_info["state"])).robot_state, shared_info["state"].robot_state
+    )
+    rng = np.random.default_rng(0)
+    final_num = 0
+    for _ in range(210):
+        action = rng.uniform(piped.action_space.low, piped.action_space.high).astype(np.float32)
+        piped_step = piped.step(action)
+        shared_step = shared.step(action)
+        for piped_value, shared_value in zip(piped_step[:4], shared_step[:4]):
+            np.testing.assert_array_equal(piped_value, shared_value)
+        piped_info, shared_info = piped_step[4], shared_step[4]
+        piped_state = State.stack(list(piped_info["state"]))
+        np.testing.assert_array_equal(piped_state.robot_state, shared_info["state"].robot_state)
+        np.testing.assert_array_equal(
+            piped_state.context_state.reference, shared_info["state"].context_state.reference
+        )
+        # rows reset after the end of an episode have no raw_action
+        mask = shared_info["_raw_action"]
+        np.testing.assert_array_equal(piped_info["_raw_action"], mask)
+        np.testing.assert_array_equal(np.stack(piped_info["raw_action"][mask]), shared_info["raw_action"][mask])
+        # info of the final step of an episode is sent through pipes
+        np.testing.assert_array_equal(piped_info.get("_final_info"), shared_info.get("_final_info"))
+        final_num += np.sum(shared_info.get("_final_info", 0))
+    assert final_num > 0
+    piped.close()
+    shared.close()
+
+
+class DistanceEnv(gym.Env):
+    """Environment whose info fields change their dtype and shape during an episode."""
+
+    observation_space = gym.spaces.Box(-1.0, 1.0, (2,), np.float32)
+    action_space = gym.spaces.Box(-1.0, 1.0, (1,), np.float32)
+    additional_info = {"dist": {"shape": (), "dtype": np.int64}}
+
+    def __init__(self, dist):
+        self.dist = dist
+
+    def reset(self, *, seed=None, options=None):
+        self.step_num = 0
+        return np.zeros(2, np.float32), {"dist": 0, "gap": 0.0}
+
+    def step(self, action):
+        self.step_num += 1
+        info = {"dist": self.dist, "gap": 0.5 if self.step_num < 2 else np.ones(3)}
+        return np.zeros(2, np.float32), 0.0, False, False, info
+
+
+@pytest.mark.parametrize("shared_info_probe", [True, False])
+def test_shared_info_of_varying_dtype_and_shape_matches_pipes(shared_info_probe):
+    env_fns = [partial(DistanceEnv, 2.75), partial(DistanceEnv, 2)]
+    piped = AsyncVectorEnv(env_fns, shared_memory=False)
+    shared = AsyncVectorEnv(env_fns, shared_info_probe=shared_info_probe)
+    assert ("gap" in shared.channels.info_templates) == shared_info_probe
+
+    action = np.zeros((2, 1), np.float32)
+    for piped_info, shared_info in [(piped.reset()[1], shared.reset()[1])] + [
+        (piped.step(action)[4], shared.step(action)[4]) for _ in range(2)
+    ]:
+        assert set(piped_info) == set(shared_info)
+        np.testing.assert_array_equal(piped_info["dist"], shared_info["dist"])
+        for piped_value, shared_value in zip(piped_info["gap"], shared_info["gap"]):
+            np.testing.assert_array_equal(piped_value, shared_value)
+    # the float distance is not truncated to the declared integer dtype
+    np.testing.assert_array_equal(shared_info["dist"], [2.75, 2])
+    piped.close()
+    shared.close()
@@ -0,0 +1,74 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from gops.create_pkg.create_env import create_env
+
+
+@pytest.mark.parametrize(
+    "env_id",
+    [
+        "pyth_veh3dofconti",
+        "pyth_veh3dofconti_errcstr",
+        "pyth_veh2dofconti",
+        "pyth_veh2dofconti_errcstr",
+        "pyth_veh3dofconti_surrcstr",
+        "pyth_veh3dofconti_detour",
+    ],
+)
+def test_batch_env_matches_single_envs(env_id):
+    mdl = importlib.import_module(f"gops.env.env_ocp.{env_id}")
+    env_num = 4
+    batch = mdl.batch_env_creator(env_num=env_num)
+    batch.seed(0)
+    batch.reset()
+    envs = [mdl.env_creator() for _ in range(env_num)]
+    rng = np.random.default_rng(0)
+    for i, env in enumerate(envs):
+        env.seed(i)
+        init_state = rng.uniform(0.5 * batch.init_space[0], 0.5 * batch.init_space[1])
+        ref_num = 9 if "detour" in env_id else 2 * i + 1
+        env.reset(init_state=init_state, ref_time=1.5 * i, ref_num=ref_num)
+        batch.reset(init_state, 1.5 * i, ref_num, reset_mask=np.arange(env_num) == i)
+    if hasattr(batch, "surr_state"):
+        # surrounding vehicles are sampled randomly
+        batch.surr_state = np.stack([env.surr_state for env in envs])
+    alive = np.ones(env_num, dtype=bool)
+    for _ in range(30):
+        action = rng.uniform(batch.action_space.low, batch.action_space.high, (env_num,) + batch.action_space.shape)
+        obs, reward, done, info = batch.step(action.astype(np.float32))
+        for i, env in enumerate(envs):
+            if not alive[i]:
+                continue
+            env_obs, env_reward, env_done, env_info = env.step(action[i].astype(np.float32))
+            np.testing.assert_allclose(obs[i], env_obs, atol=1e-4)
+            np.testing.assert_allclose(reward[i], env_reward, rtol=1e-4, atol=1e-4)
+            assert done[i] == env_done
+            for k, v in env_info.items():
+                np.testing.assert_allclose(info[k][i], v, atol=1e-4, err_msg=k)
+            alive[i] = not env_done
+
+
+def test_batch_vector_env():
+    env_num, max_episode_steps = 8, 5
+    env = create_env(
+        "pyth_veh3dofconti", vector_env_num=env_num, vector_env_type="batch",
+        max_episode_steps=max_episode_steps, gym2gymnasium=True,
+    )
+    obs, info = env.reset(seed=0)
+    assert obs.shape == (env_num,) + env.single_observation_space.shape
+    assert info["state"].shape == (env_num, 6) and info["_state"].all()
+    for step in range(max_episode_steps):
+        action = np.zeros((env_num,) + env.single_action_space.shape, dtype=np.float32)
+        obs, reward, terminated, truncated, info = env.step(action)
+        assert reward.shape == (env_num,)
+    # all rows are truncated or terminated at the last step, and reset
+    assert np.all(terminated | truncated)
+    assert info["_final_observation"].all()
+    assert info["final_observation"][0].shape == env.single_observation_space.shape
+    np.testing.assert_array_equal(info["state"], env.env.unwrapped.state)
+    assert np.all(env.elapsed_steps == 0)
+
+    with pytest.raises(ValueError):
+        create_env("pyth_lq", vector_env_num=env_num, vector_env_type="batch", gym2gymnasium=True)
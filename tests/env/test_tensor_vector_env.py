@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from gops.create_pkg.create_env import create_env
+
+
+@pytest.mark.parametrize("env_id", ["veh3dof_tracking", "idpendulum"])
+def test_tensor_env_matches_data_envs(env_id):
+    env_num, max_episode_steps = 4, 15
+    tensor = create_env(
+        env_id=env_id, vector_env_num=env_num, vector_env_type="tensor",
+        max_episode_steps=max_episode_steps, gym2gymnasium=True,
+    )
+    tensor.seed(0)
+    obs, info = tensor.reset()
+    # row i of the tensor env is the (i + 1)-th reset of its data environment
+    envs = []
+    for i in range(env_num):
+        env = create_env(env_id=env_id, max_episode_steps=max_episode_steps, gym2gymnasium=True)
+        env.seed(0)
+        for _ in range(i + 1):
+            env_obs, env_info = env.reset()
+        np.testing.assert_allclose(obs[i], env_obs, atol=1e-5)
+        np.testing.assert_allclose(
+            info["state"].context_state.reference[i], env_info["state"].context_state.reference
+        )
+        envs.append(env)
+
+    rng = np.random.default_rng(0)
+    for _ in range(max_episode_steps):
+        action = rng.uniform(-0.3, 0.3, (env_num,) + tensor.single_action_space.shape).astype(np.float32)
+        obs, rew, terminated, truncated, info = tensor.step(action)
+        for i, env in enumerate(envs):
+            if env is None:
+                continue
+            env_obs, env_rew, env_terminated, env_truncated, env_info = env.step(action[i])
+            assert (terminated[i], truncated[i]) == (env_terminated, env_truncated)
+            state = info["state"][i]
+            if terminated[i] or truncated[i]:
+                np.testing.assert_allclose(info["final_observation"][i], env_obs, atol=1e-4)
+                state = info["final_info"][i]["state"]
+                envs[i] = None
+            else:
+                np.testing.assert_allclose(obs[i], env_obs, atol=1e-4)
+            np.testing.assert_allclose(rew[i], env_rew, rtol=1e-4, atol=1e-4)
+            np.testing.assert_allclose(state.robot_state, env_info["state"].robot_state, atol=1e-4)
+            np.testing.assert_allclose(
+                state.context_state.reference, env_info["state"].context_state.reference, atol=1e-5
+            )
+    # all rows are truncated at max_episode_steps at the latest, and reset
+    assert all(env is None for env in envs)
+    assert np.all(tensor.elapsed_steps.numpy() < max_episode_steps)
+
+
+def test_context_rollout_matches_steps():
+    from copy import deepcopy
+
+    from gops.env.env_gen_ocp.context.ref_traj import RefTrajContext
+    from gops.env.env_gen_ocp.pyth_base import Context
+
+    for path_num in range(5):
+        context = RefTrajContext()
+        context.reset(ref_time=1.3, path_num=path_num, speed_num=0)
+        stepped = deepcopy(context)
+        np.testing.assert_allclose(
+            context.rollout_reference(50), Context.rollout_reference(stepped, 50), atol=1e-4
+        )
+        np.testing.assert_allclose(context.state.reference, stepped.state.reference, atol=1e-4)
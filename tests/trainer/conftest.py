@@ -0,0 +1,45 @@
+import pytest
+
+from gops.create_pkg.create_env import create_env
+
+# network settings of the small policies and value functions of the trainer tests
+ALGORITHM_KWARGS = {
+    "DDPG": dict(
+        policy_func_name="DetermPolicy", policy_output_activation="tanh", policy_act_distribution="default",
+        value_learning_rate=1e-3,
+    ),
+    "SAC": dict(
+        policy_func_name="StochaPolicy", policy_min_log_std=-20, policy_max_log_std=1,
+        policy_act_distribution="TanhGaussDistribution",
+        value_learning_rate=1e-3, q_learning_rate=1e-3, alpha_learning_rate=1e-3,
+    ),
+    "PPO": dict(
+        policy_func_name="StochaPolicy", policy_min_log_std=-20, policy_max_log_std=0.5,
+        policy_act_distribution="GaussDistribution", value_func_name="StateValue",
+        learning_rate=3e-4, num_repeat=2, num_mini_batch=2, mini_batch_size=16,
+    ),
+}
+
+
+@pytest.fixture
+def make_kwargs():
+    """Factory of the arguments of algorithms, samplers and trainers on a small vehicle tracking task."""
+
+    def make(algorithm="DDPG", env_id="pyth_veh3dofconti", **kwargs):
+        env = create_env(env_id=env_id)
+        config = dict(
+            env_id=env_id, trainer="off_serial_trainer", seed=0,
+            policy_func_type="MLP", policy_hidden_sizes=[16], policy_hidden_activation="relu",
+            policy_learning_rate=1e-3,
+            value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+            value_hidden_activation="relu", value_output_activation="linear",
+            algorithm=algorithm, action_type="continu", cnn_shared=False, is_adversary=False,
+            obsv_dim=env.observation_space.shape[0], action_dim=env.action_space.shape[0],
+            action_high_limit=env.action_space.high, action_low_limit=env.action_space.low,
+            additional_info=env.additional_info,
+        )
+        config.update(ALGORITHM_KWARGS[algorithm])
+        config.update(kwargs)
+        return config
+
+    return make
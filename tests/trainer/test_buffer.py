@@ -0,0 +1,543 @@
+import numpy as np
+import pytest
+
+from gops.create_pkg.create_buffer import create_buffer
+from gops.env.env_gen_ocp.pyth_base import ContextState, State
+from gops.trainer.sampler.base import Experience, ExperienceBatch
+from gops.utils.observation_window import ObservationWindow
+
+obsv_dim = 3
+action_dim = 2
+
+
+def make_buffer(buffer_name="replay_buffer", buffer_max_size=10, **kwargs):
+    buffer_kwargs = {
+        "buffer_name": buffer_name,
+        "trainer": "off_serial_trainer",
+        "seed": 0,
+        "obsv_dim": obsv_dim,
+        "action_dim": action_dim,
+        "buffer_max_size": buffer_max_size,
+        "additional_info": {
+            "state": State(
+                robot_state=np.zeros(2, dtype=np.float32),
+                context_state=ContextState(reference=np.zeros((3, 2), dtype=np.float32)),
+            ),
+        },
+    }
+    buffer_kwargs.update(kwargs)
+    return create_buffer(**buffer_kwargs)
+
+
+def make_experiences(start, num):
+    experiences = []
+    for i in range(start, start + num):
+        info = {"state": State(
+            robot_state=np.full(2, i, dtype=np.float32),
+            context_state=ContextState(reference=np.full((3, 2), i, dtype=np.float32)),
+        )}
+        next_info = {"state": State(
+            robot_state=np.full(2, i + 1, dtype=np.float32),
+            context_state=ContextState(reference=np.full((3, 2), i + 1, dtype=np.float32)),
+        )}
+        experiences.append(Experience(
+            obs=np.full(obsv_dim, i, dtype=np.float32),
+            action=np.full(action_dim, i, dtype=np.float32),
+            reward=float(i),
+            done=i % 4 == 3,
+            info=info,
+            next_obs=np.full(obsv_dim, i + 1, dtype=np.float32),
+            next_info=next_info,
+            logp=np.float32(i),
+        ))
+    return experiences
+
+
+def assert_buffers_equal(buffer_a, buffer_b):
+    assert buffer_a.ptr == buffer_b.ptr
+    assert buffer_a.size == buffer_b.size
+    for k, v in buffer_a.buf.items():
+        if isinstance(v, np.ndarray):
+            np.testing.assert_array_equal(v, buffer_b.buf[k])
+        else:
+            np.testing.assert_array_equal(v.robot_state, buffer_b.buf[k].robot_state)
+            np.testing.assert_array_equal(
+                v.context_state.reference, buffer_b.buf[k].context_state.reference
+            )
+    if hasattr(buffer_a, "sum_tree"):
+        np.testing.assert_allclose(buffer_a.sum_tree, buffer_b.sum_tree)
+        np.testing.assert_allclose(buffer_a.min_tree, buffer_b.min_tree)
+
+
+@pytest.mark.parametrize("buffer_name", ["replay_buffer", "prioritized_replay_buffer"])
+@pytest.mark.parametrize("batch_sizes", [[3, 4, 5], [7, 7], [25], [10, 1]])
+def test_columnar_insert_matches_per_transition_store(buffer_name, batch_sizes):
+    buffer_store = make_buffer(buffer_name)
+    buffer_batch = make_buffer(buffer_name)
+    start = 0
+    for batch_size in batch_sizes:
+        experiences = make_experiences(start, batch_size)
+        start += batch_size
+        for e in experiences:
+            buffer_store.store(*e)
+        buffer_batch.add_batch(buffer_batch.experiences_to_batch(experiences))
+    assert_buffers_equal(buffer_store, buffer_batch)
+
+
+@pytest.mark.parametrize("buffer_max_size", [1, 7, 16, 100])
+def test_prioritized_tree_matches_brute_force(buffer_max_size):
+    buffer = make_buffer("prioritized_replay_buffer", buffer_max_size)
+    buffer.add_batch(make_experiences(0, buffer_max_size + 3))
+    idx = np.arange(buffer.size) + buffer.tree_capacity - 1
+    priorities = np.random.uniform(0.1, 2.0, size=buffer.size)
+    buffer.update_batch(idx, priorities)
+
+    leaves = buffer.sum_tree[buffer.tree_capacity - 1:][:buffer.size]
+    np.testing.assert_allclose(leaves, (priorities + buffer.epsilon) ** buffer.alpha)
+    np.testing.assert_allclose(buffer.sum_tree[0], leaves.sum())
+    np.testing.assert_allclose(buffer.min_tree[0], leaves.min())
+
+    values = np.random.uniform(0, buffer.sum_tree[0], size=64)
+    tree_idx, found = buffer.get_leaves(values)
+    expected = np.searchsorted(np.cumsum(leaves), values)
+    np.testing.assert_array_equal(tree_idx - buffer.tree_capacity + 1, expected)
+    np.testing.assert_allclose(found, leaves[expected])
+
+    batch = buffer.sample_batch(8)
+    assert batch["idx"].shape == (8,) and batch["weight"].max() <= 1.0 + 1e-6
+
+
+@pytest.mark.parametrize("buffer_name", ["memmap_replay_buffer", "memmap_prioritized_replay_buffer"])
+def test_memmap_buffer_reopen_read_only(buffer_name, tmp_path):
+    buffer = make_buffer(buffer_name, buffer_dir=str(tmp_path))
+    reference = make_buffer(buffer_name.replace("memmap_", ""))
+    for b in (buffer, reference):
+        b.add_batch(make_experiences(0, 13))
+    assert_buffers_equal(buffer, reference)
+    buffer.flush()
+
+    reopened = make_buffer(buffer_name, buffer_dir=str(tmp_path), buffer_read_only=True)
+    assert_buffers_equal(reopened, reference)
+    with pytest.warns(UserWarning):
+        reopened.add_batch(make_experiences(13, 2))
+    assert reopened.size == reference.size
+    batch = reopened.sample_batch(4)
+    assert batch["obs"].shape == (4, obsv_dim)
+    assert batch["state"].context_state.reference.shape == (4, 3, 2)
+
+
+@pytest.mark.parametrize("meta_interval,size", [(60.0, 0), (0.0, 10)])
+def test_memmap_buffer_writes_meta_at_intervals(meta_interval, size, tmp_path):
+    buffer = make_buffer("memmap_replay_buffer", buffer_dir=str(tmp_path), buffer_meta_interval=meta_interval)
+    buffer.add_batch(make_experiences(0, 13))
+    assert make_buffer("memmap_replay_buffer", buffer_dir=str(tmp_path), buffer_read_only=True).size == size
+    buffer.flush()
+    assert make_buffer("memmap_replay_buffer", buffer_dir=str(tmp_path), buffer_read_only=True).size == 10
+    with pytest.raises(ValueError):
+        make_buffer("memmap_replay_buffer", buffer_dir=str(tmp_path), buffer_compact_obs=True)
+
+
+def make_trajectories(num_envs, horizon, episode_len, seed=0):
+    """Step-major experiences of `num_envs` envs whose episodes last `episode_len` steps."""
+    rng = np.random.default_rng(seed)
+
+    def make_info(x):
+        return {"state": State(
+            robot_state=np.full(2, x, dtype=np.float32),
+            context_state=ContextState(reference=np.full((3, 2), x, dtype=np.float32)),
+        )}
+
+    obs = rng.normal(size=(num_envs, obsv_dim)).astype(np.float32)
+    steps = np.zeros(num_envs, dtype=int)
+    experiences = []
+    for _ in range(horizon):
+        for e in range(num_envs):
+            next_obs = obs[e] + 1
+            steps[e] += 1
+            done = steps[e] % episode_len == 0
+            experiences.append(Experience(
+                obs=obs[e].copy(),
+                action=rng.normal(size=action_dim).astype(np.float32),
+                reward=float(rng.normal()),
+                done=done,
+                info=make_info(obs[e, 0]),
+                next_obs=next_obs.copy(),
+                next_info=make_info(next_obs[0]),
+                logp=np.float32(0.0),
+            ))
+            obs[e] = rng.normal(size=obsv_dim).astype(np.float32) if done else next_obs
+    return experiences
+
+
+@pytest.mark.parametrize("buffer_name", ["replay_buffer", "prioritized_replay_buffer"])
+@pytest.mark.parametrize("num_envs,horizon,buffer_max_size", [(1, 8, 50), (1, 8, 7), (4, 5, 64), (3, 40, 30)])
+def test_compact_buffer_reconstructs_next_values(buffer_name, num_envs, horizon, buffer_max_size):
+    full = make_buffer(buffer_name, buffer_max_size)
+    compact = make_buffer(buffer_name, buffer_max_size, buffer_compact_obs=True)
+    for i in range(12):
+        experiences = make_trajectories(num_envs, horizon, episode_len=6, seed=i // 3)
+        if i % 3 == 2:
+            for e in experiences:
+                full.store(*e)
+                compact.store(*e)
+        else:
+            full.add_batch(experiences)
+            compact.add_batch(experiences)
+
+        idxes = np.arange(full.size)
+        expected, result = full.gather(idxes), compact.gather(idxes)
+        for k in ("obs", "obs2", "act", "rew", "done"):
+            np.testing.assert_array_equal(expected[k].numpy(), result[k].numpy())
+        for k in ("state", "next_state"):
+            np.testing.assert_array_equal(expected[k].robot_state.numpy(), result[k].robot_state.numpy())
+            np.testing.assert_array_equal(
+                expected[k].context_state.reference.numpy(), result[k].context_state.reference.numpy()
+            )
+    assert "obs2" not in compact.buf
+    assert compact.final_capacity <= buffer_max_size
+
+
+def make_tracking_experiences(num_envs, horizon, episode_len, window=5, seed=0):
+    """Step-major experiences whose reference windows slide over per-episode trajectories."""
+    rng = np.random.default_rng(seed)
+
+    def make_state(traj, t):
+        return State(
+            robot_state=np.full(2, t, dtype=np.float32),
+            context_state=ContextState(reference=traj[t:t + window].copy()),
+        )
+
+    trajs = [rng.normal(size=(episode_len + window, 2)).astype(np.float32) for _ in range(num_envs)]
+    steps = np.zeros(num_envs, dtype=int)
+    experiences = []
+    for _ in range(horizon):
+        for e in range(num_envs):
+            t = steps[e]
+            done = t + 1 == episode_len
+            experiences.append(Experience(
+                obs=np.full(obsv_dim, t, dtype=np.float32),
+                action=rng.normal(size=action_dim).astype(np.float32),
+                reward=float(rng.normal()),
+                done=done,
+                info={"state": make_state(trajs[e], t)},
+                next_obs=np.full(obsv_dim, t + 1, dtype=np.float32),
+                next_info={"state": make_state(trajs[e], t + 1)},
+                logp=np.float32(0.0),
+            ))
+            steps[e] = 0 if done else t + 1
+            if done:
+                trajs[e] = rng.normal(size=(episode_len + window, 2)).astype(np.float32)
+    return experiences
+
+
+@pytest.mark.parametrize("buffer_name", ["replay_buffer", "prioritized_replay_buffer"])
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("num_envs,horizon,buffer_max_size", [(1, 8, 200), (1, 8, 9), (4, 6, 64)])
+def test_dedup_context_matches_plain_storage(buffer_name, compact, num_envs, horizon, buffer_max_size):
+    window = 5
+    template = State(
+        robot_state=np.zeros(2, dtype=np.float32),
+        context_state=ContextState(reference=np.zeros((window, 2), dtype=np.float32)),
+    )
+    plain = make_buffer(buffer_name, buffer_max_size, additional_info={"state": template})
+    dedup = make_buffer(
+        buffer_name, buffer_max_size, additional_info={"state": template},
+        buffer_dedup_context=True, buffer_compact_obs=compact,
+    )
+    for i in range(15):
+        experiences = make_tracking_experiences(num_envs, horizon, episode_len=7, window=window, seed=i // 4)
+        if i % 2 == 0:
+            # grouped by environment, as OffSampler does
+            experiences = [e for j in range(num_envs) for e in experiences[j::num_envs]]
+        plain.add_batch(experiences)
+        dedup.add_batch(experiences)
+        idxes = np.arange(plain.size)
+        expected, result = plain.gather(idxes), dedup.gather(idxes)
+        for k in ("state", "next_state"):
+            np.testing.assert_array_equal(expected[k].robot_state.numpy(), result[k].robot_state.numpy())
+            np.testing.assert_array_equal(
+                expected[k].context_state.reference.numpy(), result[k].context_state.reference.numpy()
+            )
+    assert dedup.buf["state"].rows.shape[0] <= buffer_max_size * window
+
+
+@pytest.mark.parametrize("buffer_name", ["replay_buffer", "prioritized_replay_buffer"])
+@pytest.mark.parametrize("compact", [False, True])
+def test_storage_dtype_dequantizes_on_sample(buffer_name, compact):
+    storage_dtype = {
+        "obs": "affine_uint8",
+        "act": "float16",
+        "rew": "bfloat16",
+        "done": "bool",
+    }
+    low, high = np.full(obsv_dim, -4.0, dtype=np.float32), np.full(obsv_dim, 12.0, dtype=np.float32)
+    full = make_buffer(buffer_name, 64, buffer_compact_obs=compact)
+    quantized = make_buffer(
+        buffer_name, 64, buffer_compact_obs=compact, buffer_storage_dtype=storage_dtype,
+        obsv_low_limit=low, obsv_high_limit=high,
+    )
+    for i in range(4):
+        experiences = make_trajectories(4, 5, episode_len=6, seed=i)
+        full.add_batch(experiences)
+        quantized.add_batch(experiences)
+
+    assert quantized.buf["obs"].dtype == np.uint8
+    assert quantized.buf["done"].dtype == np.bool_
+    idxes = np.arange(full.size)
+    expected, result = full.gather(idxes), quantized.gather(idxes)
+    for k in ("obs", "obs2", "act", "rew", "done"):
+        assert result[k].dtype == expected[k].dtype
+    np.testing.assert_allclose(result["obs"].numpy(), expected["obs"].numpy(), atol=(high - low)[0] / 255 / 2 + 1e-6)
+    np.testing.assert_allclose(result["obs2"].numpy(), expected["obs2"].numpy(), atol=(high - low)[0] / 255 / 2 + 1e-6)
+    np.testing.assert_allclose(result["act"].numpy(), expected["act"].numpy(), rtol=1e-3, atol=1e-3)
+    np.testing.assert_allclose(result["rew"].numpy(), expected["rew"].numpy(), rtol=1e-2, atol=1e-2)
+    np.testing.assert_array_equal(result["done"].numpy(), expected["done"].numpy())
+    report, full_report = quantized.bytes_per_transition(), full.bytes_per_transition()
+    assert report["obs"] == obsv_dim and report["done"] == 1
+    assert sum(report.values()) < sum(full_report.values())
+
+    with pytest.raises(ValueError):
+        make_buffer(buffer_name, 64, buffer_storage_dtype={"obs": "affine_uint8"})
+
+
+def test_prefetcher_serves_batches_and_skips_overwritten_priorities():
+    from gops.trainer.prefetcher import BufferPrefetcher
+
+    buffer = make_buffer("prioritized_replay_buffer", 16)
+    prefetcher = BufferPrefetcher(buffer, 4, prefetch_size=2)
+    prefetcher.add_batch(make_experiences(0, 16))
+    assert prefetcher.size == 16
+    try:
+        batch = prefetcher.sample_batch(4)
+        assert batch["obs"].shape == (4, obsv_dim) and batch["weight"].shape == (4,)
+        # overwrite slots 0..5 after the batch was sampled
+        prefetcher.add_batch(make_experiences(16, 6))
+        idxes = np.array([0, 5, 6, 15]) + buffer.tree_capacity - 1
+        tree_before = buffer.sum_tree.copy()
+        prefetcher.update_batch(idxes, np.full(4, 10.0))
+        np.testing.assert_array_equal(buffer.sum_tree[idxes[:2]], tree_before[idxes[:2]])
+        assert np.all(buffer.sum_tree[idxes[2:]] > tree_before[idxes[2:]])
+        tb_dict = prefetcher.pop_tb_dict()
+        assert len(tb_dict) == 2
+    finally:
+        prefetcher.close()
+
+
+def _append_to_shared_buffer(buffer, start):
+    buffer.add_batch(make_experiences(start, 5))
+    buffer.close()
+
+
+class _BlockingColumn:
+    """Column whose writes wait for `event`, to hold a writer between reserving and committing."""
+
+    def __init__(self, array, event):
+        self.array, self.event = array, event
+
+    def __setitem__(self, key, value):
+        self.event.wait()
+        self.array[key] = value
+
+
+def test_shared_memory_buffer_commits_in_reservation_order():
+    import pickle
+    import threading
+    import time
+
+    buffer = make_buffer("shared_memory_replay_buffer", 32)
+    reference = make_buffer("replay_buffer", 32)
+    writer_a, writer_b = pickle.loads(pickle.dumps(buffer)), pickle.loads(pickle.dumps(buffer))
+    release = threading.Event()
+    writer_a.buf["obs"] = _BlockingColumn(writer_a.buf["obs"], release)
+    try:
+        thread_a = threading.Thread(target=writer_a.add_batch, args=(make_experiences(0, 5),))
+        thread_a.start()
+        while int(buffer.cursor[0]) < 5:
+            time.sleep(1e-3)
+        # writer B reserves and copies rows [5, 10) while A still copies rows [0, 5)
+        thread_b = threading.Thread(target=writer_b.add_batch, args=(make_experiences(5, 5),))
+        thread_b.start()
+        time.sleep(0.05)
+        assert len(buffer) == 0 and thread_b.is_alive()
+
+        release.set()
+        thread_a.join(timeout=5)
+        thread_b.join(timeout=5)
+        assert not thread_a.is_alive() and not thread_b.is_alive()
+        reference.add_batch(make_experiences(0, 10))
+        assert_buffers_equal(reference, buffer)
+    finally:
+        release.set()
+        writer_a.close()
+        writer_b.close()
+        buffer.close()
+
+
+def test_shared_memory_buffer_rejects_compact_storage():
+    with pytest.raises(ValueError):
+        make_buffer("shared_memory_replay_buffer", 32, buffer_compact_obs=True)
+
+
+def test_shared_memory_buffer_commit_times_out_behind_a_stuck_writer():
+    import pickle
+    import threading
+    import time
+
+    buffer = make_buffer("shared_memory_replay_buffer", 32, buffer_commit_timeout=0.1)
+    writer_a, writer_b = pickle.loads(pickle.dumps(buffer)), pickle.loads(pickle.dumps(buffer))
+    release = threading.Event()
+    writer_a.buf["obs"] = _BlockingColumn(writer_a.buf["obs"], release)
+    try:
+        thread_a = threading.Thread(target=writer_a.add_batch, args=(make_experiences(0, 5),))
+        thread_a.start()
+        while int(buffer.cursor[0]) < 5:
+            time.sleep(1e-3)
+        with pytest.raises(RuntimeError, match=r"\[0, 5\)"):
+            writer_b.add_batch(make_experiences(5, 5))
+    finally:
+        release.set()
+        thread_a.join(timeout=5)
+        writer_a.close()
+        writer_b.close()
+        buffer.close()
+
+
+def test_shared_memory_buffer_appends_from_other_processes():
+    import multiprocessing
+    import pickle
+
+    buffer = make_buffer("shared_memory_replay_buffer", 32)
+    reference = make_buffer("replay_buffer", 32)
+    try:
+        context = multiprocessing.get_context("spawn")
+        for start in (0, 5):
+            process = context.Process(target=_append_to_shared_buffer, args=(buffer, start))
+            process.start()
+            process.join()
+            assert process.exitcode == 0
+            reference.add_batch(make_experiences(start, 5))
+        assert_buffers_equal(reference, buffer)
+
+        attached = pickle.loads(pickle.dumps(buffer))
+        attached.add_batch(make_experiences(10, 30))
+        reference.add_batch(make_experiences(10, 30))
+        assert_buffers_equal(reference, buffer)
+        batch = attached.sample_batch(4)
+        assert batch["state"].context_state.reference.shape == (4, 3, 2)
+        attached.close()
+    finally:
+        buffer.close()
+
+
+@pytest.mark.parametrize("buffer_name,kwargs", [
+    ("replay_buffer", {}),
+    ("prioritized_replay_buffer", {}),
+    ("replay_buffer", {"buffer_compact_obs": True, "buffer_dedup_context": True}),
+    ("prioritized_replay_buffer", {"buffer_compact_obs": True}),
+])
+@pytest.mark.parametrize("blocking", [True, False])
+def test_save_load_roundtrip(buffer_name, kwargs, blocking, tmp_path):
+    template = State(
+        robot_state=np.zeros(2, dtype=np.float32),
+        context_state=ContextState(reference=np.zeros((5, 2), dtype=np.float32)),
+    )
+
+    def make(name):
+        return make_buffer(name, 40, additional_info={"state": template}, **kwargs)
+
+    buffer, reference = make(buffer_name), make("replay_buffer")
+    for i in range(3):
+        buffer.add_batch(make_tracking_experiences(4, 5, episode_len=7, seed=i))
+        reference.add_batch(make_tracking_experiences(4, 5, episode_len=7, seed=i))
+    if hasattr(buffer, "sum_tree"):
+        batch = buffer.sample_batch(8)
+        buffer.update_batch(batch["idx"], np.random.uniform(0, 2, size=8))
+    sum_tree = buffer.sum_tree.copy() if hasattr(buffer, "sum_tree") else None
+    path = str(tmp_path / "buffer_0")
+    handle = buffer.save(path, blocking=blocking, chunk_size=64)
+    if not blocking:
+        # writes after a non-blocking save started are not part of the snapshot
+        buffer.add_batch(make_tracking_experiences(4, 5, episode_len=7, seed=9))
+        handle.wait()
+        assert handle.done()
+
+    restored = make(buffer_name)
+    restored.load(path)
+    assert restored.size == reference.size == 40 and restored.ptr == reference.ptr
+    idxes = np.arange(restored.size)
+    expected, result = reference.gather(idxes), restored.gather(idxes)
+    for k in ("obs", "obs2", "act", "rew", "done"):
+        np.testing.assert_array_equal(expected[k].numpy(), result[k].numpy())
+    for k in ("state", "next_state"):
+        np.testing.assert_array_equal(
+            expected[k].context_state.reference.numpy(), result[k].context_state.reference.numpy()
+        )
+    if sum_tree is not None:
+        np.testing.assert_array_equal(restored.sum_tree, sum_tree)
+    # columns are plain .npy files that can be memory-mapped
+    np.testing.assert_array_equal(np.load(path + "/obs.npy", mmap_mode="r"), reference.buf["obs"])
+
+    # the restored buffer keeps appending where the saved one stopped
+    restored.add_batch(make_tracking_experiences(4, 5, episode_len=7, seed=9))
+    reference.add_batch(make_tracking_experiences(4, 5, episode_len=7, seed=9))
+    expected, result = reference.gather(idxes), restored.gather(idxes)
+    np.testing.assert_array_equal(expected["obs2"].numpy(), result["obs2"].numpy())
+    np.testing.assert_array_equal(
+        expected["next_state"].context_state.reference.numpy(), result["next_state"].context_state.reference.numpy()
+    )
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("num_envs,horizon,buffer_max_size", [(1, 8, 50), (1, 8, 7), (3, 5, 64), (2, 40, 30)])
+def test_sequence_buffer_windows_match_rolling_windows(compact, num_envs, horizon, buffer_max_size):
+    seq_len = 4
+    buffer = make_buffer(
+        "sequence_replay_buffer", buffer_max_size, seq_len=seq_len, buffer_compact_obs=compact
+    )
+    stored = []
+    for i in range(6):
+        experiences = make_trajectories(num_envs, horizon, episode_len=6, seed=i // 2)
+        # samplers store transitions grouped by environment
+        experiences = [e for j in range(num_envs) for e in experiences[j::num_envs]]
+        buffer.add_batch(experiences)
+        stored.extend(experiences)
+
+    # expected windows, rolled over the stored transitions in insertion order
+    recent = stored[-buffer.size:]
+    expected_obs, expected_mask = [], []
+    window = ObservationWindow(seq_len, recent[0].obs[None])
+    mask = np.zeros(seq_len, dtype=np.float32)
+    mask[-1] = 1
+    for t, e in enumerate(recent):
+        if t > 0:
+            prev = recent[t - 1]
+            reset = bool(prev.done) or not np.array_equal(prev.next_obs, e.obs)
+            window.push(e.obs[None], np.array([reset]))
+            mask = np.concatenate((mask[1:], [1])) if not reset else np.eye(seq_len, dtype=np.float32)[-1]
+        expected_obs.append(window.get()[0].copy())
+        expected_mask.append(mask)
+
+    slots = (buffer.ptr - buffer.size + np.arange(buffer.size)) % buffer_max_size
+    batch = buffer.gather(slots)
+    assert batch["obs"].shape == (buffer.size, seq_len, obsv_dim)
+    np.testing.assert_array_equal(batch["obs"].numpy(), np.stack(expected_obs))
+    np.testing.assert_array_equal(batch["mask"].numpy(), np.stack(expected_mask))
+    np.testing.assert_array_equal(batch["obs2"][:, :-1].numpy(), batch["obs"][:, 1:].numpy())
+    np.testing.assert_array_equal(batch["obs2"][:, -1].numpy(), np.stack([e.next_obs for e in recent]))
+    np.testing.assert_array_equal(batch["rew"].numpy(), np.array([e.reward for e in recent], dtype=np.float32))
+
+
+def test_experience_batch_adapter_matches_experiences():
+    experiences = make_trajectories(num_envs=2, horizon=6, episode_len=4)
+    buffer = make_buffer(buffer_max_size=20)
+    batch = ExperienceBatch(buffer.experiences_to_batch(experiences))
+    batch["time_limited"] = np.zeros(len(experiences), dtype=np.bool_)
+
+    buffer_batch, buffer_list = make_buffer(buffer_max_size=20), make_buffer(buffer_max_size=20)
+    buffer_batch.add_batch(batch)
+    buffer_list.add_batch(batch.experiences())
+    assert_buffers_equal(buffer_batch, buffer_list)
+    for e, expected in zip(batch.experiences(), experiences):
+        np.testing.assert_array_equal(e.obs, expected.obs)
+        np.testing.assert_array_equal(e.next_info["state"].robot_state, expected.next_info["state"].robot_state)
+        assert e.next_info["TimeLimit.truncated"] is False
@@ -0,0 +1,167 @@
+import os
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from gops.create_pkg.create_alg import create_alg
+from gops.create_pkg.create_buffer import create_buffer
+from gops.create_pkg.create_sampler import create_sampler
+from gops.utils.checkpoint import (
+    TRAINER_FILE,
+    CheckpointWriter,
+    checkpoint_dir,
+    find_checkpoint,
+    get_rng_state,
+    load_checkpoint,
+    set_rng_state,
+    snapshot,
+)
+from gops.utils.common_utils import seed_everything
+
+
+OFF_SAMPLER_KWARGS = dict(
+    sample_batch_size=16, sampler_name="off_sampler",
+    noise_params={"noise_type": "ou", "sigma": 0.3, "scale_end": 0.1, "anneal_samples": 64},
+)
+
+
+def test_writer_keeps_latest_complete_checkpoints(tmp_path):
+    save_folder = str(tmp_path)
+    writer = CheckpointWriter(max_to_keep=2)
+    waited = []
+    for iteration in (10, 20, 30):
+        path = checkpoint_dir(save_folder, iteration)
+        writer.write(path, snapshot({"trainer": "T", "iteration": iteration}), [lambda: waited.append(iteration)])
+    writer.wait()
+    assert waited == [10, 20, 30]
+    assert sorted(os.listdir(os.path.join(save_folder, "checkpoint"))) == ["iteration_20", "iteration_30"]
+
+    # directories without the trainer file, e.g. of a crash while writing, are skipped
+    os.makedirs(checkpoint_dir(save_folder, 40))
+    assert find_checkpoint(save_folder) == checkpoint_dir(save_folder, 30)
+    state, path = load_checkpoint(save_folder, "T")
+    assert state["iteration"] == 30 and os.path.isfile(os.path.join(path, TRAINER_FILE))
+    with pytest.raises(ValueError):
+        load_checkpoint(save_folder, "OtherTrainer")
+    with pytest.raises(FileNotFoundError):
+        find_checkpoint(str(tmp_path / "missing"))
+
+
+def test_writer_raises_errors_of_writing(tmp_path):
+    writer = CheckpointWriter()
+
+    def fail():
+        raise OSError("disk full")
+
+    writer.write(checkpoint_dir(str(tmp_path), 1), {"iteration": 1}, [fail])
+    with pytest.raises(RuntimeError):
+        writer.wait()
+    assert not os.path.exists(os.path.join(checkpoint_dir(str(tmp_path), 1), TRAINER_FILE))
+
+
+def test_rng_state_roundtrip():
+    state = get_rng_state()
+    expected = (random.random(), np.random.rand(), torch.rand(1).item())
+    set_rng_state(state)
+    assert (random.random(), np.random.rand(), torch.rand(1).item()) == expected
+
+
+def test_alg_checkpoint_continues_identically(make_kwargs):
+    kwargs = make_kwargs()
+    alg, resumed = create_alg(**kwargs), create_alg(**{**kwargs, "seed": 1})
+    rng = np.random.default_rng(0)
+
+    def batch():
+        return {
+            "obs": torch.tensor(rng.normal(size=(8, kwargs["obsv_dim"])), dtype=torch.float32),
+            "act": torch.tensor(rng.uniform(-1, 1, size=(8, kwargs["action_dim"])), dtype=torch.float32),
+            "rew": torch.tensor(rng.normal(size=8), dtype=torch.float32),
+            "obs2": torch.tensor(rng.normal(size=(8, kwargs["obsv_dim"])), dtype=torch.float32),
+            "done": torch.zeros(8),
+        }
+
+    for i in range(3):
+        alg.local_update(batch(), i)
+    state = snapshot(alg.checkpoint_state())
+    assert state["optimizers"]
+    resumed.load_checkpoint_state(state)
+
+    data = batch()
+    alg.local_update(data, 3)
+    resumed.local_update(data, 3)
+    for p, q in zip(alg.networks.parameters(), resumed.networks.parameters()):
+        torch.testing.assert_close(p, q, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("extra", [{}, {"vector_env_num": 2, "vector_env_type": "sync", "gym2gymnasium": True}])
+def test_sampler_checkpoint_continues_identically(make_kwargs, extra):
+    kwargs = make_kwargs(**OFF_SAMPLER_KWARGS, **extra)
+    sampler = create_sampler(**kwargs)
+    for _ in range(3):
+        sampler.sample()
+    state = snapshot(sampler.checkpoint_state())
+    rng_state = get_rng_state()
+    expected, _ = sampler.sample()
+
+    # policy weights are not part of the sampler state, the trainer syncs them
+    resumed = create_sampler(**{**kwargs, "seed": 1})
+    resumed.load_state_dict(sampler.networks.state_dict())
+    resumed.load_checkpoint_state(state)
+    set_rng_state(rng_state)
+    result, _ = resumed.sample()
+    assert resumed.get_total_sample_number() == sampler.get_total_sample_number()
+    for k in ("obs", "act", "rew", "obs2"):
+        np.testing.assert_array_equal(np.asarray(expected[k]), np.asarray(result[k]))
+
+
+def _train(trainer_name, kwargs):
+    seed_everything(kwargs["seed"])
+    alg, sampler = create_alg(**kwargs), create_sampler(**kwargs)
+    if trainer_name == "off_serial_trainer":
+        from gops.trainer.off_serial_trainer import OffSerialTrainer
+
+        trainer = OffSerialTrainer(alg, sampler, create_buffer(**kwargs), None, **kwargs)
+    else:
+        from gops.trainer.on_serial_trainer import OnSerialTrainer
+
+        trainer = OnSerialTrainer(alg, sampler, None, **kwargs)
+    trainer.train()
+    return trainer
+
+
+@pytest.mark.parametrize("trainer_name,algorithm,extra", [
+    ("off_serial_trainer", "DDPG", dict(
+        OFF_SAMPLER_KWARGS, buffer_name="replay_buffer", buffer_max_size=1000, buffer_warm_size=32,
+        replay_batch_size=16, vector_env_num=2, vector_env_type="sync", gym2gymnasium=True,
+    )),
+    ("off_serial_trainer", "DDPG", dict(
+        OFF_SAMPLER_KWARGS, buffer_name="prioritized_replay_buffer", buffer_max_size=1000, buffer_warm_size=32,
+        replay_batch_size=16,
+    )),
+    ("on_serial_trainer", "PPO", dict(sample_batch_size=32, sampler_name="on_sampler", noise_params=None)),
+])
+def test_serial_trainer_resume_is_exact(make_kwargs, tmp_path, trainer_name, algorithm, extra):
+    # the trainers import ray for their remote evaluator, which is not used here
+    pytest.importorskip("ray")
+
+    def kwargs(folder, max_iteration, **overrides):
+        os.makedirs(os.path.join(folder, "apprfunc"), exist_ok=True)
+        return make_kwargs(
+            algorithm, trainer=trainer_name, ini_network_dir=None, max_iteration=max_iteration,
+            log_save_interval=1000, apprfunc_save_interval=1000, eval_interval=10 ** 9,
+            save_folder=folder, use_gpu=False, checkpoint_interval=5, checkpoint_max_to_keep=1,
+            **extra, **overrides,
+        )
+
+    direct = _train(trainer_name, kwargs(str(tmp_path / "direct"), 10))
+    folder = str(tmp_path / "resumed")
+    _train(trainer_name, kwargs(folder, 5))
+    resumed = _train(trainer_name, kwargs(folder, 10, resume_from=folder))
+
+    assert resumed.iteration == 10
+    assert os.listdir(os.path.join(folder, "checkpoint")) == ["iteration_10"]
+    expected, result = direct.alg.state_dict(), resumed.alg.state_dict()
+    for k in expected:
+        torch.testing.assert_close(expected[k], result[k], rtol=0, atol=0)
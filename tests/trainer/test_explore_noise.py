@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from gops.utils.explore_noise import create_noise_process
+
+
+def test_gauss_noise_is_independent_per_env_and_seeded():
+    action = np.zeros((4, 2), dtype=np.float32)
+    noise = create_noise_process("continu", seed=[0, 1], mean=0.0, std=0.1)
+    noisy = noise.sample(action)
+
+    assert noisy.shape == action.shape and noisy.dtype == np.float32
+    assert len(np.unique(noisy[:, 0])) == 4
+    again = create_noise_process("continu", seed=[0, 1], mean=0.0, std=0.1).sample(action)
+    np.testing.assert_array_equal(noisy, again)
+    other = create_noise_process("continu", seed=[0, 2], mean=0.0, std=0.1).sample(action)
+    assert not np.array_equal(noisy, other)
+
+
+def test_ou_noise_resets_finished_envs_only():
+    action = np.zeros((3, 2))
+    noise = create_noise_process("continu", noise_type="ou", seed=0, sigma=1.0, dt=1.0)
+    for _ in range(5):
+        noise.sample(action)
+    noise.reset(np.array([False, True, False]))
+
+    np.testing.assert_array_equal(noise.state[1], 0.0)
+    assert np.all(noise.state[[0, 2]] != 0.0)
+
+
+def test_epsilon_greedy_explores_per_env_and_anneals():
+    action = np.zeros(1000, dtype=np.int64)
+    noise = create_noise_process(
+        "discret", seed=0, epsilon=1.0, action_num=4, scale_end=0.0, anneal_samples=100
+    )
+    noisy = noise.sample(action)
+    assert noisy.shape == action.shape and noisy.dtype == np.int64
+    assert set(np.unique(noisy)) == {0, 1, 2, 3}
+
+    noise.set_total_sample_number(50)
+    assert noise.epsilon == 0.5
+    noise.set_total_sample_number(200)
+    np.testing.assert_array_equal(noise.sample(action), action)
+
+    exp_noise = create_noise_process(
+        "discret", epsilon=0.9, action_num=4, scale_end=0.05, anneal_samples=100, anneal_type="exp"
+    )
+    exp_noise.set_total_sample_number(100)
+    np.testing.assert_allclose(exp_noise.epsilon, 0.05 + 0.85 * np.exp(-1))
+
+
+def test_noise_process_requires_sample():
+    from gops.utils.explore_noise import NoiseProcess
+
+    class Incomplete(NoiseProcess):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(0.1)
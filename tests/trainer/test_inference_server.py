@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+import torch
+
+from gops.trainer.inference_server import InferenceServer
+from gops.utils.tensorboard_setup import tb_tags
+
+
+def make_server(**kwargs):
+    return InferenceServer(
+        algorithm="SAC", action_type="continu", cnn_shared=False, obsv_dim=3, action_dim=2,
+        action_high_limit=np.ones(2, dtype=np.float32), action_low_limit=-np.ones(2, dtype=np.float32),
+        policy_func_name="StochaPolicy", policy_func_type="MLP", policy_hidden_sizes=[16],
+        policy_hidden_activation="relu", policy_min_log_std=-20, policy_max_log_std=1,
+        policy_act_distribution="TanhGaussDistribution", policy_learning_rate=1e-3,
+        value_func_name="ActionValue", value_func_type="MLP", value_hidden_sizes=[16],
+        value_hidden_activation="relu", value_output_activation="linear",
+        value_learning_rate=1e-3, q_learning_rate=1e-3, alpha_learning_rate=1e-3,
+        **kwargs,
+    )
+
+
+def test_concurrent_requests_are_served_by_one_forward():
+    server = make_server(inference_batch_timeout=50)
+    obs = [np.random.randn(n, 3).astype(np.float32) for n in (1, 4, 2)]
+
+    async def serve():
+        return await asyncio.gather(*[server.act(o) for o in obs])
+
+    torch.manual_seed(0)
+    results = asyncio.run(serve())
+    torch.manual_seed(0)
+    with torch.no_grad():
+        logits = server.networks.policy(torch.from_numpy(np.concatenate(obs)))
+        action, logp = server.networks.create_action_distributions(logits).sample()
+
+    assert server.forward_num == 1
+    start = 0
+    for o, (a, lp) in zip(obs, results):
+        np.testing.assert_array_equal(a, action[start:start + len(o)].numpy())
+        np.testing.assert_array_equal(lp, logp[start:start + len(o)].numpy())
+        start += len(o)
+    stats = server.stats()
+    assert stats[tb_tags["inference_batch_size"]] == 7
+    assert stats[tb_tags["inference_latency_p50"]] > 0
+
+
+def test_full_batch_is_served_without_waiting():
+    server = make_server(inference_max_batch_size=4, inference_batch_timeout=10000)
+
+    async def serve():
+        return await asyncio.wait_for(server.act(np.zeros((4, 3), dtype=np.float32)), timeout=5)
+
+    action, logp = asyncio.run(serve())
+    assert action.shape == (4, 2) and logp.shape == (4,)
+
+
+def test_failed_forward_raises_in_every_request_of_the_batch():
+    server = make_server(inference_batch_timeout=50)
+    # observations of the wrong width make the concatenation of the batch fail
+    obs = [np.zeros((2, 3), dtype=np.float32), np.zeros((1, 5), dtype=np.float32)]
+
+    async def serve():
+        return await asyncio.wait_for(
+            asyncio.gather(*[server.act(o) for o in obs], return_exceptions=True), timeout=5
+        )
+
+    results = asyncio.run(serve())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert server.requests == [] and server.forward_num == 0
+
+    # the server keeps serving later requests
+    async def serve_valid():
+        return await asyncio.wait_for(server.act(np.zeros((2, 3), dtype=np.float32)), timeout=5)
+
+    action, logp = asyncio.run(serve_valid())
+    assert action.shape == (2, 2)
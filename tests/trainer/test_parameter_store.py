@@ -0,0 +1,28 @@
+import pickle
+
+import torch
+
+from gops.trainer.parameter_store import FlatStateDict
+
+
+def test_flat_state_dict_unpickles_as_state_dict():
+    module = torch.nn.Sequential(torch.nn.Linear(3, 4), torch.nn.BatchNorm1d(4))
+    module(torch.randn(5, 3))
+    state_dict = module.state_dict()
+    state_dict["extra"] = "not a tensor"
+
+    flat = FlatStateDict(state_dict)
+    restored = pickle.loads(pickle.dumps(flat, protocol=5))
+
+    assert list(restored.keys()) == list(state_dict.keys())
+    for k, v in state_dict.items():
+        if isinstance(v, torch.Tensor):
+            assert restored[k].dtype == v.dtype
+            torch.testing.assert_close(restored[k], v)
+        else:
+            assert restored[k] == v
+    # float parameters and integer counters are grouped into one buffer per dtype
+    assert len(flat.buffers) == 2
+    assert flat.nbytes == sum(v.numel() * v.element_size() for v in state_dict.values() if isinstance(v, torch.Tensor))
+    del restored["extra"]
+    module.load_state_dict(restored)
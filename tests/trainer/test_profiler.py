@@ -0,0 +1,99 @@
+import json
+import pickle
+import threading
+import time
+
+import pytest
+
+from gops.utils.profiler import Profiler, write_profile
+
+
+class FakeWriter:
+    def __init__(self):
+        self.scalars = {}
+        self.histograms = {}
+
+    def add_scalar(self, tag, value, step):
+        self.scalars[tag] = value
+
+    def add_histogram(self, tag, values, step):
+        self.histograms[tag] = values
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.iteration():
+        with profiler.span("update"):
+            pass
+    calls = []
+    profiled = profiler.profile("stage")(lambda x: calls.append(x) or x)
+    assert profiled(3) == 3 and calls == [3]
+    assert profiler.pop_tb_dict() == {}
+    writer = FakeWriter()
+    profiler.add_to_writer(writer, 0)
+    assert writer.scalars == {} and writer.histograms == {}
+
+
+def test_critical_path_breakdown_and_trace(tmp_path):
+    profiler = Profiler(enabled=True, trace_path=str(tmp_path / "trace.json"))
+
+    @profiler.profile("buffer.sample_batch")
+    def sample_batch():
+        time.sleep(0.002)
+
+    for _ in range(3):
+        with profiler.iteration():
+            with profiler.span("replay"):
+                sample_batch()
+            with profiler.span("update"):
+                time.sleep(0.004)
+    # spans of other threads are timed, but are not part of the critical path
+    thread = threading.Thread(target=sample_batch)
+    thread.start()
+    thread.join()
+
+    writer = FakeWriter()
+    profiler.add_to_writer(writer, 0)
+    assert set(writer.histograms) == {
+        "Profile/iteration [ms]", "Profile/replay [ms]", "Profile/update [ms]", "Profile/buffer.sample_batch [ms]"
+    }
+    assert len(writer.histograms["Profile/buffer.sample_batch [ms]"]) == 4
+    assert writer.scalars["Profile/update [ms]-RL iter"] >= 4
+    shares = {k: v for k, v in writer.scalars.items() if k.startswith("Profile critical path/")}
+    assert set(shares) == {
+        "Profile critical path/replay [%]-RL iter",
+        "Profile critical path/update [%]-RL iter",
+        "Profile critical path/other [%]-RL iter",
+    }
+    assert sum(shares.values()) == pytest.approx(100)
+    assert shares["Profile critical path/update [%]-RL iter"] > shares["Profile critical path/replay [%]-RL iter"]
+    # reports are reset
+    assert profiler.pop_tb_dict() == {}
+
+    with open(profiler.save_trace()) as f:
+        events = json.load(f)["traceEvents"]
+    assert len(events) == 13
+    assert len({e["tid"] for e in events}) == 2
+    iteration = next(e for e in events if e["name"] == "iteration")
+    update = next(e for e in events if e["name"] == "update")
+    assert iteration["ts"] <= update["ts"] and update["ts"] + update["dur"] <= iteration["ts"] + iteration["dur"]
+
+
+def test_undrained_profile_is_bounded_and_written_with_prefix():
+    # e.g. the profiler of a remote sampler, whose profile is popped by the trainer
+    profiler = Profiler(enabled=True, max_samples=100)
+    for _ in range(1000):
+        with profiler.span("sampler.env_step"):
+            pass
+    stats = profiler._durations["sampler.env_step"]
+    assert stats.count == 1000 and len(stats.samples) == 100
+
+    profile = pickle.loads(pickle.dumps(profiler.pop_profile()))
+    assert profiler.pop_profile() == ({}, {}, 0.0)
+    writer = FakeWriter()
+    write_profile(writer, 0, profile, prefix="sampler_0")
+    assert set(writer.histograms) == {"Profile/sampler_0/sampler.env_step [ms]"}
+    assert len(writer.histograms["Profile/sampler_0/sampler.env_step [ms]"]) == 100
+    assert writer.scalars["Profile/sampler_0/sampler.env_step [ms]-RL iter"] == pytest.approx(
+        1000 * profile[0]["sampler.env_step"].total / 1000
+    )
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from gops.trainer.rate_limiter import RateLimiter
+from gops.utils.tensorboard_setup import tb_tags
+
+
+@pytest.mark.parametrize("sample_time,update_time", [(1, 10), (10, 1)])
+def test_rate_limiter_keeps_ratio_whichever_side_is_faster(sample_time, update_time):
+    """Simulate samplers and learners running at different speeds, started greedily when allowed."""
+    ratio, batch_size = 0.25, 20
+    limiter = RateLimiter(ratio, batch_size, sampler_num=2, learner_num=3)
+    # remaining time of the tasks of each worker, None while it waits for the limiter
+    samplers, learners = [None] * 2, [None] * 3
+    for t in range(2000):
+        for workers, can_start, start, duration in (
+            (samplers, limiter.can_insert, limiter.insert, sample_time),
+            (learners, limiter.can_update, limiter.update, update_time),
+        ):
+            for i, remaining in enumerate(workers):
+                if remaining is not None and remaining > 0:
+                    workers[i] -= 1
+                elif can_start():
+                    start()
+                    workers[i] = duration - 1
+                else:
+                    workers[i] = None
+        assert abs(limiter.update_num - ratio * limiter.sample_num) <= limiter.tolerance
+    assert limiter.update_num > 0 and limiter.sample_num > 0
+    np.testing.assert_allclose(limiter.update_num / limiter.sample_num, ratio, rtol=0.1)
+
+    tb_info = limiter.stats()
+    np.testing.assert_allclose(tb_info[tb_tags["update_sample_ratio"]], ratio, rtol=0.1)
+    assert tb_tags["sampler_blocked_time"] in tb_info and tb_tags["learner_blocked_time"] in tb_info
+
+
+def test_rate_limiter_rejects_tolerance_that_could_deadlock():
+    with pytest.raises(ValueError):
+        RateLimiter(1.0, 10, tolerance=2)
+    limiter = RateLimiter(1.0, 10, tolerance=5.5)
+    # either side can always proceed
+    for _ in range(100):
+        assert limiter.can_insert() or limiter.can_update()
+        if limiter.can_update():
+            limiter.update()
+        else:
+            limiter.insert()
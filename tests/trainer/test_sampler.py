@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+import torch
+
+from gops.trainer.sampler.on_sampler import OnSampler
+
+
+def reference_gae(rew, val, last_val, done, tlim, gamma, gae_lambda):
+    """GAE of each trajectory segment of each environment, computed step by step."""
+    num_envs, horizon = rew.shape
+    adv = np.zeros_like(rew)
+    for i in range(num_envs):
+        gae = 0.0
+        for t in reversed(range(horizon)):
+            if done[i, t] or tlim[i, t] or t == horizon - 1:
+                next_val = 0.0 if done[i, t] else last_val[i, t]
+                gae = 0.0
+            else:
+                next_val = val[i, t + 1]
+            delta = rew[i, t] + gamma * next_val - val[i, t]
+            gae = delta + gamma * gae_lambda * gae
+            adv[i, t] = gae
+    return adv, adv + val
+
+
+@pytest.mark.parametrize("num_envs,horizon", [(1, 20), (4, 33)])
+def test_vectorized_gae_matches_per_segment_loop(num_envs, horizon):
+    rng = np.random.default_rng(0)
+    sampler = OnSampler.__new__(OnSampler)
+    sampler.num_envs, sampler.horizon = num_envs, horizon
+    sampler.gamma, sampler.gae_lambda = 0.97, 0.9
+    sampler.mb_rew = rng.normal(size=(num_envs, horizon)).astype(np.float32)
+    sampler.mb_val = rng.normal(size=(num_envs, horizon)).astype(np.float32)
+    sampler.mb_last_val = rng.normal(size=(num_envs, horizon)).astype(np.float32)
+    sampler.mb_done = rng.random((num_envs, horizon)) < 0.1
+    sampler.mb_tlim = ~sampler.mb_done & (rng.random((num_envs, horizon)) < 0.05)
+    sampler.mb_adv = np.zeros((num_envs, horizon), dtype=np.float32)
+    sampler.mb_ret = np.zeros((num_envs, horizon), dtype=np.float32)
+
+    sampler._compute_gae()
+    adv, ret = reference_gae(
+        sampler.mb_rew, sampler.mb_val, sampler.mb_last_val,
+        sampler.mb_done, sampler.mb_tlim, sampler.gamma, sampler.gae_lambda,
+    )
+    np.testing.assert_allclose(sampler.mb_adv, adv, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(sampler.mb_ret, ret, rtol=1e-5, atol=1e-5)
+
+
+def test_model_sampler_rollouts_continue_until_reset(make_kwargs):
+    from gops.trainer.sampler.model_sampler import ModelSampler
+
+    num_envs, horizon, max_episode_steps = 4, 8, 5
+    sampler = ModelSampler(**make_kwargs(
+        "SAC", sample_batch_size=num_envs * horizon, model_env_num=num_envs, max_episode_steps=max_episode_steps,
+    ))
+    data, _ = sampler.sample()
+
+    assert len(data["rew"]) == num_envs * horizon
+    assert data["path_num"].dtype == np.uint8
+    reset = (data["done"] | data["time_limited"]).reshape(num_envs, horizon)
+    obs, obs2 = data["obs"].reshape(num_envs, horizon, -1), data["obs2"].reshape(num_envs, horizon, -1)
+    state, next_state = data["state"].reshape(num_envs, horizon, -1), data["next_state"].reshape(num_envs, horizon, -1)
+    cont = ~reset[:, :-1]
+    np.testing.assert_allclose(obs2[:, :-1][cont], obs[:, 1:][cont], rtol=1e-6)
+    np.testing.assert_allclose(next_state[:, :-1][cont], state[:, 1:][cont], rtol=1e-6)
+    # episodes without termination are truncated after max_episode_steps
+    episode_step = np.zeros(num_envs, dtype=int)
+    for t in range(horizon):
+        episode_step += 1
+        limited = data["time_limited"].reshape(num_envs, horizon)[:, t]
+        terminated = data["done"].reshape(num_envs, horizon)[:, t]
+        np.testing.assert_array_equal(limited, (episode_step == max_episode_steps) & ~terminated)
+        episode_step[reset[:, t]] = 0
+
+
+def test_model_sampler_termination_takes_precedence_over_step_limit(make_kwargs):
+    from gops.trainer.sampler.model_sampler import ModelSampler
+
+    num_envs, horizon, max_episode_steps = 4, 6, 3
+    sampler = ModelSampler(**make_kwargs(
+        "SAC", sample_batch_size=num_envs * horizon, model_env_num=num_envs, max_episode_steps=max_episode_steps,
+    ))
+    forward = sampler.env_model.forward
+
+    def forward_terminating_at_limit(obs, action, done, info):
+        next_obs, reward, _, next_info = forward(obs, action, done, info)
+        # rows terminate exactly at the step limit
+        return next_obs, reward, sampler.step_per_episode + 1 >= max_episode_steps, next_info
+
+    sampler.env_model.forward = forward_terminating_at_limit
+    data, _ = sampler.sample()
+
+    done = data["done"].reshape(num_envs, horizon)
+    assert done[:, max_episode_steps - 1::max_episode_steps].all() and done.sum() == 2 * num_envs
+    assert not data["time_limited"].any()
+
+
+def test_model_sampler_indexes_time_indexed_reference_per_row(make_kwargs):
+    from gops.create_pkg.create_env_model import create_env_model
+    from gops.env.env_gen_ocp.pyth_base import ContextState, State
+    from gops.trainer.sampler.model_sampler import ModelSampler
+
+    num_envs, horizon = 4, 30
+    kwargs = make_kwargs("SAC", env_id="veh3dof_tracking")
+    sampler = ModelSampler(
+        sample_batch_size=num_envs * horizon, model_env_num=num_envs, max_episode_steps=12, **kwargs
+    )
+    data, _ = sampler.sample()
+
+    reference = data["state"].context_state.reference
+    next_reference = data["next_state"].context_state.reference
+    assert reference.shape == (num_envs * horizon, 21, 4)
+    # each step shifts the reference window of the data environment by one point
+    np.testing.assert_array_equal(next_reference[:, :-1], reference[:, 1:])
+    reset = (data["done"] | data["time_limited"]).reshape(num_envs, horizon)
+    assert reset.any()
+    cont = ~reset[:, :-1]
+    window, next_window = reference.reshape(num_envs, horizon, 21, 4), next_reference.reshape(num_envs, horizon, 21, 4)
+    np.testing.assert_array_equal(next_window[:, :-1][cont], window[:, 1:][cont])
+    # observations are those of the model for the recorded states
+    model = create_env_model(**{**kwargs, "use_gpu": False})
+    for obs_key, state_key in (("obs", "state"), ("obs2", "next_state")):
+        state = State(
+            robot_state=torch.from_numpy(data[state_key].robot_state),
+            context_state=ContextState(reference=torch.from_numpy(data[state_key].context_state.reference)),
+        )
+        np.testing.assert_allclose(model.get_obs(state).numpy(), data[obs_key], rtol=1e-5, atol=1e-5)